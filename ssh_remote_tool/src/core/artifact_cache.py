@@ -0,0 +1,148 @@
+import os
+import json
+import shlex
+import hashlib
+import posixpath
+import threading
+from core.remote_exec import run_command
+from core.transfer_journal import JOURNAL_DIR
+
+ARTIFACT_INDEX_PATH = os.path.join(JOURNAL_DIR, "artifact_index.json")
+REMOTE_CACHE_DIR = ".cache/remote_tool"  # Relative to the login directory on each host
+MIN_CACHED_SIZE = 1024 * 1024  # Smaller files are cheaper to send than to look up
+MAX_LOCAL_DIGESTS = 1000  # Local files whose digest is remembered
+HASH_READ_SIZE = 1024 * 1024
+
+
+class ArtifactCache:
+    """Content-addressed store of uploaded files on each host.
+
+    Every file uploaded while the cache is enabled is also copied to
+    ``REMOTE_CACHE_DIR/<sha256>`` on that host. Uploading the same content
+    again, to any path on that host, becomes a server-side copy (or a
+    hardlink, with ``use_hardlinks``) from the store instead of a transfer.
+
+    What each host holds is tracked in a local index, so deciding whether
+    to copy or to transfer costs no remote lookup; a stale entry only costs
+    the failed copy attempt, after which the file is transferred. Digests
+    of local files are remembered by (size, mtime) so an unchanged file is
+    hashed once.
+    """
+
+    def __init__(self, index_path=ARTIFACT_INDEX_PATH, remote_dir=REMOTE_CACHE_DIR,
+                 min_size=MIN_CACHED_SIZE, use_hardlinks=False):
+        self.enabled = False
+        self.index_path = index_path
+        self.remote_dir = remote_dir
+        self.min_size = min_size
+        # Hardlinked targets share the cached inode: editing one in place corrupts the store
+        self.use_hardlinks = use_hardlinks
+        self._hosts = {}  # {connection_name: {digest: size}}
+        self._local = {}  # {local_path: [size, mtime, digest]}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(index, dict):
+            self._hosts = index.get("hosts", {})
+            self._local = index.get("local", {})
+
+    def _save(self):
+        # Called with the lock held
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"hosts": self._hosts, "local": self._local}, f)
+        os.replace(temp_path, self.index_path)
+
+    def applies_to(self, size):
+        return self.enabled and size >= self.min_size
+
+    def local_digest(self, local_path, local_stat):
+        """sha256 of a local file, hashed again only if its size or mtime changed"""
+        key = os.path.abspath(local_path)
+        with self._lock:
+            entry = self._local.get(key)
+        if entry and entry[0] == local_stat.st_size and entry[1] == local_stat.st_mtime:
+            return entry[2]
+
+        hasher = hashlib.sha256()
+        with open(local_path, "rb") as f:
+            for data in iter(lambda: f.read(HASH_READ_SIZE), b""):
+                hasher.update(data)
+        digest = hasher.hexdigest()
+        with self._lock:
+            self._local.pop(key, None)
+            self._local[key] = [local_stat.st_size, local_stat.st_mtime, digest]
+            while len(self._local) > MAX_LOCAL_DIGESTS:
+                del self._local[next(iter(self._local))]
+            self._save()
+        return digest
+
+    def holds(self, connection_name, digest):
+        with self._lock:
+            return digest in self._hosts.get(connection_name, {})
+
+    def _object_path(self, digest):
+        return posixpath.join(self.remote_dir, digest)
+
+    def materialize(self, client, connection_name, digest, size, remote_path):
+        """Produce ``remote_path`` from the host's store; False if the store does not have it.
+
+        The cached object must still have the expected size. The copy goes
+        to a temporary name first and is renamed over the target.
+        """
+        if not self.holds(connection_name, digest):
+            return False
+        obj = shlex.quote(self._object_path(digest))
+        temp = shlex.quote(remote_path + ".part")
+        target = shlex.quote(remote_path)
+        if self.use_hardlinks:
+            copy = f"ln -f {obj} {temp}"
+        else:
+            # Copy-on-write clone where the filesystem supports it
+            copy = f"{{ cp --reflink=auto {obj} {temp} 2>/dev/null || cp {obj} {temp}; }}"
+        try:
+            run_command(
+                client,
+                f'[ -f {obj} ] && [ "$(wc -c < {obj})" -eq {int(size)} ] && {copy} && mv -f {temp} {target}'
+                f' || {{ rm -f {temp}; exit 1; }}'
+            )
+            return True
+        except Exception:
+            # Gone or damaged on the host, forget it and transfer instead
+            with self._lock:
+                self._hosts.get(connection_name, {}).pop(digest, None)
+                self._save()
+            return False
+
+    def store(self, client, connection_name, digest, size, remote_path):
+        """Add the just-uploaded ``remote_path`` to the host's store"""
+        if self.holds(connection_name, digest):
+            return
+        obj = shlex.quote(self._object_path(digest))
+        temp = shlex.quote(self._object_path(digest) + ".tmp")
+        source = shlex.quote(remote_path)
+        if self.use_hardlinks:
+            copy = f"ln -f {source} {temp}"
+        else:
+            copy = f"{{ cp --reflink=auto {source} {temp} 2>/dev/null || cp {source} {temp}; }}"
+        run_command(
+            client,
+            f"mkdir -p {shlex.quote(self.remote_dir)} && {copy} && mv -f {temp} {obj}"
+            f" || {{ rm -f {temp}; exit 1; }}"
+        )
+        with self._lock:
+            self._hosts.setdefault(connection_name, {})[digest] = size
+            self._save()
+
+    def forget_host(self, connection_name):
+        """Drop everything the index knows about one host"""
+        with self._lock:
+            if self._hosts.pop(connection_name, None) is not None:
+                self._save()
@@ -0,0 +1,149 @@
+import time
+import threading
+
+QUANTUM = 64 * 1024  # Bytes a transfer takes per turn; smaller means finer interleaving
+BURST_SECONDS = 0.25  # Unused allowance kept, at most this many seconds of the rate
+INTERACTIVE_WINDOW = 2.0  # Seconds after interactive traffic during which the reserve applies
+
+
+class TokenBucket:
+    """Byte-rate limiter whose callers reserve tokens first and sleep off the debt.
+
+    ``reserve`` takes its tokens right away, possibly driving the balance
+    negative, and returns how long to wait before sending. Reservations are
+    served in the order they are made, so callers taking similar amounts
+    alternate.
+    """
+
+    def __init__(self, burst_seconds=BURST_SECONDS):
+        self.burst_seconds = burst_seconds
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, count, rate):
+        """Take ``count`` tokens at ``rate`` bytes/s; returns the seconds to wait"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._tokens + (now - self._last) * rate, rate * self.burst_seconds)
+            self._last = now
+            self._tokens -= count
+            return max(0.0, -self._tokens / rate)
+
+
+class BandwidthLimiter:
+    """Global and per-host byte-rate caps for bulk transfers (0 = unlimited).
+
+    Each transfer draws from the caps through its own Throttle, one
+    ``QUANTUM`` at a time and never with more than one of its threads
+    waiting, so concurrent transfers split a cap evenly however many
+    sessions each one uses. While there was interactive traffic (directory
+    listings, script output; see note_interactive) in the last
+    ``INTERACTIVE_WINDOW`` seconds, transfers only get ``1 -
+    interactive_reserve`` of each cap and the rest stays free for it. That
+    reserve only exists where a cap is set; listings get their own pooled
+    SFTP session regardless (FileManager.interactive_sessions).
+    """
+
+    def __init__(self, global_rate=0, per_host_rate=0, interactive_reserve=0.1):
+        self.global_rate = global_rate
+        self.per_host_rate = per_host_rate  # Default for hosts without an entry in host_rates
+        self.host_rates = {}  # {connection_name: bytes per second}
+        self.interactive_reserve = interactive_reserve
+        self._global = TokenBucket()
+        self._hosts = {}  # {connection_name: TokenBucket}
+        self._lock = threading.Lock()
+        self._last_interactive = float("-inf")
+
+    def host_rate(self, connection_name):
+        return self.host_rates.get(connection_name, self.per_host_rate)
+
+    def set_host_rate(self, connection_name, rate):
+        """Cap one host; None falls back to ``per_host_rate``"""
+        if rate is None:
+            self.host_rates.pop(connection_name, None)
+        else:
+            self.host_rates[connection_name] = rate
+
+    def is_limited(self, connection_name):
+        return bool(self.global_rate or self.host_rate(connection_name))
+
+    def note_interactive(self):
+        """Interactive traffic just happened; hold the reserve back from transfers for a while"""
+        self._last_interactive = time.monotonic()
+
+    def throttle(self, connection_name):
+        """A new transfer's share of the caps"""
+        return Throttle(self, connection_name)
+
+    def _host_bucket(self, connection_name):
+        with self._lock:
+            bucket = self._hosts.get(connection_name)
+            if bucket is None:
+                bucket = self._hosts[connection_name] = TokenBucket()
+            return bucket
+
+    def _wait(self, connection_name, count):
+        factor = 1.0
+        if time.monotonic() - self._last_interactive < INTERACTIVE_WINDOW:
+            factor -= self.interactive_reserve
+        # The host cap first, so a transfer held back by its host does not hold global tokens
+        host_rate = self.host_rate(connection_name)
+        if host_rate:
+            time.sleep(self._host_bucket(connection_name).reserve(count, host_rate * factor))
+        if self.global_rate:
+            time.sleep(self._global.reserve(count, self.global_rate * factor))
+
+
+class Throttle:
+    """One transfer's handle on a BandwidthLimiter; its threads take turns"""
+
+    def __init__(self, limiter, connection_name):
+        self.limiter = limiter
+        self.connection_name = connection_name
+        self._lock = threading.Lock()
+
+    @property
+    def limited(self):
+        return self.limiter.is_limited(self.connection_name)
+
+    def consume(self, count):
+        """Block until ``count`` more bytes may be sent"""
+        if not self.limited:
+            return
+        with self._lock:
+            while count > 0:
+                quantum = min(count, QUANTUM)
+                self.limiter._wait(self.connection_name, quantum)
+                count -= quantum
+
+
+class ThrottledReader:
+    """File wrapper that paces reads through a Throttle"""
+
+    def __init__(self, fileobj, throttle):
+        self.fileobj = fileobj
+        self.throttle = throttle
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.throttle.consume(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
+
+
+class ThrottledWriter:
+    """File wrapper that paces writes through a Throttle"""
+
+    def __init__(self, fileobj, throttle):
+        self.fileobj = fileobj
+        self.throttle = throttle
+
+    def write(self, data):
+        self.throttle.consume(len(data))
+        return self.fileobj.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
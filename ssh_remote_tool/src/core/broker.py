@@ -0,0 +1,590 @@
+"""Local connection broker.
+
+A broker process owns the paramiko transports and serves channels to other
+processes (GUI instances, headless scripts) over a Unix domain socket, much
+like OpenSSH ControlMaster. Each request uses its own socket connection:
+
+    client -> broker   4-byte length + JSON request
+    broker -> client   4-byte length + JSON response {"ok": bool, ...}
+
+After a successful ``open`` the socket carries the channel itself:
+``sftp`` channels are a raw byte pipe to the SFTP subsystem, ``exec`` and
+``shell`` channels use frames (1-byte type + 4-byte length + payload) so
+stdout, stderr and the exit status can share one stream.
+"""
+
+import os
+import json
+import socket
+import select
+import struct
+import threading
+import paramiko
+
+DEFAULT_SOCKET_PATH = os.path.join(os.path.expanduser("~"), ".ssh_remote_tool", "broker.sock")
+
+# Frame types for exec/shell channels
+FRAME_STDOUT = b"o"
+FRAME_STDERR = b"e"
+FRAME_EXIT = b"x"
+FRAME_STDIN = b"i"
+FRAME_STDIN_EOF = b"E"
+FRAME_CLOSE = b"c"
+
+_HEADER = struct.Struct("!I")
+_FRAME_HEADER = struct.Struct("!cI")
+
+
+class BrokerError(Exception):
+    """Raised when the broker is unreachable or rejects a request"""
+
+
+def is_supported():
+    """The broker needs Unix domain sockets"""
+    return hasattr(socket, "AF_UNIX")
+
+
+def _recv_exact(sock, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise EOFError("broker socket closed")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _send_json(sock, obj):
+    payload = json.dumps(obj).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_json(sock):
+    (length,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, length).decode("utf-8"))
+
+
+def _send_frame(sock, frame_type, payload=b""):
+    sock.sendall(_FRAME_HEADER.pack(frame_type, len(payload)) + payload)
+
+
+def _recv_frame(sock):
+    frame_type, length = _FRAME_HEADER.unpack(_recv_exact(sock, _FRAME_HEADER.size))
+    return frame_type, _recv_exact(sock, length) if length else b""
+
+
+class ConnectionBroker:
+    """Serves channels on the transports of its own SSHManager"""
+
+    def __init__(self, ssh_manager, socket_path=DEFAULT_SOCKET_PATH, event_callback=None):
+        if not is_supported():
+            raise BrokerError("Unix domain sockets are not available on this platform.")
+        self.ssh_manager = ssh_manager
+        self.socket_path = socket_path
+        self.event_callback = event_callback
+        self._server = None
+        self._stop_event = threading.Event()
+
+    def serve_forever(self):
+        socket_dir = os.path.dirname(self.socket_path)
+        os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+        os.chmod(socket_dir, 0o700)  # Only the owner may talk to the broker
+        if os.path.exists(self.socket_path):
+            if BrokerClient(self.socket_path).is_available():
+                raise BrokerError(f"A broker is already listening on {self.socket_path}")
+            os.remove(self.socket_path)  # Stale socket from a crashed broker
+
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self._server.listen(64)
+        self._server.settimeout(0.5)
+        self._emit("broker_started", "", self.socket_path)
+
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    conn, _ = self._server.accept()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                conn.settimeout(None)
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self._server.close()
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+            self._emit("broker_stopped", "", self.socket_path)
+
+    def shutdown(self):
+        self._stop_event.set()
+
+    def _handle(self, conn):
+        name = ""
+        try:
+            request = _recv_json(conn)
+            op = request.get("op")
+            name = request.get("connection", "")
+
+            if op == "ping":
+                _send_json(conn, {"ok": True, "pid": os.getpid()})
+            elif op == "list":
+                _send_json(conn, {"ok": True, "connections": self.ssh_manager.get_active_connection_names()})
+            elif op == "connect":
+                self.ssh_manager.connect(name)
+                _send_json(conn, {"ok": True})
+            elif op == "disconnect":
+                self.ssh_manager.disconnect(name)
+                _send_json(conn, {"ok": True})
+            elif op == "shutdown":
+                _send_json(conn, {"ok": True})
+                self.shutdown()
+            elif op == "open":
+                self._open_channel(conn, name, request)
+                return  # The channel pump owns and closes the socket
+            else:
+                _send_json(conn, {"ok": False, "error": f"Unknown broker operation: {op}"})
+        except Exception as e:
+            try:
+                _send_json(conn, {"ok": False, "error": str(e)})
+            except Exception:
+                pass
+            self._emit("broker_error", name, str(e))
+        conn.close()
+
+    def _open_channel(self, conn, name, request):
+        kind = request.get("kind")
+        client = self.ssh_manager.connect(name)
+        channel = client.get_transport().open_session()
+        try:
+            if kind == "sftp":
+                channel.invoke_subsystem("sftp")
+            elif kind == "exec":
+                channel.exec_command(request["command"])
+            elif kind == "shell":
+                channel.get_pty()
+                channel.invoke_shell()
+            else:
+                raise BrokerError(f"Unknown channel kind: {kind}")
+        except Exception:
+            channel.close()
+            raise
+
+        _send_json(conn, {"ok": True})
+        self._emit("broker_channel", name, kind)
+        # Keeps the broker's reaper off a transport other processes are using
+        with self.ssh_manager.in_use(name):
+            if kind == "sftp":
+                self._pump_raw(conn, channel)
+            else:
+                self._pump_framed(conn, channel)
+
+    def _pump_raw(self, conn, channel):
+        """Copy bytes both ways until either side closes"""
+        def client_to_channel():
+            try:
+                while True:
+                    data = conn.recv(65536)
+                    if not data:
+                        break
+                    channel.sendall(data)
+            except Exception:
+                pass
+            finally:
+                channel.close()
+
+        threading.Thread(target=client_to_channel, daemon=True).start()
+        try:
+            while True:
+                data = channel.recv(65536)
+                if not data:
+                    break
+                conn.sendall(data)
+        except Exception:
+            pass
+        finally:
+            channel.close()
+            conn.close()
+
+    def _pump_framed(self, conn, channel):
+        """Multiplex stdout/stderr/exit status onto the socket, demux stdin from it"""
+        def client_to_channel():
+            try:
+                while True:
+                    frame_type, payload = _recv_frame(conn)
+                    if frame_type == FRAME_STDIN:
+                        channel.sendall(payload)
+                    elif frame_type == FRAME_STDIN_EOF:
+                        channel.shutdown_write()
+                    elif frame_type == FRAME_CLOSE:
+                        break
+            except Exception:
+                pass
+            finally:
+                channel.close()
+
+        threading.Thread(target=client_to_channel, daemon=True).start()
+        try:
+            while True:
+                select.select([channel], [], [], 0.5)
+                sent = False
+                if channel.recv_ready():
+                    _send_frame(conn, FRAME_STDOUT, channel.recv(65536))
+                    sent = True
+                if channel.recv_stderr_ready():
+                    _send_frame(conn, FRAME_STDERR, channel.recv_stderr(65536))
+                    sent = True
+                if not sent and channel.exit_status_ready():
+                    status = channel.recv_exit_status()
+                    _send_frame(conn, FRAME_EXIT, struct.pack("!i", status))
+                    break
+                if not sent and channel.closed:
+                    _send_frame(conn, FRAME_EXIT, struct.pack("!i", -1))
+                    break
+        except Exception:
+            pass
+        finally:
+            channel.close()
+            conn.close()
+
+    def _emit(self, event_type, connection_name, detail):
+        if self.event_callback:
+            try:
+                self.event_callback(event_type, connection_name, detail)
+            except Exception:
+                pass
+
+
+class BrokerClient:
+    """Talks to a running ConnectionBroker"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=2):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _connect(self):
+        if not is_supported():
+            raise BrokerError("Unix domain sockets are not available on this platform.")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise BrokerError(f"Broker not reachable at {self.socket_path}: {e}")
+        return sock
+
+    def _request(self, sock, request):
+        _send_json(sock, request)
+        response = _recv_json(sock)
+        if not response.get("ok"):
+            raise BrokerError(response.get("error", "broker request failed"))
+        return response
+
+    def request(self, op, timeout=None, **kwargs):
+        sock = self._connect()
+        try:
+            if timeout is not None:
+                sock.settimeout(timeout)
+            return self._request(sock, dict(kwargs, op=op))
+        finally:
+            sock.close()
+
+    def is_available(self):
+        try:
+            self.request("ping")
+            return True
+        except (BrokerError, OSError, EOFError):
+            return False
+
+    def open_stream(self, connection_name, kind, command=None, timeout=30):
+        """Open a channel on the broker; returns the socket now carrying it"""
+        sock = self._connect()
+        try:
+            sock.settimeout(timeout)
+            request = {"op": "open", "connection": connection_name, "kind": kind}
+            if command is not None:
+                request["command"] = command
+            self._request(sock, request)
+            sock.settimeout(None)
+            return sock
+        except Exception:
+            sock.close()
+            raise
+
+    def get_client(self, connection_name, timeout=30):
+        """Ask the broker to connect and return an SSHClient-like proxy"""
+        self.request("connect", timeout=timeout, connection=connection_name)
+        return BrokeredClient(self, connection_name)
+
+
+class BrokerStream:
+    """Raw SFTP byte pipe through the broker, shaped like a paramiko Channel"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.closed = False
+
+    def send(self, data):
+        return self.sock.send(data)
+
+    def sendall(self, data):
+        self.sock.sendall(data)
+
+    def recv(self, n):
+        data = self.sock.recv(n)
+        if not data:
+            self.closed = True
+        return data
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def get_transport(self):
+        return self
+
+    def is_active(self):
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class BrokerChannel:
+    """Exec/shell channel through the broker, shaped like a paramiko Channel"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.closed = False
+        self._stdout = bytearray()
+        self._stderr = bytearray()
+        self._exit_status = None
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        threading.Thread(target=self._reader, daemon=True).start()
+
+    def _reader(self):
+        try:
+            while True:
+                frame_type, payload = _recv_frame(self.sock)
+                with self._cond:
+                    if frame_type == FRAME_STDOUT:
+                        self._stdout.extend(payload)
+                    elif frame_type == FRAME_STDERR:
+                        self._stderr.extend(payload)
+                    elif frame_type == FRAME_EXIT:
+                        (self._exit_status,) = struct.unpack("!i", payload)
+                        self._cond.notify_all()
+                        break
+                    self._cond.notify_all()
+        except Exception:
+            pass
+        finally:
+            with self._cond:
+                if self._exit_status is None:
+                    self._exit_status = -1
+                self.closed = True
+                self._cond.notify_all()
+
+    def _take(self, buffer, n):
+        with self._cond:
+            while not buffer and not self.closed:
+                self._cond.wait()
+            data = bytes(buffer[:n])
+            del buffer[:n]
+            return data
+
+    def recv(self, n):
+        return self._take(self._stdout, n)
+
+    def recv_stderr(self, n):
+        return self._take(self._stderr, n)
+
+    def recv_ready(self):
+        with self._cond:
+            return bool(self._stdout)
+
+    def recv_stderr_ready(self):
+        with self._cond:
+            return bool(self._stderr)
+
+    def exit_status_ready(self):
+        with self._cond:
+            return self._exit_status is not None and not self._stdout and not self._stderr
+
+    def recv_exit_status(self):
+        with self._cond:
+            while self._exit_status is None:
+                self._cond.wait()
+            return self._exit_status
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def sendall(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self._send_lock:
+            _send_frame(self.sock, FRAME_STDIN, data)
+
+    def shutdown_write(self):
+        with self._send_lock:
+            _send_frame(self.sock, FRAME_STDIN_EOF)
+
+    def makefile(self, mode="r", bufsize=-1):
+        if "w" in mode:
+            return BrokerChannelWriter(self)
+        return BrokerChannelReader(self, stderr=False)
+
+    def makefile_stderr(self, mode="r", bufsize=-1):
+        return BrokerChannelReader(self, stderr=True)
+
+    def close(self):
+        if not self.closed:
+            try:
+                with self._send_lock:
+                    _send_frame(self.sock, FRAME_CLOSE)
+            except OSError:
+                pass
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class BrokerChannelReader:
+    """Minimal ChannelFile replacement for stdout/stderr of a BrokerChannel"""
+
+    def __init__(self, channel, stderr=False):
+        self.channel = channel
+        self._recv = channel.recv_stderr if stderr else channel.recv
+        self._pending = b""
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = [self._pending]
+            self._pending = b""
+            while True:
+                data = self._recv(65536)
+                if not data:
+                    return b"".join(chunks)
+                chunks.append(data)
+        if not self._pending:
+            self._pending = self._recv(size)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def readline(self):
+        while b"\n" not in self._pending:
+            data = self._recv(65536)
+            if not data:
+                line, self._pending = self._pending, b""
+                return line
+            self._pending += data
+        index = self._pending.index(b"\n") + 1
+        line, self._pending = self._pending[:index], self._pending[index:]
+        return line
+
+    def readlines(self):
+        return list(self)
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def close(self):
+        pass
+
+
+class BrokerChannelWriter:
+    """Minimal ChannelFile replacement for stdin of a BrokerChannel"""
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def write(self, data):
+        self.channel.sendall(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.channel.shutdown_write()
+
+
+class BrokeredClient:
+    """SSHClient stand-in whose channels live on the broker's transport"""
+
+    def __init__(self, broker_client, connection_name):
+        self.broker_client = broker_client
+        self.connection_name = connection_name
+        self._closed = False
+
+    # -- transport-like interface (SSHManager liveness checks, keepalives) --
+
+    def get_transport(self):
+        return self
+
+    def is_active(self):
+        return not self._closed
+
+    def global_request(self, kind, data=None, wait=True):
+        # The broker sends its own keepalives; use the chance to notice a dead broker
+        if not self.broker_client.is_available():
+            self._closed = True
+        return None
+
+    # -- client interface --
+
+    def open_sftp(self):
+        sock = self.broker_client.open_stream(self.connection_name, "sftp")
+        return paramiko.SFTPClient(BrokerStream(sock))
+
+    def invoke_shell(self, *args, **kwargs):
+        sock = self.broker_client.open_stream(self.connection_name, "shell")
+        return BrokerChannel(sock)
+
+    def exec_command(self, command, bufsize=-1, timeout=None, get_pty=False, environment=None):
+        sock = self.broker_client.open_stream(self.connection_name, "exec", command=command)
+        channel = BrokerChannel(sock)
+        return channel.makefile("wb"), channel.makefile("r"), channel.makefile_stderr("r")
+
+    def close(self):
+        # The broker keeps the real transport for other processes
+        self._closed = True
+
+
+def run_broker(socket_path=DEFAULT_SOCKET_PATH):
+    """Run a broker in the foreground until it is asked to shut down"""
+    from core.ssh_manager import SSHManager
+    from core.connection_scheduler import ConnectionScheduler
+
+    ssh_manager = SSHManager()
+
+    def log_event(event_type, connection_name, detail):
+        print(f"[broker] {event_type} {connection_name} {detail}".rstrip())
+
+    scheduler = ConnectionScheduler(ssh_manager, event_callback=log_event)
+    broker = ConnectionBroker(ssh_manager, socket_path, event_callback=log_event)
+    scheduler.start()
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
+        ssh_manager.disconnect_all()
@@ -0,0 +1,93 @@
+import time
+import threading
+from core.ssh_manager import SSHManager
+
+
+class ConnectionScheduler:
+    """Background maintenance of SSH connections.
+
+    A single daemon thread sends transport keepalives at each connection's
+    interval and periodically reaps idle SSH clients and SFTP sessions.
+    Events are reported through ``event_callback(event_type, connection_name, detail)``.
+    """
+
+    def __init__(self, ssh_manager: SSHManager, file_manager=None, tick_seconds=5,
+                 reap_interval=60, event_callback=None):
+        self.ssh_manager = ssh_manager
+        self.file_manager = file_manager
+        self.tick_seconds = tick_seconds
+        self.reap_interval = reap_interval
+        self.event_callback = event_callback
+        self._last_keepalive = {}  # {conn_name: monotonic time}
+        self._last_reap = time.monotonic()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="ssh-maintenance", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.tick_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                self._emit("error", "", str(e))
+
+    def run_once(self):
+        """Perform one maintenance pass (keepalives due, then reaping if due)"""
+        now = time.monotonic()
+        self._send_due_keepalives(now)
+        if now - self._last_reap >= self.reap_interval:
+            self._last_reap = now
+            self._reap()
+
+    def _send_due_keepalives(self, now):
+        names = self.ssh_manager.get_active_connection_names()
+        for name in list(self._last_keepalive):
+            if name not in names:
+                del self._last_keepalive[name]
+
+        for name in names:
+            interval = self.ssh_manager.get_keepalive_interval(name)
+            if interval <= 0:
+                continue
+            last = self._last_keepalive.setdefault(name, now)
+            if now - last < interval:
+                continue
+            self._last_keepalive[name] = now
+            start = time.perf_counter()
+            alive = self.ssh_manager.send_keepalive(name)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if alive:
+                self._emit("keepalive", name, f"sent in {elapsed_ms:.1f}ms")
+            else:
+                self._emit("keepalive_failed", name, "transport lost, connection dropped")
+                if self.file_manager:
+                    self.file_manager._close_cached_sftp(name)
+
+    def _reap(self):
+        # Idle SFTP sessions first: their open channels keep the connection from being reaped
+        if self.file_manager:
+            for name, count in self.file_manager.cleanup_idle_sessions().items():
+                self._emit("reap_sftp", name, f"{count} idle SFTP session(s) closed")
+        for name in self.ssh_manager.cleanup_idle_connections():
+            self._emit("reap_connection", name, "idle SSH connection closed")
+
+    def _emit(self, event_type, connection_name, detail):
+        if self.event_callback:
+            try:
+                self.event_callback(event_type, connection_name, detail)
+            except Exception:
+                pass
@@ -0,0 +1,243 @@
+import math
+import shlex
+import struct
+import zlib
+import hashlib
+from core.bandwidth import ThrottledWriter
+from core.remote_exec import RemoteCommand, run_command
+
+MIN_BLOCK_SIZE = 4 * 1024
+MAX_BLOCK_SIZE = 128 * 1024
+LITERAL_FLUSH_SIZE = 256 * 1024  # Literal bytes buffered before they are sent
+READ_SIZE = 4 * 1024 * 1024
+ROLL_BUDGET_BLOCKS = 4  # Blocks rolled byte-by-byte after a mismatch before stepping by whole blocks
+
+_ADLER_MOD = 65521
+
+# Runs on the remote host with python3. "sig" prints block signatures of the
+# current file; "apply" rebuilds the new file from copy/literal instructions
+# on stdin into a temp file and, if the checksum matches, renames it over the
+# target.
+HELPER = r'''
+import sys, os, struct, zlib, hashlib
+def read(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise EOFError("delta stream ended early")
+    return data
+def sig(path, bs):
+    out = sys.stdout.buffer
+    out.write(struct.pack("!IQ", bs, os.path.getsize(path)))
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(bs)
+            if not block:
+                break
+            out.write(struct.pack("!I", zlib.adler32(block) & 0xffffffff) + hashlib.md5(block).digest())
+def apply(target, temp):
+    inp = sys.stdin.buffer
+    md5 = hashlib.md5()
+    try:
+        with open(target, "rb") as src, open(temp, "wb") as dst:
+            while True:
+                op = read(inp, 1)
+                if op == b"C":
+                    offset, length = struct.unpack("!QQ", read(inp, 16))
+                    src.seek(offset)
+                    data = src.read(length)
+                    if len(data) != length:
+                        raise IOError("copy past the end of the old file")
+                elif op == b"L":
+                    data = read(inp, struct.unpack("!I", read(inp, 4))[0])
+                elif op == b"E":
+                    if read(inp, 16) != md5.digest():
+                        raise IOError("checksum mismatch")
+                    break
+                else:
+                    raise IOError("bad delta instruction")
+                dst.write(data)
+                md5.update(data)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.chmod(temp, os.stat(target).st_mode & 0o7777)
+        os.replace(temp, target)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+if sys.argv[1] == "sig":
+    sig(sys.argv[2], int(sys.argv[3]))
+else:
+    apply(sys.argv[2], sys.argv[3])
+'''
+
+
+def choose_block_size(size):
+    """Power of two near sqrt(size), as rsync does, within sane bounds"""
+    if size <= 0:
+        return MIN_BLOCK_SIZE
+    block_size = 1 << round(math.log2(math.sqrt(size)))
+    return max(MIN_BLOCK_SIZE, min(MAX_BLOCK_SIZE, block_size))
+
+
+def _helper_command(*args):
+    return "python3 -c " + shlex.quote(HELPER) + " " + " ".join(shlex.quote(str(a)) for a in args)
+
+
+def remote_supports_delta(client):
+    try:
+        run_command(client, "command -v python3 >/dev/null 2>&1")
+        return True
+    except Exception:
+        return False
+
+
+def fetch_signatures(client, remote_path, block_size):
+    """{weak checksum: [(block offset, md5 digest), ...]} of the remote file's full blocks"""
+    cmd = RemoteCommand(client, _helper_command("sig", remote_path, block_size))
+    try:
+        data = cmd.stdout.read()
+        cmd.finish("Remote block signatures")
+    finally:
+        cmd.close()
+
+    block_size, remote_size = struct.unpack("!IQ", data[:12])
+    table = {}
+    full_blocks = remote_size // block_size  # The short tail block is never matched
+    for index in range(full_blocks):
+        weak, strong = struct.unpack("!I16s", data[12 + index * 20:32 + index * 20])
+        table.setdefault(weak, []).append((index * block_size, strong))
+    return table
+
+
+class _DeltaWriter:
+    """Encodes copy/literal instructions onto the helper's stdin, merging adjacent copies"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.literal_bytes = 0
+        self._copy = None  # [offset, length] pending
+
+    def copy(self, offset, length):
+        if self._copy and self._copy[0] + self._copy[1] == offset:
+            self._copy[1] += length
+            return
+        self._flush_copy()
+        self._copy = [offset, length]
+
+    def literal(self, data):
+        if not data:
+            return
+        self._flush_copy()
+        self.stream.write(b"L" + struct.pack("!I", len(data)) + bytes(data))
+        self.literal_bytes += len(data)
+
+    def end(self, digest):
+        self._flush_copy()
+        self.stream.write(b"E" + digest)
+
+    def _flush_copy(self):
+        if self._copy:
+            self.stream.write(b"C" + struct.pack("!QQ", *self._copy))
+            self._copy = None
+
+
+def _generate(local_file, table, block_size, writer, size, progress_callback=None):
+    """Match ``local_file`` against the remote blocks and write the delta; returns its md5"""
+    md5 = hashlib.md5()
+    buf = bytearray()
+    base = 0  # File offset of buf[0]
+    pos = 0  # Start of the current window in buf
+    literal_start = 0
+    weak = None  # Weak checksum of buf[pos:pos + block_size], None if it must be recomputed
+    roll_budget = ROLL_BUDGET_BLOCKS * block_size
+    eof = False
+    last_report = 0
+
+    while True:
+        if len(buf) - pos <= block_size and not eof:
+            # Keep only unsent data, then read more
+            del buf[:literal_start]
+            base += literal_start
+            pos -= literal_start
+            literal_start = 0
+            data = local_file.read(READ_SIZE)
+            if data:
+                md5.update(data)
+                buf += data
+            else:
+                eof = True
+            continue
+        if len(buf) - pos < block_size:
+            break
+
+        if weak is None:
+            weak = zlib.adler32(buf[pos:pos + block_size]) & 0xffffffff
+        candidates = table.get(weak)
+        if candidates:
+            strong = hashlib.md5(buf[pos:pos + block_size]).digest()
+            match = next((offset for offset, digest in candidates if digest == strong), None)
+            if match is not None:
+                writer.literal(buf[literal_start:pos])
+                writer.copy(match, block_size)
+                pos += block_size
+                literal_start = pos
+                weak = None
+                roll_budget = ROLL_BUDGET_BLOCKS * block_size
+                if progress_callback and base + pos - last_report >= READ_SIZE:
+                    last_report = base + pos
+                    progress_callback(last_report, size)
+                continue
+
+        if roll_budget > 0 and pos + block_size < len(buf):
+            # Slide the window one byte (adler32 rolling update)
+            out_byte, in_byte = buf[pos], buf[pos + block_size]
+            a = ((weak & 0xffff) - out_byte + in_byte) % _ADLER_MOD
+            b = ((weak >> 16) - block_size * out_byte + a - 1) % _ADLER_MOD
+            weak = (b << 16) | a
+            pos += 1
+            roll_budget -= 1
+        else:
+            # Budget spent (or window at the buffer end): step a whole block
+            pos += block_size
+            weak = None
+
+        if pos - literal_start >= LITERAL_FLUSH_SIZE:
+            writer.literal(buf[literal_start:pos])
+            literal_start = pos
+        if progress_callback and base + pos - last_report >= READ_SIZE:
+            last_report = base + pos
+            progress_callback(last_report, size)
+
+    writer.literal(buf[literal_start:])
+    return md5.digest()
+
+
+def delta_upload(client, local_path, remote_path, size, progress_callback=None, throttle=None):
+    """Update ``remote_path`` to match ``local_path`` by sending only the changed data.
+
+    The remote helper computes block signatures of the current file; the
+    local file is matched against them with a rolling checksum, and only
+    literal data plus copy instructions go over the wire. The helper builds
+    the result in ``remote_path + '.delta'`` and renames it over the target
+    once the whole-file md5 matches. Returns the number of literal bytes sent.
+    What goes over the wire is paced by ``throttle``, if given.
+    """
+    block_size = choose_block_size(size)
+    table = fetch_signatures(client, remote_path, block_size)
+
+    cmd = RemoteCommand(client, _helper_command("apply", remote_path, remote_path + ".delta"))
+    try:
+        writer = _DeltaWriter(ThrottledWriter(cmd.stdin, throttle) if throttle is not None else cmd.stdin)
+        with open(local_path, "rb") as local_file:
+            digest = _generate(local_file, table, block_size, writer, size, progress_callback)
+        writer.end(digest)
+        cmd.stdin.close()
+        cmd.finish("Remote delta apply")
+    finally:
+        cmd.close()
+    if progress_callback:
+        progress_callback(size, size)
+    return writer.literal_bytes
@@ -0,0 +1,183 @@
+import os
+import threading
+from core import integrity
+from core.file_manager import VERIFY_OFF, TransferCancelled
+from core.integrity import IntegrityError, new_hasher, remote_digest
+
+DEFAULT_FANOUT_BLOCK_SIZE = 256 * 1024
+DEFAULT_FANOUT_WINDOW = 32  # Blocks kept in memory for all hosts together
+
+
+class _BlockWindow:
+    """The last ``window`` blocks of the local file, read once and shared by every host.
+
+    The reader keeps at most ``window`` blocks ahead of the host furthest
+    along, so the fastest host is never held back by the slowest one; a
+    host that falls out of the window reads the blocks it missed from the
+    file itself. The blocks are hashed once, in order, for every algorithm
+    in ``algorithms``.
+    """
+
+    def __init__(self, local_path, size, block_size, window, algorithms=()):
+        self.local_path = local_path
+        self.size = size
+        self.block_size = block_size
+        self.window = max(1, window)
+        self.block_count = (size + block_size - 1) // block_size
+        self._hashers = {algorithm: new_hasher(algorithm) for algorithm in algorithms}
+        self._digests = {}
+        self._blocks = {}  # {index: data}
+        self._next = 0  # Index of the next block to read
+        self._lead = 0  # Highest index any host has asked for
+        self._closed = False
+        self._error = None
+        self._cond = threading.Condition()
+
+    def run_reader(self):
+        try:
+            with open(self.local_path, "rb") as local_file:
+                while self._next < self.block_count:
+                    with self._cond:
+                        while self._next - self._lead >= self.window and not self._closed:
+                            self._cond.wait()
+                        if self._closed:
+                            return
+                    data = local_file.read(self.block_size)
+                    if not data:
+                        raise IOError(f"{self.local_path} changed during upload")
+                    for hasher in self._hashers.values():
+                        hasher.update(data)
+                    with self._cond:
+                        self._blocks[self._next] = data
+                        self._next += 1
+                        self._blocks.pop(self._next - self.window - 1, None)
+                        self._cond.notify_all()
+            with self._cond:
+                self._digests = {algorithm: h.hexdigest().lower() for algorithm, h in self._hashers.items()}
+                self._cond.notify_all()
+        except BaseException as e:
+            with self._cond:
+                self._error = e
+                self._cond.notify_all()
+
+    def get(self, index, fallback_file):
+        """Block ``index``, waiting for the reader; from ``fallback_file`` if it left the window"""
+        with self._cond:
+            if index > self._lead:
+                self._lead = index
+                self._cond.notify_all()
+            while index >= self._next and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise IOError(f"Reading {self.local_path} failed: {self._error}")
+            data = self._blocks.get(index)
+        if data is None:
+            fallback_file.seek(index * self.block_size)
+            data = fallback_file.read(self.block_size)
+        return data
+
+    def digest(self, algorithm):
+        """Digest of the whole file, once the reader got to the end"""
+        with self._cond:
+            while algorithm not in self._digests and self._error is None:
+                self._cond.wait()
+            return self._digests.get(algorithm)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+def fanout_upload(file_manager, connection_names, local_path, remote_path, progress_callback=None,
+                  block_size=DEFAULT_FANOUT_BLOCK_SIZE, window=DEFAULT_FANOUT_WINDOW):
+    """Upload one local file to ``remote_path`` on many hosts at once, reading it once.
+
+    Every host gets its own thread that connects if needed and writes the
+    shared blocks (see _BlockWindow) into ``remote_path + '.part'`` with
+    pipelined writes, through the host's bandwidth throttle. Memory stays at
+    about ``window`` blocks however many hosts there are. Each copy is
+    checked against the file's hash (computed once) per the file manager's
+    ``verify_policy`` before it is renamed into place.
+
+    ``progress_callback(connection_name, transferred, total)``; raising
+    TransferCancelled from it stops that host. Returns ``{connection_name:
+    error message, or None if the upload succeeded}``; a failed host never
+    stops the others.
+    """
+    size = os.path.getsize(local_path)
+    algorithms = []
+    if file_manager.verify_policy != VERIFY_OFF:
+        algorithms = ["sha256"] + (["xxh64"] if integrity.xxhash is not None else [])
+    blocks = _BlockWindow(local_path, size, block_size, window, algorithms)
+    results = {}
+    results_lock = threading.Lock()
+
+    def upload_to(connection_name):
+        temp_remote_path = remote_path + ".part"
+        error = None
+        try:
+            client = file_manager.ssh_manager.connect(connection_name)
+            throttle = file_manager.bandwidth.throttle(connection_name)
+            with file_manager._sftp_session(connection_name) as sftp, open(local_path, "rb") as fallback:
+                try:
+                    transferred = 0
+                    with sftp.open(temp_remote_path, "wb") as remote_file:
+                        remote_file.set_pipelined(True)
+                        for index in range(blocks.block_count):
+                            data = blocks.get(index, fallback)
+                            throttle.consume(len(data))
+                            remote_file.write(data)
+                            transferred += len(data)
+                            if progress_callback:
+                                progress_callback(connection_name, transferred, size)
+                    # Closing waited for every pipelined write
+                    remote_size = sftp.stat(temp_remote_path).st_size
+                    if remote_size != size:
+                        raise IOError(f"Size mismatch after upload: {remote_size} != {size}")
+                    if algorithms:
+                        _verify_copy(file_manager, connection_name, client, blocks, temp_remote_path, remote_path)
+                    sftp.rename(temp_remote_path, remote_path)
+                except BaseException:
+                    try:
+                        sftp.remove(temp_remote_path)
+                    except Exception:
+                        pass
+                    raise
+            if progress_callback and not size:
+                progress_callback(connection_name, 0, 0)
+        except TransferCancelled:
+            error = "Cancelled"
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+        with results_lock:
+            results[connection_name] = error
+
+    reader = threading.Thread(target=blocks.run_reader, name="fanout-reader", daemon=True)
+    senders = [
+        threading.Thread(target=upload_to, args=(name,), name=f"fanout-{name}", daemon=True)
+        for name in connection_names
+    ]
+    reader.start()
+    for thread in senders:
+        thread.start()
+    for thread in senders:
+        thread.join()
+    blocks.close()
+    reader.join()
+    return results
+
+
+def _verify_copy(file_manager, connection_name, client, blocks, temp_remote_path, remote_path):
+    algorithm = file_manager._hash_algorithm(connection_name, client)
+    local_digest = blocks.digest(algorithm)
+    try:
+        digest = remote_digest(client, temp_remote_path, algorithm)
+    except Exception as e:
+        file_manager._notify_verification(connection_name, remote_path, "skipped", f"not verified: {e}")
+        return
+    if digest != local_digest:
+        message = f"{algorithm} mismatch: local {local_digest}, remote {digest}"
+        file_manager._notify_verification(connection_name, remote_path, "mismatch", message)
+        raise IntegrityError(message)
+    file_manager._notify_verification(connection_name, remote_path, "verified", f"{algorithm} {digest}")
@@ -1,230 +1,955 @@
 import os
 import stat
 import time
+import socket
 import threading
+from contextlib import contextmanager
+import paramiko
 from core.ssh_manager import SSHManager
+from core.sftp_pool import SFTPSessionPool
+from core.artifact_cache import ArtifactCache
+from core.bandwidth import BandwidthLimiter, ThrottledReader, ThrottledWriter
+from core.delta_transfer import delta_upload, remote_supports_delta
+from core.integrity import (
+    IntegrityError, Verification, HashingReader, HashingWriter, choose_algorithm, hash_file_range,
+    new_hasher, remote_digest
+)
+from core.parallel_transfer import parallel_download, parallel_upload, read_range, stream_download, stream_upload
+from core.transfer_journal import (
+    MODE_PARALLEL, MODE_SEQUENTIAL, RANGES_SUFFIX, load_record, save_record, remove_record,
+    record_matches, committed_end, tail_range, upload_state_path
+)
+
+
+class TransferPaused(Exception):
+    """Raised from a progress callback to stop a transfer but keep its partial file"""
+
+
+class TransferCancelled(Exception):
+    """Raised from a progress callback to abandon a transfer"""
+
+
+# What to do when a transferred file does not hash the same on both sides
+VERIFY_OFF = "off"
+VERIFY_FAIL = "fail"
+VERIFY_RETRY = "retry"  # Discard the partial file and transfer once more, then fail
+
 
 class FileManager:
     def __init__(self, ssh_manager: SSHManager):
         self.ssh_manager = ssh_manager
-        self._sftp_cache = {}  # Cache SFTP connections
+        self._sftp_pools = {}  # {connection_name: SFTPSessionPool}
         self._cache_lock = threading.Lock()
-        self._cache_timeout = 300  # 5 minutes timeout
+        self._cache_timeout = 300  # 5 minutes idle timeout per session
+        self.sftp_pool_size = 4  # Max concurrent SFTP sessions per connection
+        self.max_sessions_per_connection = 8  # Pool growth limit, under sshd's default MaxSessions (10) with room for exec channels
+        self._extra_sessions = {}  # {connection_name: sessions added to the pool by running tree jobs}
+        self.tree_workers = 4  # Files a tree transfer keeps in flight, each on its own added session
+        self.interactive_sessions = 1  # Of those, kept for listings and file operations, never for transfers
+        self.transfer_retries = 3  # Reconnect attempts when the transport drops mid-transfer
+        self.transfer_retry_delay = 1.0  # Seconds, doubled after each attempt
+        self.parallel_threshold = 8 * 1024 * 1024  # Files at least this big use the parallel engine
+        self.parallel_sessions = 3  # SFTP sessions a parallel transfer may use
+        self.parallel_block_size = 1024 * 1024  # Bytes per block of pipelined requests
+        self.pipeline_depth = 8  # Blocks held in memory by a sequential transfer or relay
+        self.pipeline_block_size = 256 * 1024  # Bytes per block of a sequential transfer or relay
+        self.delta_threshold = 16 * 1024 * 1024  # Re-uploads over an existing file this big send only changes
+        self.verify_policy = VERIFY_FAIL
+        self.verify_min_size = 1024 * 1024  # Smaller files skip the remote hash (one exec round trip each); 0 verifies all
+        self.verify_callback = None  # verify_callback(connection_name, path, status, message)
+        self._hash_algorithms = {}  # {connection_name: algorithm both sides support}
+        self.journal_source_digest = False  # Also journal a hash of the whole source (one extra full read)
+        self.bandwidth = BandwidthLimiter()  # Rate caps for uploads and downloads, unlimited by default
+        self.artifact_cache = ArtifactCache()  # Per-host store of uploaded content, off until enabled
+
+    def _open_sftp_client(self, connection_name):
+        """Open a new SFTP session on the connection's shared transport"""
+        ssh_client = self.ssh_manager.get_client(connection_name)
+        if not ssh_client:
+            raise ConnectionError(f"Not connected to '{connection_name}'.")
+        start = time.perf_counter()
+        sftp_client = ssh_client.open_sftp()
+        self.ssh_manager.record_phase(connection_name, 'sftp_open', time.perf_counter() - start)
+        return sftp_client
+
+    def _get_pool(self, connection_name):
+        """Get (or create) the SFTP session pool for a connection"""
+        with self._cache_lock:
+            pool = self._sftp_pools.get(connection_name)
+            if pool is None:
+                pool = SFTPSessionPool(
+                    connection_name,
+                    lambda: self._open_sftp_client(connection_name),
+                    max_size=self.sftp_pool_size + self._extra_sessions.get(connection_name, 0),
+                    idle_timeout=self._cache_timeout,
+                    health_check=self._is_session_alive,
+                    reserved=self.interactive_sessions
+                )
+                self._sftp_pools[connection_name] = pool
+            return pool
+
+    @staticmethod
+    def _is_session_alive(sftp):
+        """Passive liveness check: channel and transport state only, no round-trip"""
+        try:
+            channel = sftp.get_channel()
+            if channel is None or channel.closed:
+                return False
+            transport = channel.get_transport()
+            return bool(transport and transport.is_active())
+        except Exception:
+            return False
+
+    def _is_session_broken(self, connection_name, sftp, exc):
+        """Whether an error raised during an operation left the session unusable"""
+        if self._is_session_alive(sftp) and not isinstance(
+                exc, (EOFError, paramiko.SSHException, ConnectionError)):
+            # Ordinary SFTP error (permission denied, no such file, ...)
+            return False
+        try:
+            transport = sftp.get_channel().get_transport()
+            transport_lost = not (transport and transport.is_active())
+        except Exception:
+            transport_lost = True
+        if transport_lost:
+            # Every session in the pool shares the dead transport
+            self._close_cached_sftp(connection_name)
+        return True
+
+    @contextmanager
+    def _sftp_session(self, connection_name, interactive=False, wait=True):
+        """Check out an SFTP session for exclusive use by one operation.
+
+        ``interactive`` operations may also use the sessions transfers leave
+        free (``interactive_sessions``), so a listing never waits for them.
+        With ``wait=False`` SFTPPoolTimeout is raised at once if no session
+        is free.
+        """
+        def is_broken(sftp, exc):
+            return self._is_session_broken(connection_name, sftp, exc)
+
+        pool = self._get_pool(connection_name)
+        timeout = 30 if wait else 0
+        with pool.session(timeout, is_broken=is_broken, interactive=interactive) as sftp:
+            # Pooled sessions bypass get_client, keep the idle reaper informed
+            with self.ssh_manager.in_use(connection_name):
+                yield sftp
+
+    def _close_cached_sftp(self, connection_name):
+        """Close and remove the SFTP session pool of a connection"""
+        with self._cache_lock:
+            pool = self._sftp_pools.pop(connection_name, None)
+        if pool:
+            pool.close()
 
-    def _get_sftp_client(self, connection_name):
-        """Get SFTP client with caching for better performance"""
+    def get_sftp_session_count(self):
+        """Total number of open SFTP sessions across all connections"""
         with self._cache_lock:
-            # Check if we have a cached SFTP client
-            if connection_name in self._sftp_cache:
-                sftp_info = self._sftp_cache[connection_name]
-                # Check if cache is still valid
-                if time.time() - sftp_info['timestamp'] < self._cache_timeout:
-                    try:
-                        # Test if connection is still alive
-                        sftp_info['client'].listdir('.')
-                        return sftp_info['client']
-                    except:
-                        # Connection is dead, remove from cache
-                        try:
-                            sftp_info['client'].close()
-                        except:
-                            pass
-                        del self._sftp_cache[connection_name]
-                else:
-                    # Cache expired, remove it
-                    try:
-                        sftp_info['client'].close()
-                    except:
-                        pass
-                    del self._sftp_cache[connection_name]
+            pools = list(self._sftp_pools.values())
+        return sum(len(pool) for pool in pools)
 
-            # Create new SFTP client
-            ssh_client = self.ssh_manager.get_client(connection_name)
-            if not ssh_client:
-                raise ConnectionError(f"Not connected to '{connection_name}'.")
+    def get_sftp_metrics(self):
+        """Per-connection SFTP pool metrics"""
+        with self._cache_lock:
+            pools = dict(self._sftp_pools)
+        return {name: pool.get_metrics() for name, pool in pools.items()}
 
-            sftp_client = ssh_client.open_sftp()
-            # Cache the new client
-            self._sftp_cache[connection_name] = {
-                'client': sftp_client,
-                'timestamp': time.time()
-            }
-            return sftp_client
+    def cleanup_idle_sessions(self):
+        """Evict idle SFTP sessions; pools of disconnected hosts are closed.
 
-    def _close_cached_sftp(self, connection_name):
-        """Close and remove cached SFTP client"""
+        Returns {connection_name: sessions_closed}.
+        """
+        active = set(self.ssh_manager.get_active_connection_names())
         with self._cache_lock:
-            if connection_name in self._sftp_cache:
-                try:
-                    self._sftp_cache[connection_name]['client'].close()
-                except:
-                    pass
-                del self._sftp_cache[connection_name]
+            pools = dict(self._sftp_pools)
+
+        reaped = {}
+        for name, pool in pools.items():
+            if name not in active:
+                count = len(pool)
+                self._close_cached_sftp(name)
+            else:
+                count = pool.evict_idle()
+            if count:
+                reaped[name] = count
+        return reaped
 
     def list_directory(self, connection_name, remote_path):
         """List directory contents with performance optimization"""
-        sftp = self._get_sftp_client(connection_name)
-
-        # Use cached SFTP connection, don't close it
-        files_attrs = sftp.listdir_attr(remote_path)
-        files = []
-        for attr in files_attrs:
-            is_dir = stat.S_ISDIR(attr.st_mode)
-            files.append({
-                "name": attr.filename,
-                "size": attr.st_size,
-                "mtime": attr.st_mtime,
-                "permissions": stat.filemode(attr.st_mode),
-                "is_dir": is_dir,
-            })
-        # Sort with directories first, then by name
-        files.sort(key=lambda x: (not x['is_dir'], x['name'].lower()))
-        return files
-
-    def download_file(self, connection_name, remote_path, local_path, progress_callback=None):
+        self.bandwidth.note_interactive()
+        with self._sftp_session(connection_name, interactive=True) as sftp:
+            files_attrs = sftp.listdir_attr(remote_path)
+            files = []
+            for attr in files_attrs:
+                is_dir = stat.S_ISDIR(attr.st_mode)
+                files.append({
+                    "name": attr.filename,
+                    "size": attr.st_size,
+                    "mtime": attr.st_mtime,
+                    "permissions": stat.filemode(attr.st_mode),
+                    "is_dir": is_dir,
+                })
+            # Sort with directories first, then by name
+            files.sort(key=lambda x: (not x['is_dir'], x['name'].lower()))
+            return files
+
+    def _lost_connections(self, connection_names, exc):
+        """Which of ``connection_names`` a failed operation lost; empty if it failed for another reason.
+
+        Only transport and socket errors count. Pause, cancel, hash
+        mismatches and other errors are never a lost connection, even if a
+        transport happens to be down at the same time.
+        """
+        if isinstance(exc, (TransferPaused, TransferCancelled, IntegrityError)):
+            return []
+        if not isinstance(exc, (EOFError, paramiko.SSHException, OSError)):
+            return []
+        dead = [name for name in connection_names if self.ssh_manager.get_client(name) is None]
+        if dead:
+            return dead
+        if isinstance(exc, (EOFError, paramiko.SSHException, ConnectionError, socket.timeout)):
+            # A session channel can die while the transport still looks active
+            return list(connection_names)
+        return []  # Local I/O or SFTP status errors on a live transport
+
+    def _is_connection_lost(self, connection_name, exc):
+        """Whether a failed operation was caused by the SSH transport going away"""
+        return bool(self._lost_connections((connection_name,), exc))
+
+    def _keep_partial(self, connection_name, exc):
+        """Whether a failed transfer should leave its .part file for a later resume"""
+        return isinstance(exc, TransferPaused) or self._is_connection_lost(connection_name, exc)
+
+    def discard_partial_download(self, local_path):
+        """Remove what an interrupted download of ``local_path`` left behind"""
+        for path in (local_path + '.part', local_path + '.part' + RANGES_SUFFIX):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def discard_partial_upload(self, connection_name, remote_path):
+        """Remove what an interrupted upload to ``remote_path`` left behind"""
+        remove_record(upload_state_path(connection_name, remote_path))
+        with self._sftp_session(connection_name) as sftp:
+            try:
+                sftp.remove(remote_path + '.part')
+            except FileNotFoundError:
+                pass
+
+    def _new_verification(self, connection_name, size):
+        """In-stream hash state for one transfer attempt of ``size`` bytes, or None if not verified.
+
+        Files below ``verify_min_size`` are not verified: the remote hash
+        costs an exec channel per file, which would dominate a tree of
+        small files.
+        """
+        if self.verify_policy == VERIFY_OFF or size < self.verify_min_size:
+            return None
+        client = self.ssh_manager.get_client(connection_name)
+        if not client:
+            return None
+        return Verification(client, self._hash_algorithm(connection_name, client))
+
+    def _hash_algorithm(self, connection_name, client):
+        algorithm = self._hash_algorithms.get(connection_name)
+        if algorithm is None:
+            algorithm = self._hash_algorithms[connection_name] = choose_algorithm(client)
+        return algorithm
+
+    def _source_digest(self, connection_name, remote_path=None, local_path=None, size=0):
+        """Hash of the whole source for the journal, or None unless ``journal_source_digest`` is on"""
+        if not self.journal_source_digest:
+            return None
+        client = self.ssh_manager.get_client(connection_name)
+        if not client:
+            return None
+        algorithm = self._hash_algorithm(connection_name, client)
+        try:
+            if remote_path is not None:
+                digest = remote_digest(client, remote_path, algorithm)
+            else:
+                hasher = new_hasher(algorithm)
+                hash_file_range(local_path, 0, size, hasher)
+                digest = hasher.hexdigest()
+        except Exception:
+            return None
+        return f"{algorithm}:{digest}"
+
+    def _check_download_resume(self, connection_name, sftp, remote_path, local_path, remote_stat,
+                               digest=None):
+        """Discard an interrupted download of ``local_path`` unless it can safely continue.
+
+        Its journal record must be for the current remote file (size, mtime
+        and digest, if journaled) and the last committed bytes must still
+        match the remote file. A partial file from before the journal only
+        gets the tail check.
+        """
+        temp_path = local_path + '.part'
+        if not os.path.exists(temp_path):
+            return
+        record = load_record(temp_path + RANGES_SUFFIX)
+        valid = record is None or record_matches(record, remote_stat.st_size, remote_stat.st_mtime, digest)
+        if valid:
+            offset, length = tail_range(*committed_end(record, os.path.getsize(temp_path)))
+            if length:
+                with open(temp_path, 'rb') as local_file:
+                    local_file.seek(offset)
+                    local_tail = local_file.read(length)
+                with sftp.open(remote_path, 'rb') as remote_file:
+                    remote_file.seek(offset)
+                    valid = remote_file.read(length) == local_tail
+        if not valid:
+            self.discard_partial_download(local_path)
+            self._notify_verification(
+                connection_name, remote_path, "restarted", "partial download is stale, starting over"
+            )
+
+    def _check_upload_resume(self, connection_name, local_path, remote_path, local_stat, digest=None):
+        """Upload counterpart of _check_download_resume, for the remote .part file"""
+        state_path = upload_state_path(connection_name, remote_path)
+        record = load_record(state_path)
+        with self._sftp_session(connection_name) as sftp:
+            try:
+                partial_size = sftp.stat(remote_path + '.part').st_size
+            except FileNotFoundError:
+                remove_record(state_path)
+                return
+            valid = record is None or record_matches(record, local_stat.st_size, local_stat.st_mtime, digest)
+            if valid:
+                offset, length = tail_range(*committed_end(record, partial_size))
+                if length:
+                    with sftp.open(remote_path + '.part', 'rb') as remote_file:
+                        remote_file.seek(offset)
+                        remote_tail = remote_file.read(length)
+                    with open(local_path, 'rb') as local_file:
+                        local_file.seek(offset)
+                        valid = local_file.read(length) == remote_tail
+        if not valid:
+            self.discard_partial_upload(connection_name, remote_path)
+            self._notify_verification(
+                connection_name, remote_path, "restarted", "partial upload is stale, starting over"
+            )
+
+    def _notify_verification(self, connection_name, path, status, message):
+        if self.verify_callback:
+            try:
+                self.verify_callback(connection_name, path, status, message)
+            except Exception:
+                pass
+
+    def _report_verification(self, connection_name, path, verification):
+        if verification is None or verification.local_digest is None:
+            return
+        if verification.skipped_reason:
+            self._notify_verification(
+                connection_name, path, "skipped", f"not verified: {verification.skipped_reason}"
+            )
+        else:
+            self._notify_verification(
+                connection_name, path, "verified", f"{verification.algorithm} {verification.local_digest}"
+            )
+
+    def _with_integrity_policy(self, connection_name, path, operation, discard):
+        """Run a transfer; on a hash mismatch discard its partial file and fail or retry per policy"""
+        attempts = 2 if self.verify_policy == VERIFY_RETRY else 1
+        for attempt in range(attempts):
+            try:
+                return operation()
+            except IntegrityError as e:
+                discard()
+                retrying = attempt + 1 < attempts
+                self._notify_verification(
+                    connection_name, path, "mismatch", f"{e}; retrying" if retrying else str(e)
+                )
+                if not retrying:
+                    raise
+
+    def _run_with_reconnect(self, connection_name, operation, peer_connection=None):
+        """Run ``operation`` and, if the transport drops, reconnect and run it again.
+
+        Transfer operations resume from their ``.part`` file, so each retry
+        continues from the last byte committed before the connection was lost.
+        ``peer_connection`` is a second connection the operation uses (a
+        relay's source); only the side that was lost is reconnected, and both
+        share one retry budget. Pause and cancel are re-raised at once.
+        """
+        connections = (connection_name,) if peer_connection is None else (connection_name, peer_connection)
+        delay = self.transfer_retry_delay
+        for attempt in range(self.transfer_retries + 1):
+            try:
+                return operation()
+            except (TransferPaused, TransferCancelled):
+                raise
+            except Exception as e:
+                lost = self._lost_connections(connections, e)
+                if attempt >= self.transfer_retries or not lost:
+                    raise
+                # Sessions on the old transport are useless, drop them before reconnecting
+                for name in lost:
+                    self._close_cached_sftp(name)
+                time.sleep(delay)
+                delay *= 2
+                for name in lost:
+                    try:
+                        self.ssh_manager.connect(name)
+                    except Exception:
+                        # The next attempt fails fast and counts against the retry budget
+                        pass
+
+    def download_file(self, connection_name, remote_path, local_path, progress_callback=None,
+                      allow_parallel=True, throttle=None, sessions=None):
+        """Download file, transparently reconnecting and resuming if the transport drops.
+
+        ``allow_parallel=False`` keeps a new download on a single session
+        (callers that already run many files at once); an interrupted parallel
+        download is still resumed by the parallel engine. Such callers pass
+        one ``throttle`` for all their files, so together they get the
+        bandwidth share of a single transfer. ``sessions`` caps the pooled
+        sessions the download holds at once (see TransferQueue).
+
+        The content is hashed while it arrives and compared with the remote
+        file's hash before the final rename, per ``verify_policy`` (files of
+        at least ``verify_min_size`` bytes).
+        """
+        return self._with_integrity_policy(
+            connection_name, remote_path,
+            lambda: self._run_with_reconnect(
+                connection_name,
+                lambda: self._download_file_once(
+                    connection_name, remote_path, local_path, progress_callback, allow_parallel, throttle,
+                    sessions
+                )
+            ),
+            lambda: self.discard_partial_download(local_path)
+        )
+
+    def _download_file_once(self, connection_name, remote_path, local_path, progress_callback=None,
+                            allow_parallel=True, throttle=None, sessions=None):
         """Download file with optimized connection handling and resume support"""
-        sftp = self._get_sftp_client(connection_name)
+        throttle = throttle or self.bandwidth.throttle(connection_name)
 
-        # Check if partial file exists for resume
-        if os.path.exists(local_path + '.part'):
-            # Get remote file size
+        with self._sftp_session(connection_name) as sftp:
             remote_stat = sftp.stat(remote_path)
-            remote_size = remote_stat.st_size
+            verification = self._new_verification(connection_name, remote_stat.st_size)
+            if verification:
+                # The remote side hashes while the data is in flight
+                verification.start_remote(remote_path)
+            digest = self._source_digest(connection_name, remote_path=remote_path)
+            self._check_download_resume(connection_name, sftp, remote_path, local_path, remote_stat, digest)
+            allow_new = allow_parallel and self._parallel_session_count(sessions) > 1
+            if not self._use_parallel_download(local_path, remote_stat, allow_new):
+                self._download_sequential(
+                    connection_name, sftp, remote_path, local_path, remote_stat, progress_callback,
+                    verification, digest, throttle
+                )
+                self._report_verification(connection_name, remote_path, verification)
+                return
+
+        # Outside the session above: the engine checks out its own sessions
+        parallel_download(
+            self, connection_name, remote_path, local_path, remote_stat,
+            progress_callback=progress_callback,
+            sessions=self._parallel_session_count(sessions),
+            block_size=self.parallel_block_size,
+            verification=verification,
+            source_digest=digest,
+            throttle=throttle
+        )
+        self._report_verification(connection_name, remote_path, verification)
+
+    def transfer_session_limit(self):
+        """Pooled sessions per connection that transfers may hold together"""
+        return max(1, self.sftp_pool_size - self.interactive_sessions)
+
+    @contextmanager
+    def extra_sessions(self, connection_name, count):
+        """Grow the connection's pool by up to ``count`` sessions for the duration of the block.
+
+        Tree jobs bring their own sessions this way instead of competing for
+        the shared ones. The pool never grows past
+        ``max_sessions_per_connection``; yields the number of sessions added.
+        A pool recreated after a reconnect keeps the growth.
+        """
+        with self._cache_lock:
+            current = self.sftp_pool_size + self._extra_sessions.get(connection_name, 0)
+            added = max(0, min(count, self.max_sessions_per_connection - current))
+            self._extra_sessions[connection_name] = self._extra_sessions.get(connection_name, 0) + added
+        self._resize_pool(connection_name)
+        try:
+            yield added
+        finally:
+            with self._cache_lock:
+                remaining = self._extra_sessions.get(connection_name, 0) - added
+                if remaining > 0:
+                    self._extra_sessions[connection_name] = remaining
+                else:
+                    self._extra_sessions.pop(connection_name, None)
+            self._resize_pool(connection_name)
 
+    def _resize_pool(self, connection_name):
+        with self._cache_lock:
+            pool = self._sftp_pools.get(connection_name)
+            size = self.sftp_pool_size + self._extra_sessions.get(connection_name, 0)
+        if pool:
+            pool.resize(size)
+
+    def free_transfer_sessions(self, connection_name):
+        """Sessions a transfer on the connection could check out right now without waiting"""
+        return self._get_pool(connection_name).available()
+
+    def _parallel_session_count(self, sessions=None):
+        count = min(self.parallel_sessions, self.transfer_session_limit())
+        if sessions:
+            count = min(count, sessions)
+        return max(1, count)
+
+    def _use_parallel_download(self, local_path, remote_stat, allow_new=True):
+        temp_path = local_path + '.part'
+        record = load_record(temp_path + RANGES_SUFFIX)
+        if record is not None and record["mode"] == MODE_PARALLEL:
+            # An interrupted parallel download, resume it with the same engine
+            return True
+        if os.path.exists(temp_path):
+            return False  # Sequential partial file, resume by appending
+        return allow_new and remote_stat.st_size >= self.parallel_threshold
+
+    def _download_sequential(self, connection_name, sftp, remote_path, local_path, remote_stat,
+                             progress_callback=None, verification=None, digest=None, throttle=None):
+        """Single-session download, resuming an existing .part file by appending"""
+        remote_size = remote_stat.st_size
+        state_path = local_path + '.part' + RANGES_SUFFIX
+
+        # Check if partial file exists for resume
+        if os.path.exists(local_path + '.part'):
             # Get local partial file size
             local_size = os.path.getsize(local_path + '.part')
 
             if local_size < remote_size:
                 # Resume download
+                if verification:
+                    # Only the bytes already on disk are read back; the rest is hashed in-stream
+                    hash_file_range(local_path + '.part', 0, local_size, verification.hasher)
                 with open(local_path + '.part', 'ab') as local_file:
+                    if verification:
+                        local_file = HashingWriter(local_file, verification.hasher)
                     with sftp.open(remote_path, 'rb') as remote_file:
-                        remote_file.seek(local_size)
-                        chunk_size = 32768  # 32KB chunks for better performance
-                        bytes_transferred = local_size
-
-                        while bytes_transferred < remote_size:
-                            chunk = remote_file.read(chunk_size)
-                            if not chunk:
-                                break
-                            local_file.write(chunk)
-                            bytes_transferred += len(chunk)
-
-                            if progress_callback:
-                                progress_callback(bytes_transferred, remote_size)
+                        stream_download(
+                            remote_file, local_file, local_size, remote_size, progress_callback,
+                            depth=self.pipeline_depth, block_size=self.pipeline_block_size,
+                            throttle=throttle
+                        )
+                if verification:
+                    verification.verify()
 
                 # Rename completed file
                 os.rename(local_path + '.part', local_path)
+                remove_record(state_path)
                 return
 
         # Regular download with progress tracking
         try:
-            # Get file size for progress calculation
-            remote_stat = sftp.stat(remote_path)
-            file_size = remote_stat.st_size
-
             # Use temporary file for atomic operation
             temp_path = local_path + '.part'
 
             def enhanced_progress_callback(transferred, total):
                 if progress_callback:
-                    progress_callback(transferred, file_size)
-
-            sftp.get(remote_path, temp_path, callback=enhanced_progress_callback)
+                    progress_callback(transferred, remote_size)
+
+            # Journal which remote file this partial file is a copy of
+            save_record(state_path, MODE_SEQUENTIAL, remote_size, remote_stat.st_mtime, [], digest)
+            with open(temp_path, 'wb') as local_file:
+                target = HashingWriter(local_file, verification.hasher) if verification else local_file
+                # Not getfo: it prefetches the whole file and buffers whatever the disk can't take yet
+                with sftp.open(remote_path, 'rb') as remote_file:
+                    stream_download(
+                        remote_file, target, 0, remote_size, enhanced_progress_callback,
+                        depth=self.pipeline_depth, block_size=self.pipeline_block_size,
+                        throttle=throttle
+                    )
+            if verification:
+                verification.verify()
 
             # Rename to final name when complete
             os.rename(temp_path, local_path)
+            remove_record(state_path)
 
         except Exception as e:
-            # Clean up partial file on error
-            if os.path.exists(local_path + '.part'):
-                os.remove(local_path + '.part')
+            # Clean up partial file on error, but keep it for resume if paused or the connection dropped
+            if not self._keep_partial(connection_name, e):
+                self.discard_partial_download(local_path)
             raise e
 
-    def upload_file(self, connection_name, local_path, remote_path, progress_callback=None):
-        """Upload file with optimized connection handling and resume support"""
-        sftp = self._get_sftp_client(connection_name)
-
-        # Get local file size
-        local_size = os.path.getsize(local_path)
+    def upload_file(self, connection_name, local_path, remote_path, progress_callback=None,
+                    allow_parallel=True, throttle=None, sessions=None, mtime=None):
+        """Upload file, transparently reconnecting and resuming if the transport drops.
+
+        ``allow_parallel``, ``throttle``, ``sessions`` and verification work
+        as for download_file; the remote ``.part`` file is hashed before it
+        is renamed into place. ``mtime``, if given, is set on the remote
+        file, by the session that wrote it where there is one.
+
+        With the artifact cache enabled, content the host already holds is
+        copied on the host instead of sent, and what is sent is added to it.
+        """
+        copied, digest, hashed_stat = self._cached_upload(
+            connection_name, local_path, remote_path, progress_callback
+        )
+        if copied:
+            self._set_remote_mtime(connection_name, remote_path, mtime)
+            return
+        result = self._with_integrity_policy(
+            connection_name, remote_path,
+            lambda: self._run_with_reconnect(
+                connection_name,
+                lambda: self._upload_file_once(
+                    connection_name, local_path, remote_path, progress_callback, allow_parallel, throttle,
+                    sessions, mtime
+                )
+            ),
+            lambda: self.discard_partial_upload(connection_name, remote_path)
+        )
+        if digest:
+            try:
+                local_stat = os.stat(local_path)
+                # The digest is only the uploaded content's if the file did not change since it was hashed
+                if (local_stat.st_size, local_stat.st_mtime) == (hashed_stat.st_size, hashed_stat.st_mtime):
+                    self.artifact_cache.store(
+                        self.ssh_manager.get_client(connection_name), connection_name, digest,
+                        local_stat.st_size, remote_path
+                    )
+            except Exception:
+                pass  # The upload itself succeeded; the next one just transfers again
+        return result
+
+    def _cached_upload(self, connection_name, local_path, remote_path, progress_callback=None):
+        """Try to produce ``remote_path`` from the host's artifact cache.
+
+        Returns ``(copied, digest, local_stat)``: whether the target was
+        produced from the cache, and if not, the local file's digest (None
+        if the upload is not to be cached) with the stat it was computed
+        from.
+        """
+        cache = self.artifact_cache
+        local_stat = os.stat(local_path)
+        if not cache.applies_to(local_stat.st_size):
+            return False, None, local_stat
+        if load_record(upload_state_path(connection_name, remote_path)) is not None:
+            return False, None, local_stat  # Finish the interrupted upload instead
+        client = self.ssh_manager.get_client(connection_name)
+        if not client:
+            return False, None, local_stat
+        digest = cache.local_digest(local_path, local_stat)
+        if cache.materialize(client, connection_name, digest, local_stat.st_size, remote_path):
+            if progress_callback:
+                progress_callback(local_stat.st_size, local_stat.st_size)
+            self._notify_verification(
+                connection_name, remote_path, "cached", f"copied on the host from sha256 {digest}"
+            )
+            return True, digest, local_stat
+        return False, digest, local_stat
+
+    def _use_parallel_upload(self, connection_name, remote_path, local_size, allow_new=True):
+        record = load_record(upload_state_path(connection_name, remote_path))
+        if record is not None and record["mode"] == MODE_PARALLEL:
+            # An interrupted parallel upload, resume it with the same engine
+            return True
+        if not allow_new or local_size < self.parallel_threshold:
+            return False
+        with self._sftp_session(connection_name) as sftp:
+            try:
+                sftp.stat(remote_path + '.part')
+                return False  # Sequential partial file, resume by appending
+            except FileNotFoundError:
+                return True
+
+    def _use_delta_upload(self, connection_name, remote_path, local_size):
+        """Whether to update an existing remote copy with a delta instead of resending it"""
+        if not self.delta_threshold or local_size < self.delta_threshold:
+            return False
+        if os.path.exists(upload_state_path(connection_name, remote_path)):
+            return False  # An interrupted upload takes precedence
+        with self._sftp_session(connection_name) as sftp:
+            try:
+                sftp.stat(remote_path + '.part')
+                return False  # So does an interrupted sequential upload
+            except FileNotFoundError:
+                pass
+            try:
+                return stat.S_ISREG(sftp.stat(remote_path).st_mode)
+            except FileNotFoundError:
+                return False
 
-        # Check if partial remote file exists for resume
-        temp_remote_path = remote_path + '.part'
-        remote_size = 0
+    def _set_remote_mtime(self, connection_name, remote_path, mtime):
+        """Set the mtime of a file written by something other than an SFTP session (cache, delta helper)"""
+        if mtime is None:
+            return
+        with self._sftp_session(connection_name) as sftp:
+            sftp.utime(remote_path, (mtime, mtime))
 
-        try:
-            remote_stat = sftp.stat(temp_remote_path)
-            remote_size = remote_stat.st_size
-        except FileNotFoundError:
-            remote_size = 0
+    def _upload_file_once(self, connection_name, local_path, remote_path, progress_callback=None,
+                          allow_parallel=True, throttle=None, sessions=None, mtime=None):
+        """Upload file with optimized connection handling and resume support"""
+        # Get local file size
+        local_stat = os.stat(local_path)
+        local_size = local_stat.st_size
+        digest = self._source_digest(connection_name, local_path=local_path, size=local_size)
+        self._check_upload_resume(connection_name, local_path, remote_path, local_stat, digest)
+        throttle = throttle or self.bandwidth.throttle(connection_name)
+
+        if self._use_delta_upload(connection_name, remote_path, local_size):
+            client = self.ssh_manager.get_client(connection_name)
+            if client and remote_supports_delta(client):
+                # The delta helper checks the md5 of the whole result before replacing the file
+                delta_upload(client, local_path, remote_path, local_size, progress_callback, throttle)
+                if self.verify_policy != VERIFY_OFF:
+                    self._notify_verification(connection_name, remote_path, "verified", "md5 (delta)")
+                self._set_remote_mtime(connection_name, remote_path, mtime)
+                return
 
-        if remote_size > 0 and remote_size < local_size:
-            # Resume upload
-            with open(local_path, 'rb') as local_file:
-                with sftp.open(temp_remote_path, 'ab') as remote_file:
-                    local_file.seek(remote_size)
-                    chunk_size = 32768  # 32KB chunks
-                    bytes_transferred = remote_size
-
-                    while bytes_transferred < local_size:
-                        chunk = local_file.read(chunk_size)
-                        if not chunk:
-                            break
-                        remote_file.write(chunk)
-                        bytes_transferred += len(chunk)
-
-                        if progress_callback:
-                            progress_callback(bytes_transferred, local_size)
-
-            # Rename completed file
-            sftp.rename(temp_remote_path, remote_path)
+        verification = self._new_verification(connection_name, local_size)
+        allow_new = allow_parallel and self._parallel_session_count(sessions) > 1
+        if self._use_parallel_upload(connection_name, remote_path, local_size, allow_new):
+            parallel_upload(
+                self, connection_name, local_path, remote_path,
+                progress_callback=progress_callback,
+                sessions=self._parallel_session_count(sessions),
+                block_size=self.parallel_block_size,
+                verification=verification,
+                source_digest=digest,
+                throttle=throttle
+            )
+            self._report_verification(connection_name, remote_path, verification)
+            self._set_remote_mtime(connection_name, remote_path, mtime)
             return
 
-        # Regular upload with progress tracking
-        try:
-            def enhanced_progress_callback(transferred, total):
-                if progress_callback:
-                    progress_callback(transferred, local_size)
+        state_path = upload_state_path(connection_name, remote_path)
+        with self._sftp_session(connection_name) as sftp:
+            # Check if partial remote file exists for resume
+            temp_remote_path = remote_path + '.part'
+            remote_size = 0
 
-            sftp.put(local_path, temp_remote_path, callback=enhanced_progress_callback)
+            try:
+                remote_stat = sftp.stat(temp_remote_path)
+                remote_size = remote_stat.st_size
+            except FileNotFoundError:
+                remote_size = 0
+
+            if remote_size > 0 and remote_size < local_size:
+                # Resume upload
+                if verification:
+                    hash_file_range(local_path, 0, remote_size, verification.hasher)
+                with open(local_path, 'rb') as local_file:
+                    if verification:
+                        local_file = HashingReader(local_file, verification.hasher)
+                    with sftp.open(temp_remote_path, 'r+b') as remote_file:
+                        stream_upload(
+                            local_file, remote_file, remote_size, local_size, progress_callback,
+                            depth=self.pipeline_depth, block_size=self.pipeline_block_size,
+                            throttle=throttle
+                        )
+                if verification:
+                    verification.verify(temp_remote_path)
+                if mtime is not None:
+                    sftp.utime(temp_remote_path, (mtime, mtime))  # Kept by the rename
 
-            # Rename to final name when complete
-            sftp.rename(temp_remote_path, remote_path)
+                # Rename completed file
+                sftp.rename(temp_remote_path, remote_path)
+                remove_record(state_path)
+                self._report_verification(connection_name, remote_path, verification)
+                return
 
-        except Exception as e:
-            # Clean up partial file on error
+            # Regular upload with progress tracking
             try:
-                sftp.remove(temp_remote_path)
-            except:
-                pass
-            raise e
+                def enhanced_progress_callback(transferred, total):
+                    if progress_callback:
+                        progress_callback(transferred, local_size)
+
+                # Journal which version of the local file the remote partial file is a copy of
+                save_record(state_path, MODE_SEQUENTIAL, local_size, local_stat.st_mtime, [], digest)
+                with open(local_path, 'rb') as local_file:
+                    source = HashingReader(local_file, verification.hasher) if verification else local_file
+                    if throttle.limited:
+                        source = ThrottledReader(source, throttle)
+                    sftp.putfo(source, temp_remote_path, file_size=local_size,
+                               callback=enhanced_progress_callback)
+                if verification:
+                    verification.verify(temp_remote_path)
+                if mtime is not None:
+                    sftp.utime(temp_remote_path, (mtime, mtime))  # Kept by the rename
+
+                # Rename to final name when complete
+                sftp.rename(temp_remote_path, remote_path)
+                remove_record(state_path)
+                self._report_verification(connection_name, remote_path, verification)
+
+            except Exception as e:
+                # Clean up partial file on error, but keep it for resume if paused or the connection dropped
+                if not self._keep_partial(connection_name, e):
+                    remove_record(state_path)
+                    try:
+                        sftp.remove(temp_remote_path)
+                    except:
+                        pass
+                raise e
+
+    def relay_file(self, source_connection, source_path, target_connection, target_path,
+                   progress_callback=None):
+        """Copy a file from one connection to another without a local copy.
+
+        Blocks stream from an SFTP session on the source host into
+        ``target_path + '.part'`` on the target host through the bounded
+        read-ahead pipeline of stream_download, with pipelined writes on the
+        target; nothing is written to local disk. Either transport dropping
+        reconnects it and resumes from the target's ``.part`` file, which is
+        journaled against the source's size and mtime like an upload. The
+        blocks are hashed as they pass through and compared with the hash of
+        the target's ``.part`` file before the final rename, per
+        ``verify_policy``.
+        """
+        # The target is usually not the connection the user is browsing
+        self.ssh_manager.connect(source_connection)
+        self.ssh_manager.connect(target_connection)
+        return self._with_integrity_policy(
+            target_connection, target_path,
+            lambda: self._run_with_reconnect(
+                target_connection,
+                lambda: self._relay_file_once(
+                    source_connection, source_path, target_connection, target_path, progress_callback
+                ),
+                peer_connection=source_connection
+            ),
+            lambda: self.discard_partial_upload(target_connection, target_path)
+        )
+
+    def _relay_file_once(self, source_connection, source_path, target_connection, target_path,
+                         progress_callback=None):
+        temp_path = target_path + '.part'
+        state_path = upload_state_path(target_connection, target_path)
+        source_throttle = self.bandwidth.throttle(source_connection)
+        # A copy within one host passes its cap once, not twice
+        target_throttle = None
+        if target_connection != source_connection:
+            target_throttle = self.bandwidth.throttle(target_connection)
+
+        with self._sftp_session(source_connection) as source_sftp, \
+                self._sftp_session(target_connection) as target_sftp:
+            source_stat = source_sftp.stat(source_path)
+            size = source_stat.st_size
+            verification = self._new_verification(target_connection, size)
+            offset = self._relay_resume_offset(
+                source_connection, source_sftp, source_path, target_connection, target_sftp,
+                target_path, source_stat
+            )
+            try:
+                if not offset:
+                    # Journal which version of the source the target's partial file is a copy of
+                    save_record(state_path, MODE_SEQUENTIAL, size, source_stat.st_mtime, [])
+                elif verification:
+                    # Only the bytes already on the target are read back; the rest is hashed in-stream
+                    self._hash_remote_prefix(target_sftp, temp_path, offset, verification.hasher)
+                with source_sftp.open(source_path, 'rb') as source_file, \
+                        target_sftp.open(temp_path, 'r+b' if offset else 'wb') as target_file:
+                    target_file.seek(offset)
+                    target_file.set_pipelined(True)
+                    target = HashingWriter(target_file, verification.hasher) if verification else target_file
+                    if target_throttle is not None and target_throttle.limited:
+                        target = ThrottledWriter(target, target_throttle)
+                    stream_download(
+                        source_file, target, offset, size, progress_callback,
+                        depth=self.pipeline_depth, block_size=self.pipeline_block_size,
+                        throttle=source_throttle
+                    )
+                # Closing waited for every pipelined write
+                target_size = target_sftp.stat(temp_path).st_size
+                if target_size != size:
+                    raise IOError(f"Size mismatch after relay: {target_size} != {size}")
+                if verification:
+                    verification.verify(temp_path)
+
+                target_sftp.rename(temp_path, target_path)
+                remove_record(state_path)
+                self._report_verification(target_connection, target_path, verification)
+            except Exception as e:
+                # Keep the partial file for resume if paused or either connection dropped
+                if not (self._keep_partial(source_connection, e) or self._keep_partial(target_connection, e)):
+                    remove_record(state_path)
+                    try:
+                        target_sftp.remove(temp_path)
+                    except Exception:
+                        pass
+                raise
+        if progress_callback and not size:
+            progress_callback(0, 0)
+
+    def _hash_remote_prefix(self, sftp, remote_path, length, hasher):
+        """Feed the first ``length`` bytes of a remote file to ``hasher``"""
+        with sftp.open(remote_path, 'rb') as remote_file:
+            position = 0
+            while position < length:
+                data = read_range(remote_file, position, min(self.pipeline_block_size, length - position))
+                if not data:
+                    raise IOError(f"{remote_path} is shorter than {length} bytes")
+                hasher.update(data)
+                position += len(data)
+
+    def _relay_resume_offset(self, source_connection, source_sftp, source_path, target_connection,
+                             target_sftp, target_path, source_stat):
+        """How much of the target's .part file a relay can keep; 0 to start over.
+
+        Unlike uploads there is no legacy partial file without a journal
+        record, so a missing record means starting over.
+        """
+        temp_path = target_path + '.part'
+        try:
+            partial_size = target_sftp.stat(temp_path).st_size
+        except FileNotFoundError:
+            return 0
+        record = load_record(upload_state_path(target_connection, target_path))
+        valid = (
+            record is not None and record["mode"] == MODE_SEQUENTIAL
+            and record_matches(record, source_stat.st_size, source_stat.st_mtime)
+            and partial_size <= source_stat.st_size
+        )
+        if valid:
+            offset, length = tail_range(0, partial_size)
+            if length:
+                with target_sftp.open(temp_path, 'rb') as target_file:
+                    target_file.seek(offset)
+                    target_tail = target_file.read(length)
+                with source_sftp.open(source_path, 'rb') as source_file:
+                    source_file.seek(offset)
+                    valid = source_file.read(length) == target_tail
+        if not valid:
+            self._notify_verification(
+                target_connection, target_path, "restarted", "partial relay is stale, starting over"
+            )
+            return 0
+        return partial_size
 
     def delete_file(self, connection_name, remote_path):
         """Delete file with optimized connection handling"""
-        sftp = self._get_sftp_client(connection_name)
-        sftp.remove(remote_path)
+        with self._sftp_session(connection_name, interactive=True) as sftp:
+            sftp.remove(remote_path)
 
     def delete_directory(self, connection_name, remote_path):
         """Delete directory with optimized connection handling"""
-        sftp = self._get_sftp_client(connection_name)
-        # This is a simple implementation. A robust one would recursively delete contents.
-        sftp.rmdir(remote_path)
+        with self._sftp_session(connection_name, interactive=True) as sftp:
+            # This is a simple implementation. A robust one would recursively delete contents.
+            sftp.rmdir(remote_path)
 
     def rename_file(self, connection_name, old_remote_path, new_remote_path):
         """Rename file with optimized connection handling"""
-        sftp = self._get_sftp_client(connection_name)
-        sftp.rename(old_remote_path, new_remote_path)
+        with self._sftp_session(connection_name, interactive=True) as sftp:
+            sftp.rename(old_remote_path, new_remote_path)
 
     def create_directory(self, connection_name, remote_path):
         """Create directory with optimized connection handling"""
-        sftp = self._get_sftp_client(connection_name)
-        sftp.mkdir(remote_path)
+        with self._sftp_session(connection_name, interactive=True) as sftp:
+            sftp.mkdir(remote_path)
 
     def cleanup_connections(self):
-        """Clean up all cached SFTP connections"""
+        """Close all SFTP session pools"""
         with self._cache_lock:
-            for connection_name in list(self._sftp_cache.keys()):
-                try:
-                    self._sftp_cache[connection_name]['client'].close()
-                except:
-                    pass
-            self._sftp_cache.clear()
+            pools = list(self._sftp_pools.values())
+            self._sftp_pools.clear()
+        for pool in pools:
+            pool.close()
@@ -0,0 +1,176 @@
+import shlex
+import hashlib
+import threading
+from core.remote_exec import run_command
+
+try:
+    import xxhash  # Optional, much faster than sha256 when the remote has xxhsum too
+except ImportError:
+    xxhash = None
+
+# Remote command per algorithm; the digest is the first word of its output
+REMOTE_COMMANDS = {
+    "xxh64": "xxhsum -H1 {path}",
+    "sha256": "sha256sum -- {path} 2>/dev/null || shasum -a 256 {path}",
+}
+
+HASH_READ_SIZE = 1024 * 1024
+
+
+class IntegrityError(IOError):
+    """The transferred file does not hash the same on both sides"""
+
+
+def new_hasher(algorithm):
+    if algorithm == "xxh64":
+        return xxhash.xxh64()
+    return hashlib.sha256()
+
+
+def choose_algorithm(client):
+    """xxh64 if both sides support it, else sha256"""
+    if xxhash is not None:
+        try:
+            run_command(client, "command -v xxhsum >/dev/null 2>&1")
+            return "xxh64"
+        except Exception:
+            pass
+    return "sha256"
+
+
+def remote_digest(client, remote_path, algorithm):
+    output = run_command(client, REMOTE_COMMANDS[algorithm].format(path=shlex.quote(remote_path)))
+    return output.split()[0].lower()
+
+
+def hash_file_range(path, start, end, hasher):
+    """Feed bytes [start, end) of a local file to ``hasher``"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            data = f.read(min(HASH_READ_SIZE, remaining))
+            if not data:
+                raise IOError(f"{path} is shorter than expected")
+            hasher.update(data)
+            remaining -= len(data)
+
+
+class HashingWriter:
+    """File wrapper hashing everything written through it"""
+
+    def __init__(self, fileobj, hasher):
+        self.fileobj = fileobj
+        self.hasher = hasher
+
+    def write(self, data):
+        self.hasher.update(data)
+        return self.fileobj.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
+
+
+class HashingReader:
+    """File wrapper hashing everything read through it (reads must be sequential)"""
+
+    def __init__(self, fileobj, hasher):
+        self.fileobj = fileobj
+        self.hasher = hasher
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.hasher.update(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
+
+
+class OrderedHasher:
+    """Hashes blocks that arrive out of order, as the parallel engines produce them.
+
+    Blocks are held until every byte before them has been hashed. Ranges
+    completed by an earlier, interrupted run are read back from
+    ``local_path`` when the hash reaches them.
+    """
+
+    def __init__(self, hasher, local_path, existing_ranges=()):
+        self.hasher = hasher
+        self.local_path = local_path
+        self._existing = sorted(tuple(r) for r in existing_ranges)
+        self._pending = {}  # {offset: data}
+        self._cursor = 0
+        self._lock = threading.Lock()
+
+    def feed(self, offset, data):
+        with self._lock:
+            self._pending[offset] = bytes(data)
+            self._advance()
+
+    def finish(self, size):
+        with self._lock:
+            self._advance()
+            if self._cursor != size:
+                raise IOError(f"Hashed {self._cursor} of {size} bytes of {self.local_path}")
+
+    def _advance(self):
+        while True:
+            data = self._pending.pop(self._cursor, None)
+            if data is not None:
+                self.hasher.update(data)
+                self._cursor += len(data)
+                continue
+            existing = next((r for r in self._existing if r[0] <= self._cursor < r[1]), None)
+            if existing is None:
+                return
+            hash_file_range(self.local_path, self._cursor, existing[1], self.hasher)
+            self._cursor = existing[1]
+
+
+class Verification:
+    """Compares a transfer's in-stream local hash with the remote file's hash.
+
+    Engines feed ``hasher`` while bytes move and call ``verify`` before the
+    final rename. For downloads the remote hash can start right away with
+    ``start_remote`` so it runs while the data is still in flight.
+    """
+
+    def __init__(self, client, algorithm):
+        self.client = client
+        self.algorithm = algorithm
+        self.hasher = new_hasher(algorithm)
+        self.local_digest = None
+        self.remote_digest = None
+        self.skipped_reason = ""
+        self._remote_thread = None
+        self._remote_error = None
+
+    def start_remote(self, remote_path):
+        def run():
+            try:
+                self.remote_digest = remote_digest(self.client, remote_path, self.algorithm)
+            except Exception as e:
+                self._remote_error = e
+
+        self._remote_thread = threading.Thread(target=run, name="ssh-remote-hash", daemon=True)
+        self._remote_thread.start()
+
+    def verify(self, remote_path=None):
+        """Raise IntegrityError on mismatch; returns False if the remote hash was unavailable"""
+        self.local_digest = self.hasher.hexdigest().lower()
+        if self._remote_thread is None:
+            try:
+                self.remote_digest = remote_digest(self.client, remote_path, self.algorithm)
+            except Exception as e:
+                self._remote_error = e
+        else:
+            self._remote_thread.join()
+        if self._remote_error is not None or not self.remote_digest:
+            self.skipped_reason = str(self._remote_error or "no remote digest")
+            return False
+        if self.local_digest != self.remote_digest:
+            raise IntegrityError(
+                f"{self.algorithm} mismatch: local {self.local_digest}, remote {self.remote_digest}"
+            )
+        return True
@@ -0,0 +1,89 @@
+import os
+import hashlib
+import threading
+import paramiko
+
+# paramiko >= 3.2 detects the key type from the file itself
+_HAS_FROM_PATH = hasattr(paramiko.PKey, 'from_path')
+
+# Key types tried in order on older paramiko, where the file format does not tell us
+_KEY_CLASSES = [
+    cls for cls in (
+        getattr(paramiko, 'Ed25519Key', None),
+        paramiko.ECDSAKey,
+        paramiko.RSAKey,
+        getattr(paramiko, 'DSSKey', None),
+    ) if cls is not None
+]
+
+_cache = {}  # {abs_path: (mtime_ns, size, passphrase tag, PKey)}
+_cache_lock = threading.Lock()
+
+
+def load_private_key(key_path, passphrase=None):
+    """Load a private key, reusing the parsed PKey while the file is unchanged.
+
+    Parsing (and for encrypted OpenSSH keys, running the bcrypt KDF) happens
+    once per file version and passphrase per process instead of on every
+    connect. Only successes are cached, so a corrected passphrase is
+    simply tried again.
+    """
+    path = os.path.abspath(os.path.expanduser(key_path))
+    file_stat = os.stat(path)
+    identity = (file_stat.st_mtime_ns, file_stat.st_size, _passphrase_tag(passphrase))
+
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[:3] == identity:
+            return cached[3]
+
+    pkey = _parse_key(path, passphrase)
+
+    with _cache_lock:
+        _cache[path] = identity + (pkey,)
+    return pkey
+
+
+def _passphrase_tag(passphrase):
+    """Cache-key stand-in for a passphrase, so the passphrase itself is not kept"""
+    if not passphrase:
+        return None
+    if isinstance(passphrase, str):
+        passphrase = passphrase.encode('utf-8')
+    return hashlib.sha256(passphrase).digest()
+
+
+def _parse_key(path, passphrase):
+    if _HAS_FROM_PATH:
+        # One parse, and one KDF run for encrypted keys, whatever the key type
+        password = passphrase.encode('utf-8') if isinstance(passphrase, str) else passphrase
+        try:
+            return paramiko.PKey.from_path(path, password or None)
+        except TypeError as e:
+            # The crypto backend's way of saying the key is encrypted
+            if not password:
+                raise paramiko.PasswordRequiredException(str(e))
+            raise paramiko.SSHException(f"Invalid private key {path}: {e}")
+        except (ValueError, paramiko.UnknownKeyType, paramiko.SSHException) as e:
+            raise paramiko.SSHException(
+                f"Unsupported or invalid private key {path}, or wrong passphrase: {e}"
+            )
+
+    last_error = None
+    for key_class in _KEY_CLASSES:
+        try:
+            return key_class.from_private_key_file(path, password=passphrase)
+        except paramiko.PasswordRequiredException:
+            raise
+        except paramiko.SSHException as e:
+            last_error = e
+    raise paramiko.SSHException(f"Unsupported or invalid private key {path}: {last_error}")
+
+
+def clear_key_cache(key_path=None):
+    """Forget one cached key, or all of them"""
+    with _cache_lock:
+        if key_path is None:
+            _cache.clear()
+        else:
+            _cache.pop(os.path.abspath(os.path.expanduser(key_path)), None)
@@ -0,0 +1,479 @@
+import os
+import time
+import queue
+import threading
+from core.integrity import OrderedHasher
+from core.sftp_pool import SFTPPoolTimeout
+from core.transfer_journal import (
+    MODE_PARALLEL, RANGES_SUFFIX, load_record, save_record, remove_record, record_matches,
+    upload_state_path
+)
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024  # Unit of work handed to one session
+DEFAULT_REQUEST_SIZE = 32768  # Size of each pipelined SFTP read request
+DEFAULT_PIPELINE_DEPTH = 8  # Blocks held between the reading and the writing side of a stream
+DEFAULT_PIPELINE_BLOCK_SIZE = 256 * 1024
+
+
+class RangeTracker:
+    """Thread-safe set of completed byte ranges, kept merged and sorted"""
+
+    def __init__(self, ranges=None):
+        self._ranges = []  # [[start, end)]
+        self._lock = threading.Lock()
+        for start, end in ranges or []:
+            self.add(start, end)
+
+    def add(self, start, end):
+        with self._lock:
+            merged = []
+            for r_start, r_end in self._ranges:
+                if r_end < start or r_start > end:
+                    merged.append([r_start, r_end])
+                else:
+                    start, end = min(start, r_start), max(end, r_end)
+            merged.append([start, end])
+            merged.sort()
+            self._ranges = merged
+
+    def completed_bytes(self):
+        with self._lock:
+            return sum(end - start for start, end in self._ranges)
+
+    def contains(self, start, end):
+        with self._lock:
+            return any(r_start <= start and end <= r_end for r_start, r_end in self._ranges)
+
+    def missing_blocks(self, size, block_size):
+        """(offset, length) blocks of ``[0, size)`` not yet completed"""
+        with self._lock:
+            ranges = list(self._ranges)
+        blocks = []
+        position = 0
+        for start, end in ranges + [[size, size]]:
+            while position < min(start, size):
+                length = min(block_size, start - position)
+                blocks.append((position, length))
+                position += length
+            position = max(position, end)
+        return blocks
+
+    def to_list(self):
+        with self._lock:
+            return [list(r) for r in self._ranges]
+
+
+def load_ranges(state_path, source_size, source_mtime, digest=None):
+    """Completed ranges journaled in ``state_path``, or None if missing or stale.
+
+    The record is only valid for the source version (size, mtime and
+    digest, if any) it was written for.
+    """
+    record = load_record(state_path)
+    if record is None or record["mode"] != MODE_PARALLEL:
+        return None
+    if not record_matches(record, source_size, source_mtime, digest):
+        return None
+    return RangeTracker(record["ranges"])
+
+
+def save_ranges(state_path, tracker, source_size, source_mtime, digest=None):
+    save_record(state_path, MODE_PARALLEL, source_size, source_mtime, tracker.to_list(), digest)
+
+
+def remove_ranges(state_path):
+    remove_record(state_path)
+
+
+def _request_chunks(offset, length, request_size):
+    chunks = []
+    end = offset + length
+    while offset < end:
+        size = min(request_size, end - offset)
+        chunks.append((offset, size))
+        offset += size
+    return chunks
+
+
+def read_range(remote_file, offset, length, request_size=DEFAULT_REQUEST_SIZE):
+    """Read ``length`` bytes at ``offset`` with one readv, its requests pipelined.
+
+    Unlike prefetch, nothing beyond the range is requested, so the data
+    held in memory is exactly what the caller asked for. Shorter at EOF.
+    """
+    return b"".join(remote_file.readv(_request_chunks(offset, length, request_size)))
+
+
+class _ProgressReporter:
+    """Aggregates progress from worker threads"""
+
+    def __init__(self, total, initial, callback):
+        self.total = total
+        self.transferred = initial
+        self.callback = callback
+        self._lock = threading.Lock()
+
+    def add(self, count):
+        with self._lock:
+            self.transferred += count
+            transferred = self.transferred
+        if self.callback:
+            self.callback(transferred, self.total)
+
+
+def _run_workers(worker_count, blocks, work, stop_event):
+    """Run ``work(block_queue, first)`` on ``worker_count`` threads; re-raise the first error.
+
+    Only the ``first`` worker waits for a pooled session. The others take
+    one only if it is free right away (``wait=first``); a worker that gets
+    none leaves the blocks to the workers that did.
+    """
+    block_queue = queue.Queue()
+    for block in blocks:
+        block_queue.put(block)
+
+    errors = []
+
+    def runner(first):
+        try:
+            work(block_queue, first)
+        except SFTPPoolTimeout as e:
+            if first:
+                errors.append(e)
+                stop_event.set()
+        except BaseException as e:
+            errors.append(e)
+            stop_event.set()
+
+    threads = [
+        threading.Thread(target=runner, args=(i == 0,), name=f"sftp-transfer-{i}", daemon=True)
+        for i in range(max(1, min(worker_count, len(blocks))))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def _pipe_blocks(read_block, write_block, depth, on_block=None):
+    """Copy blocks from ``read_block()`` to ``write_block(data)`` until an empty read.
+
+    Reading runs on its own thread so both sides stay busy instead of
+    taking turns. A block is only read while fewer than ``depth`` blocks are
+    held between the two sides (read but not yet written), which bounds
+    the memory in use however much slower the writer is.
+    """
+    blocks = queue.Queue()
+    slots = threading.Semaphore(max(1, depth))
+    stop_event = threading.Event()
+    errors = []
+
+    def reader():
+        try:
+            while True:
+                while not slots.acquire(timeout=0.5):
+                    if stop_event.is_set():
+                        return
+                if stop_event.is_set():
+                    return
+                data = read_block()
+                blocks.put(data)
+                if not data:
+                    return
+        except BaseException as e:
+            errors.append(e)
+            blocks.put(b"")
+
+    thread = threading.Thread(target=reader, name="sftp-stream-reader", daemon=True)
+    thread.start()
+    try:
+        while True:
+            data = blocks.get()
+            if not data:
+                break
+            write_block(data)
+            slots.release()
+            if on_block:
+                on_block(len(data))
+    finally:
+        stop_event.set()
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def stream_download(remote_file, local_file, offset, size, progress_callback=None,
+                    depth=DEFAULT_PIPELINE_DEPTH, block_size=DEFAULT_PIPELINE_BLOCK_SIZE, throttle=None):
+    """Copy ``remote_file`` from ``offset`` to ``size`` onto the end of ``local_file``.
+
+    Each block is requested with readv only when the pipeline has room for
+    it, and writes overlap with the network. At most ``depth`` blocks are
+    held in memory, however much slower the writing side is (prefetch
+    would keep receiving the whole file). Under a ``throttle`` each block
+    is also only requested once the throttle allows it.
+    """
+    if offset >= size:
+        return
+
+    read_position = [offset]
+    written = [offset]
+
+    def read_block():
+        if read_position[0] >= size:
+            return b""
+        length = min(block_size, size - read_position[0])
+        if throttle is not None:
+            throttle.consume(length)
+        data = read_range(remote_file, read_position[0], length)
+        read_position[0] += len(data)
+        return data
+
+    def on_block(length):
+        written[0] += length
+        if progress_callback:
+            progress_callback(written[0], size)
+
+    _pipe_blocks(read_block, local_file.write, depth, on_block)
+    if written[0] != size:
+        raise IOError(f"Short read: got {written[0]} of {size} bytes")
+
+
+def stream_upload(local_file, remote_file, offset, size, progress_callback=None,
+                  depth=DEFAULT_PIPELINE_DEPTH, block_size=DEFAULT_PIPELINE_BLOCK_SIZE, throttle=None):
+    """Copy ``local_file`` from ``offset`` to ``size`` into ``remote_file`` at ``offset``.
+
+    Writes are pipelined, so none waits for the previous acknowledgement,
+    and local reads run up to ``depth`` blocks ahead (paced by ``throttle``,
+    if given). The remote size is checked at the end, which also waits for
+    every outstanding write; no further writes may be issued on
+    ``remote_file`` afterwards.
+    """
+    if offset < size:
+        local_file.seek(offset)
+        remote_file.seek(offset)
+        remote_file.set_pipelined(True)
+        remaining = [size - offset]
+        written = [offset]
+
+        def read_block():
+            if remaining[0] <= 0:
+                return b""
+            data = local_file.read(min(block_size, remaining[0]))
+            remaining[0] -= len(data)
+            if throttle is not None:
+                throttle.consume(len(data))
+            return data
+
+        def on_block(length):
+            written[0] += length
+            if progress_callback:
+                progress_callback(written[0], size)
+
+        _pipe_blocks(read_block, remote_file.write, depth, on_block)
+        remote_file.flush()
+
+    remote_size = remote_file.stat().st_size
+    if remote_size != size:
+        raise IOError(f"Size mismatch after upload: {remote_size} != {size}")
+
+
+def parallel_download(file_manager, connection_name, remote_path, local_path, remote_stat,
+                      progress_callback=None, sessions=3, block_size=DEFAULT_BLOCK_SIZE,
+                      request_size=DEFAULT_REQUEST_SIZE, verification=None, source_digest=None,
+                      throttle=None):
+    """Download with many SFTP read requests in flight across several sessions.
+
+    Each session takes ``block_size`` blocks from a shared queue and reads
+    them with ``readv``, which pipelines every ``request_size`` request of
+    the block. Blocks are written at their offsets into a preallocated
+    ``.part`` file, out of order. Completed ranges are recorded in a sidecar
+    so an interrupted download resumes with only the missing blocks. With a
+    ``verification``, blocks are hashed in file order as they complete and
+    checked before the final rename. ``source_digest``, if given, is
+    journaled with the ranges as part of the remote file's identity.
+    ``throttle``, if given, is consumed before each block is requested.
+    """
+    temp_path = local_path + ".part"
+    state_path = temp_path + RANGES_SUFFIX
+    remote_size = remote_stat.st_size
+    remote_mtime = remote_stat.st_mtime
+
+    tracker = None
+    if os.path.exists(temp_path):
+        tracker = load_ranges(state_path, remote_size, remote_mtime, source_digest)
+    if tracker is None:
+        tracker = RangeTracker()
+        with open(temp_path, "wb") as f:
+            f.truncate(remote_size)  # Preallocate (sparse where supported)
+        save_ranges(state_path, tracker, remote_size, remote_mtime, source_digest)
+
+    blocks = tracker.missing_blocks(remote_size, block_size)
+    progress = _ProgressReporter(remote_size, tracker.completed_bytes(), progress_callback)
+    stop_event = threading.Event()
+    save_lock = threading.Lock()
+    last_save = [time.monotonic()]
+    ordered_hasher = None
+    if verification:
+        ordered_hasher = OrderedHasher(verification.hasher, temp_path, tracker.to_list())
+
+    def work(block_queue, first):
+        with file_manager._sftp_session(connection_name, wait=first) as sftp:
+            with sftp.open(remote_path, "rb") as remote_file, open(temp_path, "r+b") as local_file:
+                while not stop_event.is_set():
+                    try:
+                        offset, length = block_queue.get_nowait()
+                    except queue.Empty:
+                        return
+                    if throttle is not None:
+                        throttle.consume(length)
+                    position = offset
+                    for data in remote_file.readv(_request_chunks(offset, length, request_size)):
+                        local_file.seek(position)
+                        local_file.write(data)
+                        if ordered_hasher:
+                            ordered_hasher.feed(position, data)
+                        position += len(data)
+                    if position != offset + length:
+                        raise IOError(f"Short read at offset {offset} of {remote_path}")
+                    local_file.flush()
+                    tracker.add(offset, offset + length)
+                    progress.add(length)
+
+                    # Persist progress at most once a second
+                    with save_lock:
+                        if time.monotonic() - last_save[0] >= 1.0:
+                            save_ranges(state_path, tracker, remote_size, remote_mtime, source_digest)
+                            last_save[0] = time.monotonic()
+
+    if blocks:
+        try:
+            _run_workers(sessions, blocks, work, stop_event)
+        except Exception as e:
+            if file_manager._keep_partial(connection_name, e):
+                with save_lock:
+                    save_ranges(state_path, tracker, remote_size, remote_mtime, source_digest)
+            else:
+                # Nothing worth resuming, as after a failed sequential download
+                file_manager.discard_partial_download(local_path)
+            raise
+        with save_lock:
+            save_ranges(state_path, tracker, remote_size, remote_mtime, source_digest)
+
+    if verification:
+        ordered_hasher.finish(remote_size)
+        verification.verify()
+    os.replace(temp_path, local_path)
+    remove_ranges(state_path)
+
+
+def parallel_upload(file_manager, connection_name, local_path, remote_path, progress_callback=None,
+                    sessions=3, block_size=DEFAULT_BLOCK_SIZE, blocks_per_handle=8, verification=None,
+                    source_digest=None, throttle=None):
+    """Upload with pipelined, offset-addressed writes on several SFTP handles.
+
+    The local file is read in ``block_size`` blocks; each session writes its
+    blocks at their offsets into ``remote_path + '.part'`` with pipelined
+    writes, so no write waits for the previous one to be acknowledged. A
+    session writes up to ``blocks_per_handle`` blocks per file handle and
+    closes it; the synchronous close is the point where those blocks count
+    as committed. Completed ranges are kept in a local state file, so an
+    interrupted upload resumes with only the missing blocks. Finishes with
+    the usual ``.part`` -> final rename, after checking ``verification``
+    (fed with the local blocks in file order) against the remote ``.part``.
+    ``source_digest`` and ``throttle`` work as for parallel_download.
+    """
+    temp_remote_path = remote_path + ".part"
+    state_path = upload_state_path(connection_name, remote_path)
+    local_stat = os.stat(local_path)
+    local_size = local_stat.st_size
+    local_mtime = local_stat.st_mtime
+
+    tracker = load_ranges(state_path, local_size, local_mtime, source_digest)
+    if tracker is not None:
+        with file_manager._sftp_session(connection_name) as sftp:
+            try:
+                sftp.stat(temp_remote_path)
+            except FileNotFoundError:
+                tracker = None  # Remote partial file is gone, start over
+    if tracker is None:
+        tracker = RangeTracker()
+        with file_manager._sftp_session(connection_name) as sftp:
+            sftp.open(temp_remote_path, "wb").close()  # Create / truncate
+        save_ranges(state_path, tracker, local_size, local_mtime, source_digest)
+
+    blocks = tracker.missing_blocks(local_size, block_size)
+    progress = _ProgressReporter(local_size, tracker.completed_bytes(), progress_callback)
+    stop_event = threading.Event()
+    save_lock = threading.Lock()
+    last_save = [time.monotonic()]
+    ordered_hasher = None
+    if verification:
+        ordered_hasher = OrderedHasher(verification.hasher, local_path, tracker.to_list())
+
+    def take_batch(block_queue):
+        batch = []
+        while len(batch) < blocks_per_handle:
+            try:
+                batch.append(block_queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def work(block_queue, first):
+        with file_manager._sftp_session(connection_name, wait=first) as sftp, \
+                open(local_path, "rb") as local_file:
+            while not stop_event.is_set():
+                batch = take_batch(block_queue)
+                if not batch:
+                    return
+                with sftp.open(temp_remote_path, "r+b") as remote_file:
+                    remote_file.set_pipelined(True)
+                    for offset, length in batch:
+                        local_file.seek(offset)
+                        data = local_file.read(length)
+                        if len(data) != length:
+                            raise IOError(f"{local_path} changed during upload")
+                        if throttle is not None:
+                            throttle.consume(length)
+                        remote_file.seek(offset)
+                        remote_file.write(data)
+                        if ordered_hasher:
+                            ordered_hasher.feed(offset, data)
+                        progress.add(length)
+                # Closing waited for the server, the whole batch is on disk remotely
+                for offset, length in batch:
+                    tracker.add(offset, offset + length)
+
+                with save_lock:
+                    if time.monotonic() - last_save[0] >= 1.0:
+                        save_ranges(state_path, tracker, local_size, local_mtime, source_digest)
+                        last_save[0] = time.monotonic()
+
+    if blocks:
+        try:
+            _run_workers(sessions, blocks, work, stop_event)
+        except Exception as e:
+            if file_manager._keep_partial(connection_name, e):
+                with save_lock:
+                    save_ranges(state_path, tracker, local_size, local_mtime, source_digest)
+            else:
+                try:
+                    file_manager.discard_partial_upload(connection_name, remote_path)
+                except Exception:
+                    remove_ranges(state_path)
+            raise
+        with save_lock:
+            save_ranges(state_path, tracker, local_size, local_mtime, source_digest)
+
+    with file_manager._sftp_session(connection_name) as sftp:
+        remote_size = sftp.stat(temp_remote_path).st_size
+        if remote_size != local_size:
+            remove_ranges(state_path)
+            raise IOError(f"Size mismatch after upload of {remote_path}: {remote_size} != {local_size}")
+        if verification:
+            ordered_hasher.finish(local_size)
+            verification.verify(temp_remote_path)
+        sftp.rename(temp_remote_path, remote_path)
+    remove_ranges(state_path)
@@ -0,0 +1,134 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core import resolver
+from core.ssh_manager import SSHManager
+
+MAX_SWEEP_WORKERS = 256  # Probes run at once; threads are only started as hosts need them
+
+
+def check_host(host, port=22, timeout=3.0):
+    """TCP connect plus SSH banner read, without authenticating.
+
+    Returns a dict with ``reachable``, ``latency_ms`` (time to banner),
+    ``banner`` and ``error``. Connects through the resolver, so the cached
+    addresses and the racing connect of real connections are used.
+    """
+    start = time.perf_counter()
+    result = {"reachable": False, "latency_ms": None, "banner": "", "error": ""}
+    try:
+        with resolver.connect(host, port, timeout) as sock:
+            sock.settimeout(max(timeout - (time.perf_counter() - start), 0.1))
+            data = b""
+            while b"\n" not in data and len(data) < 1024:
+                chunk = sock.recv(256)
+                if not chunk:
+                    break
+                data += chunk
+        line = data.split(b"\n", 1)[0].strip().decode("utf-8", errors="replace")
+        # Servers may send other lines before the identification string
+        if not line.startswith("SSH-") and b"SSH-" in data:
+            line = data[data.index(b"SSH-"):].split(b"\n", 1)[0].strip().decode("utf-8", errors="replace")
+        if line.startswith("SSH-"):
+            result["reachable"] = True
+            result["banner"] = line
+        else:
+            result["error"] = "no SSH banner"
+    except Exception as e:
+        result["error"] = str(e) or e.__class__.__name__
+    result["latency_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+class ReachabilityChecker:
+    """Checks every saved connection concurrently and caches the results.
+
+    Each probe holds a thread until it answers or times out, so a sweep
+    over N hosts takes about one ``timeout`` only if all N run at once.
+    Threads are started as probes are queued, up to ``max_workers``, so the
+    pool is effectively min(N, ``max_workers``). Results are reported per
+    host through ``result_callback(name, result)`` as soon as each check
+    finishes.
+    """
+
+    def __init__(self, ssh_manager: SSHManager, max_workers=MAX_SWEEP_WORKERS, timeout=3.0, ttl=60,
+                 result_callback=None):
+        self.ssh_manager = ssh_manager
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.ttl = ttl
+        self.result_callback = result_callback
+        self._cache = {}  # {conn_name: result dict with 'checked_at'}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def get_cached(self, name):
+        """Cached result for ``name`` if still within the TTL, else None"""
+        with self._lock:
+            result = self._cache.get(name)
+        if result and time.time() - result["checked_at"] < self.ttl:
+            return result
+        return None
+
+    def sweep(self, names=None, force=False):
+        """Check ``names`` (default: all saved connections); returns the names queued"""
+        connections = self.ssh_manager.get_all_connections()
+        if names is None:
+            names = list(connections)
+
+        queued = []
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(1, self.max_workers),
+                    thread_name_prefix="ssh-reachability"
+                )
+            executor = self._executor
+
+        for name in names:
+            conn_data = connections.get(name)
+            if not conn_data:
+                continue
+            cached = None if force else self.get_cached(name)
+            if cached:
+                self._report(name, cached)
+                continue
+            with self._lock:
+                if name in self._in_flight:
+                    continue
+                self._in_flight.add(name)
+            executor.submit(self._check, name, conn_data['host'], conn_data.get('port', 22))
+            queued.append(name)
+        return queued
+
+    def _check(self, name, host, port):
+        try:
+            result = check_host(host, port, self.timeout)
+            result["checked_at"] = time.time()
+            with self._lock:
+                self._cache[name] = result
+        finally:
+            with self._lock:
+                self._in_flight.discard(name)
+        self._report(name, result)
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(name, None)
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _report(self, name, result):
+        if self.result_callback:
+            try:
+                self.result_callback(name, result)
+            except Exception:
+                pass
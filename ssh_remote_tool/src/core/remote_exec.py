@@ -0,0 +1,47 @@
+import threading
+
+
+class RemoteCommand:
+    """An exec channel with stderr drained on the side, so a chatty command cannot stall it"""
+
+    def __init__(self, client, command):
+        self.stdin, self.stdout, stderr = client.exec_command(command)
+        self._stderr = b""
+
+        def drain():
+            try:
+                self._stderr = stderr.read()
+            except Exception:
+                pass
+
+        self._drain = threading.Thread(target=drain, name="ssh-exec-stderr", daemon=True)
+        self._drain.start()
+
+    def finish(self, what):
+        """Wait for the exit status; raise IOError with stderr if the command failed"""
+        status = self.stdout.channel.recv_exit_status()
+        self._drain.join(timeout=5)
+        if status != 0:
+            message = self._stderr.decode("utf-8", errors="replace").strip()
+            raise IOError(f"{what} failed with exit status {status}: {message}")
+
+    def wait(self, timeout):
+        """Wait up to ``timeout`` seconds for the command to exit; True if it did"""
+        return self.stdout.channel.status_event.wait(timeout)
+
+    def close(self):
+        try:
+            self.stdout.channel.close()
+        except Exception:
+            pass
+
+
+def run_command(client, command):
+    """Run ``command`` to completion and return its stdout as text"""
+    cmd = RemoteCommand(client, command)
+    output = cmd.stdout.read()
+    try:
+        cmd.finish(command)
+    finally:
+        cmd.close()
+    return output.decode("utf-8", errors="replace")
@@ -0,0 +1,143 @@
+import time
+import errno
+import select
+import socket
+import threading
+
+DEFAULT_DNS_TTL = 300  # Seconds a resolved address list is reused
+CONNECTION_ATTEMPT_DELAY = 0.25  # RFC 8305 recommends 250 ms between attempts
+
+_IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, 10035}  # 10035: WSAEWOULDBLOCK
+_REFUSED = {errno.ECONNREFUSED, 10061}  # 10061: WSAECONNREFUSED
+
+_cache = {}  # {(host, port): (expires_at, [addrinfo, ...])}
+_cache_lock = threading.Lock()
+
+
+def _interleave(addrinfos):
+    """Order addresses IPv6/IPv4 alternately, keeping the resolver's order per family"""
+    by_family = {}
+    for info in addrinfos:
+        by_family.setdefault(info[0], []).append(info)
+    families = sorted(by_family, key=lambda f: f != socket.AF_INET6)
+    ordered = []
+    while any(by_family[f] for f in families):
+        for family in families:
+            if by_family[family]:
+                ordered.append(by_family[family].pop(0))
+    return ordered
+
+
+def resolve(host, port, ttl=DEFAULT_DNS_TTL):
+    """Resolve ``host`` to TCP addresses, reusing results for ``ttl`` seconds"""
+    key = (host, port)
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached and cached[0] > now:
+            return list(cached[1])
+
+    addrinfos = _interleave(socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM))
+    with _cache_lock:
+        _cache[key] = (now + ttl, addrinfos)
+    return list(addrinfos)
+
+
+def _prefer(host, port, winner):
+    """Try the address that won last time first on the next connect"""
+    with _cache_lock:
+        cached = _cache.get((host, port))
+        if cached and winner in cached[1]:
+            addrinfos = [winner] + [info for info in cached[1] if info != winner]
+            _cache[(host, port)] = (cached[0], addrinfos)
+
+
+def invalidate(host=None, port=None):
+    with _cache_lock:
+        if host is None:
+            _cache.clear()
+        else:
+            _cache.pop((host, port), None)
+
+
+def connect(host, port, timeout=5.0, attempt_delay=CONNECTION_ATTEMPT_DELAY, timings=None):
+    """Happy-eyeballs (RFC 8305) TCP connect across all resolved addresses.
+
+    Connection attempts start ``attempt_delay`` apart (immediately after a
+    failure) and race each other; the first to complete wins and the rest
+    are closed. Returns a connected blocking socket. If ``timings`` is a
+    dict, the ``dns`` and ``tcp`` phase durations (seconds) are stored in it.
+
+    A failure keeps the cached addresses (a slow host stays slow whatever
+    DNS says) unless every one of them actively refused the connection.
+    """
+    start = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    queue = resolve(host, port)
+    if timings is not None:
+        timings['dns'] = time.perf_counter() - start
+        start = time.perf_counter()
+    address_count = len(queue)
+    refused = 0
+    pending = {}  # {socket: addrinfo}
+    last_error = None
+    next_attempt = time.monotonic()
+
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                raise socket.timeout(f"timed out connecting to {host}:{port}")
+
+            if queue and (now >= next_attempt or not pending):
+                info = queue.pop(0)
+                family, socktype, proto, _, sockaddr = info
+                sock = socket.socket(family, socktype, proto)
+                sock.setblocking(False)
+                err = sock.connect_ex(sockaddr)
+                if err == 0:
+                    return _won(host, port, sock, info, pending, start, timings)
+                if err in _IN_PROGRESS:
+                    pending[sock] = info
+                else:
+                    last_error = OSError(err, f"{errno.errorcode.get(err, err)} connecting to {sockaddr[0]}")
+                    refused += err in _REFUSED
+                    sock.close()
+                next_attempt = now + attempt_delay
+                continue
+
+            if not pending:
+                raise last_error or OSError(f"no usable address for {host}:{port}")
+
+            wait = deadline - now
+            if queue:
+                wait = min(wait, max(next_attempt - now, 0))
+            sockets = list(pending)
+            _, writable, failed = select.select([], sockets, sockets, wait)
+            for sock in set(writable) | set(failed):
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                info = pending.pop(sock)
+                if err == 0 and sock not in failed:
+                    return _won(host, port, sock, info, pending, start, timings)
+                last_error = OSError(err, f"{errno.errorcode.get(err, err)} connecting to {info[4][0]}")
+                refused += err in _REFUSED
+                sock.close()
+                next_attempt = time.monotonic()  # Start the next attempt right away
+    except BaseException:
+        for sock in pending:
+            sock.close()
+        if address_count and refused == address_count:
+            # Nothing listens at any cached address, they may be stale: resolve again next time
+            invalidate(host, port)
+        raise
+
+
+def _won(host, port, sock, info, losers, start, timings):
+    if timings is not None:
+        timings['tcp'] = time.perf_counter() - start
+    for other in losers:
+        other.close()
+    losers.clear()
+    sock.setblocking(True)
+    _prefer(host, port, info)
+    return sock
@@ -5,6 +5,7 @@ class ScriptExecutor:
     def __init__(self, ssh_manager: SSHManager):
         self.ssh_manager = ssh_manager
         self.active_channels = {}  # {connection_name: channel}
+        self.bandwidth = None  # BandwidthLimiter told about script output, so transfers leave it room
 
     def execute_script(self, connection_name, script_content, exec_dir=".", params="", output_callback=None):
         client = self.ssh_manager.get_client(connection_name)
@@ -17,11 +18,14 @@ class ScriptExecutor:
         # Open a new channel for the execution
         channel = client.invoke_shell()
         self.active_channels[connection_name] = channel
+        self.ssh_manager.acquire(connection_name)
 
         # Function to read from the channel
         def read_output():
             try:
                 while not channel.closed:
+                    if self.bandwidth and (channel.recv_ready() or channel.recv_stderr_ready()):
+                        self.bandwidth.note_interactive()
                     if channel.recv_ready():
                         stdout = channel.recv(4096).decode('utf-8', errors='ignore')
                         if output_callback:
@@ -39,6 +43,7 @@ class ScriptExecutor:
                     output_callback(f"\n--- ERROR: {e} ---", 'stderr')
             finally:
                 self.terminate(connection_name)
+                self.ssh_manager.release(connection_name)
 
         # Start reading output in a separate thread
         thread = threading.Thread(target=read_output, daemon=True)
@@ -0,0 +1,242 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class SFTPPoolTimeout(Exception):
+    """Raised when no SFTP session becomes available in time"""
+
+
+class SFTPSessionPool:
+    """A bounded pool of SFTP sessions sharing one SSH transport.
+
+    paramiko's SFTPClient is not safe for concurrent requests, so every
+    operation checks out a session for its exclusive use and returns it when
+    done. Independent operations on the same host run on separate sessions,
+    up to ``max_size`` at a time. ``reserved`` of them are kept for
+    interactive operations (listings, renames, ...): bulk transfers only
+    ever hold ``max_size - reserved`` sessions together.
+    """
+
+    def __init__(self, connection_name, factory, max_size=4, idle_timeout=300,
+                 health_check=None, reserved=0):
+        self.connection_name = connection_name
+        self.factory = factory  # Opens a new SFTPClient
+        self.max_size = max_size
+        self.reserved = min(reserved, max_size - 1)
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check  # Optional callable(client) -> bool
+        self._idle = []  # [(client, last_used)], most recently used last
+        self._in_use = set()
+        self._bulk_in_use = set()  # Sessions checked out by non-interactive callers
+        self._bulk_count = 0  # len(_bulk_in_use) + bulk sessions being opened
+        self._size = 0  # idle + in use + being opened
+        self._closed = False
+        self._cond = threading.Condition()
+        self.stats = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'evicted': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+        }
+
+    def acquire(self, timeout=30, interactive=False):
+        """Check out a session, opening a new one if the pool is not full.
+
+        Non-interactive callers wait while they hold their share of the
+        pool, even if reserved sessions are idle. ``timeout=0`` never waits.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            to_close = []
+            client = None
+            create = False
+            with self._cond:
+                waited_since = None
+                while True:
+                    if self._closed:
+                        raise ConnectionError(f"SFTP pool for '{self.connection_name}' is closed.")
+                    now = time.time()
+                    bulk_full = not interactive and self._bulk_count >= self.max_size - self.reserved
+                    while self._idle and not bulk_full:
+                        candidate, last_used = self._idle.pop()
+                        if now - last_used > self.idle_timeout:
+                            to_close.append(candidate)
+                            self._size -= 1
+                            self.stats['evicted'] += 1
+                            continue
+                        client = candidate
+                        break
+                    if client is not None:
+                        self._in_use.add(client)
+                        if not interactive:
+                            self._bulk_in_use.add(client)
+                            self._bulk_count += 1
+                        break
+                    if self._size < self.max_size and not bulk_full:
+                        self._size += 1
+                        if not interactive:
+                            self._bulk_count += 1
+                        create = True
+                        break
+
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise SFTPPoolTimeout(
+                                f"No SFTP session available for '{self.connection_name}' "
+                                f"within {timeout}s."
+                            )
+                    if waited_since is None:
+                        waited_since = time.monotonic()
+                        self.stats['waits'] += 1
+                    self._cond.wait(remaining)
+                if waited_since is not None:
+                    self.stats['wait_time'] += time.monotonic() - waited_since
+
+            self._close_clients(to_close)
+
+            if create:
+                try:
+                    client = self.factory()
+                except BaseException:
+                    with self._cond:
+                        self._size -= 1
+                        if not interactive:
+                            self._bulk_count -= 1
+                        self._cond.notify_all()
+                    raise
+                with self._cond:
+                    self._in_use.add(client)
+                    if not interactive:
+                        self._bulk_in_use.add(client)
+                    self.stats['created'] += 1
+                return client
+
+            if self.health_check and not self._is_healthy(client):
+                self.release(client, discard=True)
+                continue
+
+            with self._cond:
+                self.stats['reused'] += 1
+            return client
+
+    def release(self, client, discard=False):
+        """Return a checked-out session, or drop it if it is no longer usable"""
+        with self._cond:
+            if client not in self._in_use:
+                return
+            self._in_use.discard(client)
+            if client in self._bulk_in_use:
+                self._bulk_in_use.discard(client)
+                self._bulk_count -= 1
+            if discard or self._closed or self._size > self.max_size:
+                self._size -= 1
+                self.stats['discarded'] += 1
+            else:
+                self._idle.append((client, time.time()))
+                client = None
+            # Waiters differ in what they may take, wake them all to re-check
+            self._cond.notify_all()
+        if client is not None:
+            self._close_clients([client])
+
+    @contextmanager
+    def session(self, timeout=30, is_broken=None, interactive=False):
+        """Context manager around acquire/release.
+
+        ``is_broken(client, exc)`` decides whether an exception raised inside
+        the block means the session must be discarded rather than reused.
+        """
+        client = self.acquire(timeout, interactive)
+        try:
+            yield client
+        except BaseException as e:
+            self.release(client, discard=is_broken(client, e) if is_broken else True)
+            raise
+        else:
+            self.release(client)
+
+    def resize(self, max_size):
+        """Change ``max_size``; idle sessions beyond a smaller size are closed now, busy ones when returned"""
+        with self._cond:
+            self.max_size = max(1, max_size)
+            to_close = []
+            while self._size > self.max_size and self._idle:
+                client, _ = self._idle.pop(0)  # Least recently used first
+                to_close.append(client)
+                self._size -= 1
+            self._cond.notify_all()
+        self._close_clients(to_close)
+
+    def evict_idle(self, max_idle=None):
+        """Close sessions idle for longer than ``max_idle`` seconds; returns the count"""
+        max_idle = self.idle_timeout if max_idle is None else max_idle
+        now = time.time()
+        with self._cond:
+            keep = []
+            to_close = []
+            for client, last_used in self._idle:
+                if now - last_used > max_idle:
+                    to_close.append(client)
+                else:
+                    keep.append((client, last_used))
+            self._idle = keep
+            self._size -= len(to_close)
+            self.stats['evicted'] += len(to_close)
+            if to_close:
+                self._cond.notify_all()
+        self._close_clients(to_close)
+        return len(to_close)
+
+    def close(self):
+        """Close idle sessions now and sessions in use as they are returned"""
+        with self._cond:
+            self._closed = True
+            to_close = [client for client, _ in self._idle]
+            self._size -= len(to_close)
+            self._idle = []
+            self._cond.notify_all()
+        self._close_clients(to_close)
+
+    def available(self, interactive=False):
+        """How many sessions could be checked out right now without waiting"""
+        with self._cond:
+            # Idle sessions plus room to open new ones
+            free = self.max_size - self._size + len(self._idle)
+            if not interactive:
+                free = min(free, self.max_size - self.reserved - self._bulk_count)
+            return max(0, free)
+
+    def get_metrics(self):
+        with self._cond:
+            metrics = dict(self.stats)
+            metrics.update({
+                'connection_name': self.connection_name,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'reserved': self.reserved,
+            })
+            return metrics
+
+    def __len__(self):
+        return self._size
+
+    def _is_healthy(self, client):
+        try:
+            return bool(self.health_check(client))
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_clients(clients):
+        for client in clients:
+            try:
+                client.close()
+            except:
+                pass
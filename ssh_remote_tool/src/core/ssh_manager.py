@@ -1,12 +1,62 @@
 import paramiko
 import os
 import json
+import socket
 import stat
 import time
+import inspect
 import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
 from core.credentials_manager import CredentialsManager, load_or_generate_key
+from core.key_cache import load_private_key
+from core.broker import BrokerError
+from core import resolver
+from core.transport_tuning import get_profile, build_connect_kwargs, apply_algorithm_order, apply_to_transport
 
 CONFIG_FILE = "connections.json"
+ENCRYPTED_FIELDS = ('password', 'key_passphrase')
+
+# paramiko >= 3.2 lets us supply the Transport, which is how key exchange
+# and authentication are timed separately and how a tuning profile's cipher
+# order reaches the handshake (older versions only get its cipher set)
+_HAS_TRANSPORT_FACTORY = 'transport_factory' in inspect.signature(paramiko.SSHClient.connect).parameters
+
+
+class _PhaseTimingTransport(paramiko.Transport):
+    """Transport that records how long the key exchange took.
+
+    With a ``deadline`` (time.monotonic), the banner wait, key exchange and
+    authentication together end by then.
+    """
+    kex_duration = None
+    deadline = None
+
+    def _remaining(self, limit):
+        if self.deadline is None:
+            return limit
+        remaining = max(self.deadline - time.monotonic(), 0.01)
+        return remaining if limit is None else min(limit, remaining)
+
+    def start_client(self, event=None, timeout=None):
+        self.banner_timeout = self._remaining(self.banner_timeout)
+        start = time.perf_counter()
+        try:
+            return super().start_client(event=event, timeout=self._remaining(timeout))
+        finally:
+            self.kex_duration = time.perf_counter() - start
+            # Authentication runs next, on what is left
+            self.auth_timeout = self._remaining(self.auth_timeout)
+
+
+def _transport_factory(profile, deadline=None):
+    """Transport factory that applies the profile's algorithm order before key exchange"""
+    def factory(*args, **kwargs):
+        transport = _PhaseTimingTransport(*args, **kwargs)
+        transport.deadline = deadline
+        apply_algorithm_order(transport, profile)
+        return transport
+    return factory
 
 class SSHManager:
     def __init__(self):
@@ -15,8 +65,15 @@ class SSHManager:
         self.connections = self.load_connections()
         self.active_clients = {}  # {conn_name: paramiko.SSHClient}
         self.client_timestamps = {}  # Track connection times for cleanup
-        self.connection_lock = threading.Lock()  # Thread safety
+        self._in_use = {}  # {conn_name: count} operations holding a channel open, never reaped
+        self.connection_lock = threading.Lock()  # Guards the shared dicts only, never held across network I/O
+        self._host_locks = {}  # {conn_name: threading.Lock} per-connection state lock
+        self._pending_connects = {}  # {conn_name: Future} in-flight handshakes
+        self._cancelled_connects = set()  # In-flight handshakes disconnected before they finished
         self.connection_timeout = 300  # 5 minutes timeout for idle connections
+        self.default_keepalive_interval = 30  # Seconds, overridable per connection
+        self.broker_client = None  # Optional BrokerClient sharing sessions across processes
+        self.phase_callback = None  # Optional callable(conn_name, phase, seconds)
 
     def load_connections(self):
         if not os.path.exists(CONFIG_FILE):
@@ -26,16 +83,18 @@ class SSHManager:
             connections = {}
             for name, data in encrypted_conns.items():
                 connections[name] = data
-                if 'password' in data and data['password']:
-                    connections[name]['password'] = self.credentials_manager.decrypt_password(data['password'])
+                for field in ENCRYPTED_FIELDS:
+                    if field in data and data[field]:
+                        connections[name][field] = self.credentials_manager.decrypt_password(data[field])
             return connections
 
     def save_connections(self):
         encrypted_conns = {}
         for name, data in self.connections.items():
             encrypted_conns[name] = data.copy()
-            if 'password' in data and data['password']:
-                encrypted_conns[name]['password'] = self.credentials_manager.encrypt_password(data['password'])
+            for field in ENCRYPTED_FIELDS:
+                if field in data and data[field]:
+                    encrypted_conns[name][field] = self.credentials_manager.encrypt_password(data[field])
 
         with open(CONFIG_FILE, "w") as f:
             json.dump(encrypted_conns, f, indent=4)
@@ -61,79 +120,202 @@ class SSHManager:
     def get_all_connections(self):
         return self.connections
 
-    def connect(self, name, max_retries=3, timeout=5):
-        """Connect with performance optimizations and retry logic"""
+    def _get_host_lock(self, name):
+        """Return the per-connection lock, creating it on first use"""
         with self.connection_lock:
-            # Check if we have an active connection
-            if name in self.active_clients:
-                client = self.active_clients[name]
-                # Test if connection is still alive
-                try:
-                    transport = client.get_transport()
-                    if transport and transport.is_active():
-                        # Update timestamp
-                        self.client_timestamps[name] = time.time()
-                        return client
-                    else:
-                        # Connection is dead, remove it
-                        self._cleanup_connection(name)
-                except:
-                    self._cleanup_connection(name)
+            lock = self._host_locks.get(name)
+            if lock is None:
+                lock = threading.Lock()
+                self._host_locks[name] = lock
+            return lock
 
-            conn_data = self.get_connection(name)
-            if not conn_data:
-                raise ValueError(f"Connection '{name}' not found.")
+    def _get_live_client(self, name):
+        """Return the cached client if its transport is still active, else drop it.
 
-            # Retry connection with exponential backoff
-            last_exception = None
-            for attempt in range(max_retries):
-                try:
-                    client = paramiko.SSHClient()
-                    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-                    auth_method = conn_data.get('auth_method', 'password')
-
-                    if auth_method == 'key':
-                        key_path = conn_data.get('key_path')
-                        if not key_path or not os.path.exists(key_path):
-                            raise ValueError(f"SSH key not found at path: {key_path}")
-
-                        # Validate key file permissions (Unix-like systems)
-                        if os.name != 'nt':  # Not Windows
-                            self._validate_key_permissions(key_path)
-
-                        client.connect(
-                            hostname=conn_data['host'],
-                            port=conn_data.get('port', 22),
-                            username=conn_data['user'],
-                            timeout=timeout,  # Connection timeout
-                            key_filename=key_path
-                        )
-                    else: # Password authentication
-                        client.connect(
-                            hostname=conn_data['host'],
-                            port=conn_data.get('port', 22),
-                            username=conn_data['user'],
-                            password=conn_data.get('password'),
-                            timeout=timeout  # Connection timeout
-                        )
-
-                    # Connection successful
-                    self.active_clients[name] = client
-                    self.client_timestamps[name] = time.time()
-                    return client
-
-                except Exception as e:
-                    last_exception = e
-                    client.close()
-
-                    # Exponential backoff for retries
-                    if attempt < max_retries - 1:
-                        wait_time = (2 ** attempt) * 0.5  # 0.5, 1, 2 seconds
-                        time.sleep(wait_time)
-
-            # All retries failed
-            raise last_exception or Exception(f"Failed to connect to {name} after {max_retries} attempts")
+        Caller must hold the host lock for ``name``.
+        """
+        client = self.active_clients.get(name)
+        if client is None:
+            return None
+        try:
+            transport = client.get_transport()
+            if transport and transport.is_active():
+                self.client_timestamps[name] = time.time()
+                return client
+        except:
+            pass
+        # Connection is dead, remove it
+        self._cleanup_connection(name)
+        return None
+
+    def connect(self, name, max_retries=3, timeout=5, deadline=None):
+        """Connect with performance optimizations and retry logic.
+
+        Only the connection being established is locked. Concurrent callers
+        for the same host wait on the single in-flight handshake, callers
+        for other hosts are never blocked by it. ``timeout`` bounds each
+        phase (TCP connect, banner, ...); ``deadline`` (time.monotonic), if
+        given, bounds the whole call including retries.
+        """
+        with self._get_host_lock(name):
+            client = self._get_live_client(name)
+            if client:
+                return client
+
+            future = self._pending_connects.get(name)
+            is_owner = future is None
+            if is_owner:
+                conn_data = self.get_connection(name)
+                if not conn_data:
+                    raise ValueError(f"Connection '{name}' not found.")
+                future = Future()
+                self._pending_connects[name] = future
+
+        if not is_owner:
+            # Another thread is already handshaking with this host
+            return future.result(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+        try:
+            client = self._establish_connection(name, conn_data, max_retries, timeout, deadline=deadline)
+        except BaseException as e:
+            with self._get_host_lock(name):
+                self._pending_connects.pop(name, None)
+                self._cancelled_connects.discard(name)
+            future.set_exception(e)
+            raise
+
+        with self._get_host_lock(name):
+            self._pending_connects.pop(name, None)
+            cancelled = name in self._cancelled_connects
+            self._cancelled_connects.discard(name)
+            if not cancelled:
+                self.active_clients[name] = client
+                self.client_timestamps[name] = time.time()
+        if cancelled:
+            # disconnect() ran while the handshake was in flight; don't publish the client
+            client.close()
+            error = ConnectionAbortedError(f"'{name}' was disconnected while connecting.")
+            future.set_exception(error)
+            raise error
+        future.set_result(client)
+        return client
+
+    def _establish_connection(self, name, conn_data, max_retries, timeout, profile=None, deadline=None):
+        """Open a new SSH client for ``conn_data``; runs without any lock held.
+
+        ``profile`` overrides the connection's stored transport tuning profile.
+        When a connection broker is attached, its already authenticated
+        session is used instead of a new handshake.
+        """
+        if self.broker_client and profile is None:
+            try:
+                broker_timeout = timeout * max_retries + 5
+                if deadline is not None:
+                    broker_timeout = min(broker_timeout, max(deadline - time.monotonic(), 0.01))
+                return self.broker_client.get_client(name, timeout=broker_timeout)
+            except BrokerError:
+                pass  # Broker gone or refused, connect directly
+
+        auth_method = conn_data.get('auth_method', 'password')
+        connect_kwargs = {
+            'hostname': conn_data['host'],
+            'port': conn_data.get('port', 22),
+            'username': conn_data['user'],
+            'timeout': timeout,  # Connection timeout
+        }
+
+        if auth_method == 'key':
+            key_path = conn_data.get('key_path')
+            if not key_path or not os.path.exists(key_path):
+                raise ValueError(f"SSH key not found at path: {key_path}")
+
+            # Validate key file permissions (Unix-like systems)
+            if os.name != 'nt':  # Not Windows
+                self._validate_key_permissions(key_path)
+
+            # Parsed once per key file version, not on every attempt or connect
+            connect_kwargs['pkey'] = load_private_key(key_path, conn_data.get('key_passphrase'))
+            connect_kwargs['allow_agent'] = False
+            connect_kwargs['look_for_keys'] = False
+        elif auth_method == 'agent':
+            # Keys held by a running ssh-agent (SSH_AUTH_SOCK / Pageant)
+            connect_kwargs['allow_agent'] = True
+            connect_kwargs['look_for_keys'] = False
+        else: # Password authentication
+            connect_kwargs['password'] = conn_data.get('password')
+            connect_kwargs['allow_agent'] = False
+            connect_kwargs['look_for_keys'] = False
+
+        if profile is None:
+            profile = get_profile(conn_data)
+        connect_kwargs.update(build_connect_kwargs(profile))
+
+        # Retry connection with exponential backoff
+        last_exception = None
+        for attempt in range(max_retries):
+            client = paramiko.SSHClient()
+            sock = None
+            timings = {}
+            attempt_start = time.perf_counter()
+            try:
+                attempt_timeout = timeout
+                if deadline is not None:
+                    attempt_timeout = min(timeout, deadline - time.monotonic())
+                    if attempt_timeout <= 0:
+                        raise socket.timeout(f"Connecting to {name} did not finish in time")
+                client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+                # Cached resolution and a racing connect across all addresses;
+                # the transport gets the winning socket
+                sock = resolver.connect(
+                    connect_kwargs['hostname'], connect_kwargs['port'], attempt_timeout, timings=timings
+                )
+                handshake_start = time.perf_counter()
+                if _HAS_TRANSPORT_FACTORY:
+                    client.connect(
+                        sock=sock, transport_factory=_transport_factory(profile, deadline), **connect_kwargs
+                    )
+                elif deadline is not None:
+                    # No transport to enforce the deadline on; bound each phase by what is left
+                    remaining = max(deadline - time.monotonic(), 0.01)
+                    client.connect(sock=sock, banner_timeout=remaining, auth_timeout=remaining, **connect_kwargs)
+                else:
+                    client.connect(sock=sock, **connect_kwargs)
+                handshake = time.perf_counter() - handshake_start
+                kex = getattr(client.get_transport(), 'kex_duration', None)
+                if kex is not None:
+                    timings['kex'] = kex
+                    timings['auth'] = max(handshake - kex, 0.0)
+                else:
+                    timings['handshake'] = handshake  # Key exchange and authentication together
+                apply_to_transport(client.get_transport(), profile)
+
+                # Connection successful
+                timings['total'] = time.perf_counter() - attempt_start
+                for phase, seconds in timings.items():
+                    self.record_phase(name, phase, seconds)
+                return client
+
+            except Exception as e:
+                last_exception = e
+                client.close()
+                if sock is not None:
+                    sock.close()
+
+                # Exponential backoff for retries
+                if attempt < max_retries - 1 and (deadline is None or time.monotonic() < deadline):
+                    wait_time = (2 ** attempt) * 0.5  # 0.5, 1, 2 seconds
+                    time.sleep(wait_time)
+
+        # All retries failed
+        raise last_exception or Exception(f"Failed to connect to {name} after {max_retries} attempts")
+
+    def record_phase(self, name, phase, seconds):
+        """Report one connection-establishment phase duration"""
+        if self.phase_callback:
+            try:
+                self.phase_callback(name, phase, seconds)
+            except Exception:
+                pass
 
     def _cleanup_connection(self, name):
         """Clean up a dead connection"""
@@ -148,48 +330,121 @@ class SSHManager:
             del self.client_timestamps[name]
 
     def cleanup_idle_connections(self):
-        """Clean up idle connections to free resources"""
+        """Clean up idle connections to free resources; returns the names reaped"""
         current_time = time.time()
-        idle_connections = []
 
         with self.connection_lock:
-            for name, timestamp in self.client_timestamps.items():
-                if current_time - timestamp > self.connection_timeout:
-                    idle_connections.append(name)
+            idle_connections = [
+                name for name, timestamp in list(self.client_timestamps.items())
+                if current_time - timestamp > self.connection_timeout
+            ]
+
+        reaped = []
+        for name in idle_connections:
+            with self._get_host_lock(name):
+                # Re-check under the host lock, the client may have been used meanwhile
+                timestamp = self.client_timestamps.get(name)
+                if timestamp is not None and current_time - timestamp > self.connection_timeout \
+                        and not self.is_in_use(name):
+                    self._cleanup_connection(name)
+                    reaped.append(name)
+        return reaped
+
+    def acquire(self, name):
+        """Mark the connection as used by an operation until release()"""
+        with self.connection_lock:
+            self._in_use[name] = self._in_use.get(name, 0) + 1
+        self.touch(name)
+
+    def release(self, name):
+        """End an operation started with acquire()"""
+        with self.connection_lock:
+            count = self._in_use.get(name, 0) - 1
+            if count > 0:
+                self._in_use[name] = count
+            else:
+                self._in_use.pop(name, None)
+        self.touch(name)
 
-            for name in idle_connections:
-                self._cleanup_connection(name)
+    @contextmanager
+    def in_use(self, name):
+        """Hold the connection out of idle reaping for the duration of the block"""
+        self.acquire(name)
+        try:
+            yield
+        finally:
+            self.release(name)
 
-    def disconnect(self, name):
-        """Disconnect with proper cleanup"""
+    def is_in_use(self, name):
+        """Whether an operation (transfer, shell, command) is using the connection"""
+        with self.connection_lock:
+            return self._in_use.get(name, 0) > 0
+
+    def get_keepalive_interval(self, name):
+        """Keepalive interval in seconds for a connection, 0 disables keepalives"""
+        conn_data = self.get_connection(name) or {}
+        interval = conn_data.get('keepalive_interval')
+        if interval is None:
+            return self.default_keepalive_interval
+        return int(interval)
+
+    def send_keepalive(self, name):
+        """Send a keepalive request on the connection's transport.
+
+        Does not refresh the idle timestamp, so keepalives never keep an
+        otherwise unused connection from being reaped. Returns True if the
+        transport is still alive afterwards.
+        """
+        with self._get_host_lock(name):
+            client = self.active_clients.get(name)
+        if client is None:
+            return False
+        try:
+            transport = client.get_transport()
+            if not (transport and transport.is_active()):
+                raise EOFError("transport is not active")
+            # Servers answer unknown global requests with a failure, which is
+            # enough to keep NAT/firewall state alive. Don't block on the reply.
+            transport.global_request('keepalive@openssh.com', wait=False)
+            return transport.is_active()
+        except Exception:
+            with self._get_host_lock(name):
+                if self.active_clients.get(name) is client:
+                    self._cleanup_connection(name)
+            return False
+
+    def touch(self, name):
+        """Mark a connection as in use so the idle reaper leaves it alone"""
+        with self.connection_lock:
+            if name in self.client_timestamps:
+                self.client_timestamps[name] = time.time()
+
+    def get_active_connection_names(self):
         with self.connection_lock:
+            return list(self.active_clients.keys())
+
+    def disconnect(self, name):
+        """Disconnect with proper cleanup.
+
+        A handshake still in flight is cancelled: its client is closed
+        instead of published when it completes.
+        """
+        with self._get_host_lock(name):
+            if name in self._pending_connects:
+                self._cancelled_connects.add(name)
             self._cleanup_connection(name)
 
     def get_client(self, name):
         """Get client with connection health check"""
-        with self.connection_lock:
-            if name in self.active_clients:
-                client = self.active_clients[name]
-                try:
-                    transport = client.get_transport()
-                    if transport and transport.is_active():
-                        # Update timestamp for active use
-                        self.client_timestamps[name] = time.time()
-                        return client
-                    else:
-                        # Connection is dead, clean it up
-                        self._cleanup_connection(name)
-                        return None
-                except:
-                    self._cleanup_connection(name)
-                    return None
-            return None
+        with self._get_host_lock(name):
+            return self._get_live_client(name)
 
     def disconnect_all(self):
-        """Disconnect all active connections"""
+        """Disconnect all active connections and cancel those still connecting"""
         with self.connection_lock:
-            for name in list(self.active_clients.keys()):
-                self._cleanup_connection(name)
+            names = set(self.active_clients) | set(self._pending_connects)
+        for name in names:
+            self.disconnect(name)
 
     def _validate_key_permissions(self, key_path):
         """Validate SSH key file permissions (Unix-like systems only)"""
@@ -0,0 +1,215 @@
+import os
+import stat
+import shlex
+import tarfile
+from core.bandwidth import ThrottledReader, ThrottledWriter
+from core.file_manager import TransferCancelled
+from core.remote_exec import RemoteCommand, run_command
+
+# Trees whose files average at most this size go through tar (see should_use_tar)
+TAR_AVERAGE_SIZE = 256 * 1024
+TAR_MIN_FILES = 32  # Below this the per-file round-trips do not add up to much
+
+
+def should_use_tar(file_count, total_bytes):
+    """Whether a tree is dominated by per-file overhead rather than by bytes"""
+    return file_count >= TAR_MIN_FILES and total_bytes / max(file_count, 1) <= TAR_AVERAGE_SIZE
+
+
+def local_tree_stats(local_dir):
+    """(file_count, total_bytes) of the regular files of a local tree"""
+    count = total = 0
+    for root, _, files in os.walk(local_dir):
+        for name in files:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                total += st.st_size
+                count += 1
+    return count, total
+
+
+def remote_has_tar(client):
+    try:
+        run_command(client, "command -v tar >/dev/null 2>&1")
+        return True
+    except Exception:
+        return False
+
+
+def local_dir_has_entries(local_dir):
+    """Whether ``local_dir`` exists and is not empty"""
+    if not os.path.isdir(local_dir):
+        return False
+    with os.scandir(local_dir) as it:
+        return any(True for _ in it)
+
+
+def remote_dir_has_entries(client, remote_dir):
+    """Whether ``remote_dir`` exists and is not empty"""
+    quoted = shlex.quote(remote_dir)
+    return bool(run_command(client, f"find {quoted} -mindepth 1 -maxdepth 1 2>/dev/null | head -n 1").strip())
+
+
+def remote_tree_stats(client, remote_dir):
+    """(file_count, total_bytes) of the regular files of a remote tree.
+
+    Exact with GNU find; elsewhere the byte count is du's disk usage estimate.
+    """
+    quoted = shlex.quote(remote_dir)
+    count, total = run_command(
+        client,
+        f"cd {quoted} && find . -type f -printf '%s\\n' 2>/dev/null | awk '{{n++; s+=$1}} END {{print n+0, s+0}}'"
+    ).split()
+    if int(count):
+        return int(count), int(total)
+    count, total = run_command(client, f"cd {quoted} && find . -type f | wc -l && du -sk .").split()[:2]
+    return int(count), int(total) * 1024
+
+
+def upload_tar(client, local_dir, remote_dir, progress_callback=None, throttle=None, stats=None):
+    """Stream ``local_dir`` as a tar archive into ``tar xf -`` running in ``remote_dir``.
+
+    One exec channel carries the whole tree, so per-file SFTP round-trips
+    disappear. ``progress_callback(bytes_done, bytes_total, files_done,
+    files_total)`` is called after every entry; the totals are
+    local_tree_stats, or ``stats`` if the caller already has them. The
+    archive is paced by ``throttle``, if given. If the callback cancels the
+    transfer, the entries sent so far are removed again (directories only
+    when left empty).
+    """
+    files_total, bytes_total = stats if stats is not None else local_tree_stats(local_dir)
+    files_done = bytes_done = 0
+    sent_files, sent_dirs = [], []
+    quoted = shlex.quote(remote_dir)
+    cmd = RemoteCommand(client, f"mkdir -p -- {quoted} && tar xf - -C {quoted}")
+    try:
+        stream = ThrottledWriter(cmd.stdin, throttle) if throttle is not None else cmd.stdin
+        with tarfile.open(fileobj=stream, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+            for root, dirs, files in os.walk(local_dir):
+                dirs.sort()
+                files.sort()
+                relative_root = os.path.relpath(root, local_dir)
+                for name in dirs + files:
+                    path = os.path.join(root, name)
+                    arcname = os.path.normpath(os.path.join(relative_root, name)).replace(os.sep, "/")
+                    st = os.lstat(path)
+                    (sent_dirs if stat.S_ISDIR(st.st_mode) else sent_files).append(arcname)
+                    tar.add(path, arcname=arcname, recursive=False)
+                    if stat.S_ISREG(st.st_mode):
+                        files_done += 1
+                        bytes_done += st.st_size
+                        if progress_callback:
+                            progress_callback(bytes_done, bytes_total, files_done, files_total)
+        cmd.stdin.close()  # EOF lets the remote tar finish
+        cmd.finish("Remote tar extraction")
+    except TransferCancelled:
+        try:
+            cmd.stdin.close()
+            cmd.wait(5)  # So the remote tar does not write behind the cleanup
+        except Exception:
+            pass
+        cmd.close()
+        _remove_remote_entries(client, remote_dir, sent_files, sent_dirs)
+        raise
+    finally:
+        cmd.close()
+
+
+def _remove_remote_entries(client, remote_dir, files, dirs):
+    """Best-effort removal of ``files`` and then of ``dirs`` (if empty), relative to ``remote_dir``"""
+    quoted = shlex.quote(remote_dir)
+    for command, names in ((f"cd {quoted} && xargs -0 rm -f --", files),
+                           (f"cd {quoted} && xargs -0 rmdir --", dirs[::-1])):  # Children before parents
+        if not names:
+            continue
+        try:
+            cmd = RemoteCommand(client, command)
+        except Exception:
+            return
+        try:
+            cmd.stdin.write(b"\0".join(name.encode("utf-8", "surrogateescape") for name in names))
+            cmd.stdin.close()
+            cmd.wait(30)
+        except Exception:
+            pass
+        finally:
+            cmd.close()
+
+
+def _safe_member(member, local_dir):
+    """Refuse absolute paths, '..' escapes and links pointing outside ``local_dir``"""
+    base = os.path.realpath(local_dir)
+    target = os.path.realpath(os.path.join(base, member.name))
+    if os.path.commonpath([base, target]) != base:
+        return False
+    if member.issym() or member.islnk():
+        link_base = os.path.dirname(target) if member.issym() else base
+        link_target = os.path.realpath(os.path.join(link_base, member.linkname))
+        if os.path.commonpath([base, link_target]) != base:
+            return False
+    return member.isfile() or member.isdir() or member.issym() or member.islnk()
+
+
+def download_tar(client, remote_dir, local_dir, progress_callback=None, throttle=None, stats=None):
+    """Stream ``remote_dir`` with ``tar cf -`` and extract it into ``local_dir`` as it arrives.
+
+    Entries that would land outside ``local_dir`` are skipped.
+    ``progress_callback(bytes_done, bytes_total, files_done, files_total)`` is
+    called after every entry; the totals are the estimate from
+    remote_tree_stats, or ``stats`` if the caller already has them. Reading
+    is paced by ``throttle``, if given, which holds the remote tar back
+    through the channel window. If the callback cancels the transfer, the
+    files extracted so far and the directories it created are removed again.
+    """
+    files_total, bytes_total = stats if stats is not None else remote_tree_stats(client, remote_dir)
+    files_done = bytes_done = 0
+    written, made_dirs = [], []
+    if not os.path.isdir(local_dir):
+        made_dirs.append(local_dir)
+    os.makedirs(local_dir, exist_ok=True)
+    cmd = RemoteCommand(client, f"tar cf - -C {shlex.quote(remote_dir)} .")
+    try:
+        stream = ThrottledReader(cmd.stdout, throttle) if throttle is not None else cmd.stdout
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            for member in tar:
+                if not _safe_member(member, local_dir):
+                    continue
+                path = os.path.join(local_dir, member.name)
+                if not member.isdir():
+                    written.append(path)
+                elif not os.path.lexists(path):
+                    made_dirs.append(path)
+                if hasattr(tarfile, "data_filter"):
+                    tar.extract(member, local_dir, filter="data")
+                else:
+                    tar.extract(member, local_dir)
+                if member.isfile():
+                    files_done += 1
+                    bytes_done += member.size
+                    if progress_callback:
+                        progress_callback(
+                            bytes_done, max(bytes_total, bytes_done), files_done, max(files_total, files_done)
+                        )
+        cmd.finish("Remote tar archive")
+    except TransferCancelled:
+        _remove_local_entries(written, made_dirs)
+        raise
+    finally:
+        cmd.close()
+
+
+def _remove_local_entries(files, dirs):
+    """Best-effort removal of ``files`` and then of ``dirs`` (if empty)"""
+    for path in files:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    for path in reversed(dirs):  # Children before parents
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
@@ -0,0 +1,116 @@
+import os
+import json
+import hashlib
+import threading
+
+JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".ssh_remote_tool")
+STATE_DIR = os.path.join(JOURNAL_DIR, "transfers")  # Records of uploads (downloads keep theirs next to the .part)
+QUEUE_JOURNAL_PATH = os.path.join(JOURNAL_DIR, "transfer_queue.json")
+RANGES_SUFFIX = ".ranges"  # Sidecar next to a download's .part file
+TAIL_CHECK_SIZE = 64 * 1024  # Bytes compared at the end of the committed data before resuming
+
+# How the partial file is being filled
+MODE_SEQUENTIAL = "sequential"  # Front to back; the committed data is the partial file's prefix
+MODE_PARALLEL = "parallel"  # Blocks out of order; only the recorded ranges are committed
+
+
+def load_record(state_path):
+    """The journal record of one transfer, or None if missing or unreadable.
+
+    A record is ``{"mode", "size", "mtime", "digest", "ranges"}``: the
+    identity of the source the partial file was made from and the byte
+    ranges of it known to be committed.
+    """
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(record, dict):
+        return None
+    record.setdefault("mode", MODE_PARALLEL)  # Written before sequential transfers were journaled
+    record.setdefault("digest", None)
+    record.setdefault("ranges", [])
+    return record
+
+
+def save_record(state_path, mode, source_size, source_mtime, ranges, digest=None):
+    record = {
+        "mode": mode,
+        "size": source_size,
+        "mtime": source_mtime,
+        "digest": digest,
+        "ranges": ranges,
+    }
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    temp_path = state_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f)
+    os.replace(temp_path, state_path)
+
+
+def remove_record(state_path):
+    try:
+        os.remove(state_path)
+    except OSError:
+        pass
+
+
+def record_matches(record, source_size, source_mtime, digest=None):
+    """Whether ``record`` was written for this version of the source.
+
+    The digest is only compared when both sides have one.
+    """
+    if record is None:
+        return False
+    if record.get("size") != source_size or record.get("mtime") != source_mtime:
+        return False
+    return not (digest and record["digest"] and record["digest"] != digest)
+
+
+def committed_end(record, partial_size):
+    """End of the committed data the tail check looks at, and where it starts"""
+    if record is not None and record["mode"] == MODE_PARALLEL:
+        if not record["ranges"]:
+            return 0, 0
+        start, end = record["ranges"][-1]
+        return start, min(end, partial_size)
+    return 0, partial_size
+
+
+def tail_range(start, end, size=TAIL_CHECK_SIZE):
+    """(offset, length) of the last ``size`` bytes of ``[start, end)``"""
+    offset = max(start, end - size)
+    return offset, end - offset
+
+
+def upload_state_path(connection_name, remote_path):
+    """Local file holding the journal record of an upload"""
+    key = hashlib.sha1(f"{connection_name}:{remote_path}".encode("utf-8")).hexdigest()
+    return os.path.join(STATE_DIR, f"upload-{key}{RANGES_SUFFIX}")
+
+
+class QueueJournal:
+    """Unfinished transfer queue jobs, kept on disk so they survive a restart"""
+
+    def __init__(self, path=QUEUE_JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Job snapshots saved by the last run, oldest first"""
+        with self._lock:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    jobs = json.load(f)
+            except (OSError, ValueError):
+                return []
+        return [job for job in jobs if isinstance(job, dict)] if isinstance(jobs, list) else []
+
+    def save(self, jobs):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(jobs, f, indent=2, ensure_ascii=False)
+            os.replace(temp_path, self.path)
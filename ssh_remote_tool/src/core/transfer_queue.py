@@ -0,0 +1,439 @@
+import os
+import time
+import itertools
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core.file_manager import FileManager, TransferPaused, TransferCancelled
+from core.tree_transfer import upload_tree, download_tree
+
+DIRECTION_UPLOAD = "upload"
+DIRECTION_DOWNLOAD = "download"
+DIRECTION_RELAY = "relay"  # From one connection straight to another (see FileManager.relay_file)
+
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2
+
+# Job states reported through job_callback
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_PAUSED = "paused"
+STATE_COMPLETED = "completed"
+STATE_FAILED = "failed"
+STATE_CANCELLED = "cancelled"
+
+FINISHED_STATES = (STATE_COMPLETED, STATE_FAILED, STATE_CANCELLED)
+
+
+class TransferJob:
+    """One queued upload or download of a file or a whole directory tree.
+
+    A relay job copies ``remote_path`` on ``connection_name`` to
+    ``target_path`` on ``target_connection`` and has no local path.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, connection_name, direction, local_path, remote_path, priority=PRIORITY_NORMAL,
+                 is_directory=False, target_connection=None, target_path=None):
+        self.id = next(self._ids)
+        self.connection_name = connection_name
+        self.direction = direction
+        self.local_path = local_path
+        self.remote_path = remote_path
+        self.target_connection = target_connection
+        self.target_path = target_path
+        self.priority = priority
+        self.is_directory = is_directory
+        self.state = STATE_QUEUED
+        self.transferred = 0
+        self.total = 0
+        self.speed = 0.0  # Bytes per second over the last reporting interval
+        self.files_done = 0  # Directory jobs only
+        self.files_total = 0
+        self.error = ""
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._pause_requested = False
+        self._cancel_requested = False
+        self._last_report = 0.0
+        self._last_report_bytes = 0
+        self._sessions = {}  # {connection_name: pooled sessions granted while running}
+        self._journaled = None  # (state, priority) last written to the journal
+
+    @property
+    def name(self):
+        if self.direction == DIRECTION_UPLOAD:
+            return os.path.basename(os.path.normpath(self.local_path))
+        return posixpath.basename(posixpath.normpath(self.remote_path))
+
+    @property
+    def hosts(self):
+        """Connections the job counts against for ``max_per_host``"""
+        if self.target_connection and self.target_connection != self.connection_name:
+            return (self.connection_name, self.target_connection)
+        return (self.connection_name,)
+
+    def snapshot(self):
+        """Plain dict copy, safe to hand to another thread"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "connection_name": self.connection_name,
+            "direction": self.direction,
+            "local_path": self.local_path,
+            "remote_path": self.remote_path,
+            "target_connection": self.target_connection,
+            "target_path": self.target_path,
+            "priority": self.priority,
+            "is_directory": self.is_directory,
+            "state": self.state,
+            "transferred": self.transferred,
+            "total": self.total,
+            "speed": self.speed,
+            "files_done": self.files_done,
+            "files_total": self.files_total,
+            "error": self.error,
+        }
+
+
+class TransferQueue:
+    """Runs uploads, downloads and relays between hosts on worker threads.
+
+    At most ``max_concurrent`` jobs run at once, and at most ``max_per_host``
+    per connection; among queued jobs the highest priority goes first, then
+    the oldest. A job only starts once the pooled SFTP sessions it needs
+    are free: every running job is granted a number of sessions on its
+    host, together never more than FileManager.transfer_session_limit(), and
+    transfers no more than that. Directory trees add their own sessions to
+    the pool instead (FileManager.extra_sessions). Progress is reported
+    through ``job_callback(snapshot)`` at most once per
+    ``progress_interval`` seconds per job, and on every state
+    change. Pausing a running job stops it and keeps its partial file, so
+    resuming continues where it left off.
+
+    With a ``journal`` (QueueJournal), unfinished jobs are written to disk on
+    every state change and come back paused when the queue is created
+    again, e.g. after a restart; resuming one checks its partial file
+    against the source first (see FileManager._check_download_resume).
+    """
+
+    def __init__(self, file_manager: FileManager, max_concurrent=4, max_per_host=2,
+                 progress_interval=0.2, job_callback=None, journal=None):
+        self.file_manager = file_manager
+        self.max_concurrent = max_concurrent
+        self.max_per_host = max_per_host
+        self.progress_interval = progress_interval
+        self.job_callback = job_callback
+        self.journal = journal
+        self._jobs = {}  # {job_id: TransferJob}
+        self._running = {}  # {connection_name: running job count}
+        self._sessions = {}  # {connection_name: pooled sessions granted to running jobs}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._closed = False
+        if journal is not None:
+            self._restore(journal.load())
+
+    def _restore(self, snapshots):
+        """Re-create jobs journaled by an earlier run; interrupted ones wait paused"""
+        for snapshot in snapshots:
+            try:
+                job = TransferJob(
+                    snapshot["connection_name"], snapshot["direction"], snapshot["local_path"],
+                    snapshot["remote_path"], snapshot.get("priority", PRIORITY_NORMAL),
+                    snapshot.get("is_directory", False), snapshot.get("target_connection"),
+                    snapshot.get("target_path")
+                )
+            except KeyError:
+                continue
+            if snapshot.get("state") == STATE_FAILED:
+                job.state, job.error = STATE_FAILED, snapshot.get("error", "")
+            else:
+                job.state = STATE_PAUSED
+            job.transferred = snapshot.get("transferred", 0)
+            job.total = snapshot.get("total", 0)
+            job.files_done = snapshot.get("files_done", 0)
+            job.files_total = snapshot.get("files_total", 0)
+            job._journaled = (job.state, job.priority)
+            self._jobs[job.id] = job
+
+    def submit(self, connection_name, direction, local_path, remote_path, priority=PRIORITY_NORMAL,
+               is_directory=False):
+        """Queue a transfer of a file, or of a directory tree; returns the job"""
+        if direction not in (DIRECTION_UPLOAD, DIRECTION_DOWNLOAD):
+            raise ValueError(f"Unknown transfer direction '{direction}'.")
+        job = TransferJob(connection_name, direction, local_path, remote_path, priority, is_directory)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._report(job)
+        self._dispatch()
+        return job
+
+    def submit_relay(self, source_connection, source_path, target_connection, target_path,
+                     priority=PRIORITY_NORMAL):
+        """Queue a copy of a file from one connection to another; returns the job"""
+        job = TransferJob(
+            source_connection, DIRECTION_RELAY, "", source_path, priority,
+            target_connection=target_connection, target_path=target_path
+        )
+        with self._lock:
+            self._jobs[job.id] = job
+        self._report(job)
+        self._dispatch()
+        return job
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_jobs(self):
+        """Snapshots of all jobs, oldest first"""
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j.id)
+        return [job.snapshot() for job in jobs]
+
+    def pause(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state not in (STATE_QUEUED, STATE_RUNNING):
+                return False
+            if job.state == STATE_QUEUED:
+                job.state = STATE_PAUSED
+            else:
+                job._pause_requested = True  # Honoured at the next progress callback
+        self._report(job)
+        return True
+
+    def resume(self, job_id):
+        """Re-queue a paused or failed job; it continues from its partial file"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state not in (STATE_PAUSED, STATE_FAILED):
+                return False
+            job.state = STATE_QUEUED
+            job.error = ""
+            job._pause_requested = False
+        self._report(job)
+        self._dispatch()
+        return True
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in FINISHED_STATES:
+                return False
+            if job.state == STATE_RUNNING:
+                job._cancel_requested = True  # Honoured at the next progress callback
+                return True
+            discard = job.state == STATE_PAUSED
+            job.state = STATE_CANCELLED
+            job.finished_at = time.time()
+        if discard:
+            self._discard_partial(job)
+        self._report(job)
+        return True
+
+    def set_priority(self, job_id, priority):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            job.priority = priority
+        self._report(job)
+        self._dispatch()
+        return True
+
+    def clear_finished(self):
+        """Forget completed, failed and cancelled jobs; returns their ids"""
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.state in FINISHED_STATES]
+            for job_id in finished:
+                del self._jobs[job_id]
+        if self.journal is not None and finished:
+            self._save_journal()
+        return finished
+
+    def _save_journal(self):
+        with self._lock:
+            jobs = sorted(
+                (job for job in self._jobs.values() if job.state not in (STATE_COMPLETED, STATE_CANCELLED)),
+                key=lambda j: j.id
+            )
+            snapshots = [job.snapshot() for job in jobs]
+        try:
+            self.journal.save(snapshots)
+        except OSError:
+            pass
+
+    def shutdown(self):
+        """Stop starting jobs and pause the running ones, keeping their partial files"""
+        with self._lock:
+            self._closed = True
+            for job in self._jobs.values():
+                if job.state == STATE_RUNNING:
+                    job._pause_requested = True
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch(self):
+        """Start queued jobs while global and per-host slots are free"""
+        started = []
+        with self._lock:
+            if self._closed:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(1, self.max_concurrent),
+                    thread_name_prefix="sftp-transfer-queue"
+                )
+            queued = sorted(
+                (job for job in self._jobs.values() if job.state == STATE_QUEUED),
+                key=lambda j: (-j.priority, j.id)
+            )
+            running = sum(1 for job in self._jobs.values() if job.state == STATE_RUNNING)
+            limit = self.file_manager.transfer_session_limit()
+            for job in queued:
+                if running >= self.max_concurrent:
+                    break
+                needs = self._session_needs(job)
+                if any(self._running.get(host, 0) >= self.max_per_host
+                       or self._sessions.get(host, 0) + fewest > limit
+                       for host, (fewest, _) in needs.items()):
+                    continue
+                job._sessions = {}
+                for host, (fewest, most) in needs.items():
+                    # Leave a session for each other queued job that could still start on the host
+                    others = sum(1 for other in queued if other.state == STATE_QUEUED and other is not job
+                                 and host in other.hosts)
+                    others = min(others, self.max_per_host - self._running.get(host, 0) - 1)
+                    free = limit - self._sessions.get(host, 0)
+                    job._sessions[host] = max(fewest, min(most, free - others))
+                    self._sessions[host] = self._sessions.get(host, 0) + job._sessions[host]
+                    self._running[host] = self._running.get(host, 0) + 1
+                running += 1
+                job.state = STATE_RUNNING
+                job.started_at = time.time()
+                job._last_report = time.monotonic()
+                job._last_report_bytes = job.transferred
+                started.append(job)
+            executor = self._executor
+
+        for job in started:
+            self._report(job)
+            executor.submit(self._run, job)
+
+    def _session_needs(self, job):
+        """{connection_name: (fewest, most)} pooled sessions the job can run with"""
+        limit = self.file_manager.transfer_session_limit()
+        if job.direction == DIRECTION_RELAY:
+            if job.target_connection == job.connection_name:
+                # A copy within one host holds both of its ends in the same pool
+                return {job.connection_name: (min(2, limit), min(2, limit))}
+            return {job.connection_name: (1, 1), job.target_connection: (1, 1)}
+        if job.is_directory:
+            # Tree transfers add their own sessions to the pool (FileManager.extra_sessions)
+            return {job.connection_name: (0, 0)}
+        return {job.connection_name: (1, self.file_manager._parallel_session_count())}
+
+    def _run(self, job):
+        report_lock = threading.Lock()
+
+        def progress(transferred, total, files_done=None, files_total=None):
+            # Parallel engines and tree transfers call this from several threads
+            if job._cancel_requested:
+                raise TransferCancelled(f"Transfer of '{job.name}' cancelled")
+            if job._pause_requested:
+                raise TransferPaused(f"Transfer of '{job.name}' paused")
+            with report_lock:
+                job.transferred = transferred
+                job.total = total
+                if files_total is not None:
+                    job.files_done, job.files_total = files_done, files_total
+                now = time.monotonic()
+                elapsed = now - job._last_report
+                if elapsed < self.progress_interval and transferred < total:
+                    return
+                job.speed = max(transferred - job._last_report_bytes, 0) / max(elapsed, 1e-6)
+                job._last_report = now
+                job._last_report_bytes = transferred
+            self._report(job)
+
+        state, error, discard = STATE_COMPLETED, "", False
+        sessions = job._sessions.get(job.connection_name)
+        try:
+            if job.is_directory and job.direction == DIRECTION_DOWNLOAD:
+                download_tree(
+                    self.file_manager, job.connection_name, job.remote_path, job.local_path, progress
+                )
+            elif job.direction == DIRECTION_RELAY:
+                self.file_manager.relay_file(
+                    job.connection_name, job.remote_path, job.target_connection, job.target_path, progress
+                )
+            elif job.is_directory:
+                upload_tree(
+                    self.file_manager, job.connection_name, job.local_path, job.remote_path, progress
+                )
+            elif job.direction == DIRECTION_DOWNLOAD:
+                self.file_manager.download_file(
+                    job.connection_name, job.remote_path, job.local_path, progress, sessions=sessions
+                )
+            else:
+                self.file_manager.upload_file(
+                    job.connection_name, job.local_path, job.remote_path, progress, sessions=sessions
+                )
+        except TransferPaused:
+            state = STATE_PAUSED
+        except TransferCancelled:
+            state, discard = STATE_CANCELLED, True
+        except Exception as e:
+            state, error = STATE_FAILED, str(e)
+
+        if discard:
+            self._discard_partial(job)
+        with self._lock:
+            for host, count in job._sessions.items():
+                self._running[host] -= 1
+                self._sessions[host] -= count
+                if not self._running[host]:
+                    del self._running[host]
+                    del self._sessions[host]
+            job._sessions = {}
+            job.state = state
+            job.error = error
+            job.speed = 0.0
+            job._pause_requested = job._cancel_requested = False
+            if state == STATE_COMPLETED:
+                job.transferred = job.total = max(job.total, job.transferred)
+                job.files_done = job.files_total
+            if state in FINISHED_STATES:
+                job.finished_at = time.time()
+        self._report(job)
+        self._dispatch()
+
+    def _discard_partial(self, job):
+        if job.is_directory:
+            return  # Tree transfers discard the partial file they were working on themselves
+        try:
+            if job.direction == DIRECTION_DOWNLOAD:
+                self.file_manager.discard_partial_download(job.local_path)
+            elif job.direction == DIRECTION_RELAY:
+                self.file_manager.discard_partial_upload(job.target_connection, job.target_path)
+            else:
+                self.file_manager.discard_partial_upload(job.connection_name, job.remote_path)
+        except Exception:
+            pass
+
+    def _report(self, job):
+        if self.journal is not None and job._journaled != (job.state, job.priority):
+            # Progress updates alone are not journaled, the partial file records those
+            job._journaled = (job.state, job.priority)
+            self._save_journal()
+        if self.job_callback:
+            try:
+                self.job_callback(job.snapshot())
+            except Exception:
+                pass
@@ -0,0 +1,180 @@
+import io
+import os
+import time
+import paramiko
+
+# Built-in transport tuning profiles. Window and packet sizes apply to every
+# channel opened after the handshake (SFTP sessions, exec channels).
+# Cipher/MAC lists are preferences, most preferred first: algorithms the
+# installed paramiko does not implement are ignored, the remaining ones are
+# the only ones offered to the server. AES-GCM leads where it is available
+# since it needs no separate MAC pass.
+TUNING_PROFILES = {
+    "default": {},
+    "lan": {
+        "window_size": 8 * 1024 * 1024,
+        "max_packet_size": 32768,
+        "ciphers": ["aes128-gcm@openssh.com", "aes256-gcm@openssh.com", "aes128-ctr", "aes256-ctr"],
+        "macs": ["hmac-sha2-256", "hmac-sha1"],
+        "compress": False,
+    },
+    "high-latency": {
+        "window_size": 64 * 1024 * 1024,
+        "max_packet_size": 32768,
+        "ciphers": ["aes128-gcm@openssh.com", "aes256-gcm@openssh.com", "aes128-ctr", "aes256-ctr"],
+        "macs": ["hmac-sha2-256", "hmac-sha1"],
+        "compress": False,
+    },
+    "low-bandwidth": {
+        "window_size": 4 * 1024 * 1024,
+        "compress": True,
+    },
+}
+
+PROBE_PATH_TEMPLATE = "/tmp/.remote_tool_probe_{pid}_{stamp}"
+
+
+def get_profile(conn_data):
+    """Resolve the tuning profile stored on a connection.
+
+    Connections store either a profile name or a dict (as saved by the probe).
+    """
+    profile = (conn_data or {}).get("tuning_profile") or "default"
+    if isinstance(profile, dict):
+        return profile
+    return dict(TUNING_PROFILES.get(profile, {}), name=profile)
+
+
+def _disabled(supported, preferred):
+    if not preferred:
+        return []
+    keep = [alg for alg in preferred if alg in supported]
+    if not keep:
+        return []  # Nothing usable, fall back to paramiko's defaults
+    return [alg for alg in supported if alg not in keep]
+
+
+def _ordered(supported, preferred):
+    return tuple(alg for alg in (preferred or ()) if alg in supported)
+
+
+def build_connect_kwargs(profile):
+    """Extra keyword arguments for SSHClient.connect for a tuning profile"""
+    kwargs = {}
+    if not profile:
+        return kwargs
+    if "compress" in profile:
+        kwargs["compress"] = bool(profile["compress"])
+
+    disabled = {}
+    ciphers = _disabled(paramiko.Transport._preferred_ciphers, profile.get("ciphers"))
+    if ciphers:
+        disabled["ciphers"] = ciphers
+    macs = _disabled(paramiko.Transport._preferred_macs, profile.get("macs"))
+    if macs:
+        disabled["macs"] = macs
+    if disabled:
+        kwargs["disabled_algorithms"] = disabled
+    return kwargs
+
+
+def apply_algorithm_order(transport, profile):
+    """Offer the profile's ciphers and MACs in the profile's order.
+
+    disabled_algorithms only narrows the offer, the order comes from the
+    transport's security options. Must run before the handshake starts.
+    """
+    if not profile or transport is None:
+        return
+    options = transport.get_security_options()
+    ciphers = _ordered(paramiko.Transport._preferred_ciphers, profile.get("ciphers"))
+    if ciphers:
+        options.ciphers = ciphers
+    macs = _ordered(paramiko.Transport._preferred_macs, profile.get("macs"))
+    if macs:
+        options.macs = macs
+
+
+def apply_to_transport(transport, profile):
+    """Apply window/packet sizes to an established transport"""
+    if not profile or transport is None:
+        return
+    if profile.get("window_size"):
+        transport.default_window_size = int(profile["window_size"])
+    if profile.get("max_packet_size"):
+        transport.default_max_packet_size = int(profile["max_packet_size"])
+
+
+def probe_profiles(ssh_manager, name, candidates=None, sample_bytes=8 * 1024 * 1024,
+                   progress_callback=None):
+    """Measure handshake time and SFTP throughput for each candidate profile.
+
+    Opens a dedicated connection per candidate, uploads and downloads a
+    ``sample_bytes`` scratch file in /tmp, and removes it again. Returns a
+    list of result dicts sorted fastest first; failed candidates carry an
+    ``error`` and sort last.
+    """
+    conn_data = ssh_manager.get_connection(name)
+    if not conn_data:
+        raise ValueError(f"Connection '{name}' not found.")
+    if candidates is None:
+        candidates = list(TUNING_PROFILES)
+
+    sample = os.urandom(sample_bytes)
+    results = []
+    for profile_name in candidates:
+        profile = dict(TUNING_PROFILES[profile_name], name=profile_name)
+        if progress_callback:
+            progress_callback(f"Probing profile '{profile_name}'...")
+        result = {"profile": profile, "handshake_s": None, "throughput_bps": 0.0, "error": None}
+        client = None
+        try:
+            start = time.perf_counter()
+            client = ssh_manager._establish_connection(name, conn_data, 1, 10, profile=profile)
+            result["handshake_s"] = time.perf_counter() - start
+
+            sftp = client.open_sftp()
+            remote_path = PROBE_PATH_TEMPLATE.format(pid=os.getpid(), stamp=int(time.time() * 1000))
+            try:
+                start = time.perf_counter()
+                sftp.putfo(io.BytesIO(sample), remote_path)
+                upload_s = time.perf_counter() - start
+
+                buffer = io.BytesIO()
+                start = time.perf_counter()
+                sftp.getfo(remote_path, buffer)
+                download_s = time.perf_counter() - start
+            finally:
+                try:
+                    sftp.remove(remote_path)
+                except Exception:
+                    pass
+                sftp.close()
+
+            result["throughput_bps"] = (2 * sample_bytes) / max(upload_s + download_s, 1e-6)
+        except Exception as e:
+            result["error"] = str(e)
+        finally:
+            if client:
+                client.close()
+        results.append(result)
+
+    results.sort(key=lambda r: (r["error"] is not None, -r["throughput_bps"]))
+    return results
+
+
+def probe_and_save(ssh_manager, name, candidates=None, sample_bytes=8 * 1024 * 1024,
+                   progress_callback=None):
+    """Probe candidate profiles and store the fastest one on the connection"""
+    results = probe_profiles(ssh_manager, name, candidates, sample_bytes, progress_callback)
+    best = results[0] if results and results[0]["error"] is None else None
+    if best:
+        conn_data = ssh_manager.get_connection(name)
+        conn_data["tuning_profile"] = dict(
+            best["profile"],
+            probed_at=time.time(),
+            throughput_bps=best["throughput_bps"],
+            handshake_s=best["handshake_s"],
+        )
+        ssh_manager.save_connections()
+    return best, results
@@ -0,0 +1,322 @@
+import os
+import stat
+import queue
+import posixpath
+import threading
+from core.file_manager import TransferPaused, TransferCancelled
+from core import tar_stream
+
+_DONE = object()  # Tells a worker the walk is over
+
+
+class _TreeProgress:
+    """Aggregates byte and file counts across the files of a tree transfer.
+
+    Totals grow while the walk is still running.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.bytes_done = 0
+        self.bytes_total = 0
+        self.files_done = 0
+        self.files_total = 0
+        self._in_flight = {}  # {path: bytes transferred so far}
+        self._lock = threading.Lock()
+
+    def add_file(self, size, done=False):
+        with self._lock:
+            self.files_total += 1
+            self.bytes_total += size
+            if done:
+                self.files_done += 1
+                self.bytes_done += size
+        if done:
+            self._report()
+
+    def file_progress(self, path, transferred):
+        with self._lock:
+            self._in_flight[path] = transferred
+        self._report()
+
+    def file_finished(self, path, size):
+        with self._lock:
+            self._in_flight.pop(path, None)
+            self.files_done += 1
+            self.bytes_done += size
+        self._report()
+
+    def file_abandoned(self, path):
+        with self._lock:
+            self._in_flight.pop(path, None)
+
+    def _report(self):
+        if not self.callback:
+            return
+        with self._lock:
+            transferred = self.bytes_done + sum(self._in_flight.values())
+            counts = (transferred, self.bytes_total, self.files_done, self.files_total)
+        self.callback(*counts)
+
+
+def _run_tree(walk, transfer_file, workers):
+    """Run ``walk(enqueue, stop_event)`` on one thread and ``transfer_file(entry)`` on ``workers``.
+
+    Files are transferred while the walk is still discovering more. Pausing
+    or cancelling (raised from a progress callback) stops everything; other
+    per-file errors are collected and reported once all files were tried.
+    """
+    file_queue = queue.Queue()
+    stop_event = threading.Event()
+    interrupts = []
+    failures = []
+    lock = threading.Lock()
+
+    def walker():
+        try:
+            walk(file_queue.put, stop_event)
+        except (TransferPaused, TransferCancelled) as e:
+            interrupts.append(e)
+            stop_event.set()
+        except Exception as e:
+            failures.append(("<walk>", e))
+            stop_event.set()
+        finally:
+            for _ in range(workers):
+                file_queue.put(_DONE)
+
+    def worker():
+        while True:
+            entry = file_queue.get()
+            if entry is _DONE or stop_event.is_set():
+                if entry is _DONE:
+                    return
+                continue  # Drain until the walker signals the end
+            try:
+                transfer_file(entry)
+            except (TransferPaused, TransferCancelled) as e:
+                with lock:
+                    interrupts.append(e)
+                stop_event.set()
+            except Exception as e:
+                with lock:
+                    failures.append((entry[0], e))
+
+    threads = [threading.Thread(target=walker, name="sftp-tree-walk", daemon=True)]
+    threads += [
+        threading.Thread(target=worker, name=f"sftp-tree-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if interrupts:
+        raise interrupts[0]
+    if failures:
+        path, error = failures[0]
+        raise IOError(f"{len(failures)} file(s) failed, first: {path}: {error}")
+
+
+def _run_tree_on_own_sessions(file_manager, connection_name, walk, transfer_file, workers=None):
+    """_run_tree on sessions added to the pool for this tree: the walker's and one per worker.
+
+    ``workers`` defaults to FileManager.tree_workers. If the pool cannot
+    grow that far (see FileManager.extra_sessions), fewer workers run.
+    """
+    workers = workers or file_manager.tree_workers
+    with file_manager.extra_sessions(connection_name, workers + 1) as added:
+        own = added - 1  # One of them is the walker's
+        if own <= 0:
+            own = file_manager.free_transfer_sessions(connection_name) - 1
+        _run_tree(walk, transfer_file, max(1, min(workers, own)))
+
+
+def _unchanged(size, mtime, other_size, other_mtime):
+    """Tree transfers preserve mtimes, so size + mtime identify a file already copied"""
+    return size == other_size and int(mtime) == int(other_mtime or 0)
+
+
+def _tar_client(file_manager, connection_name):
+    client = file_manager.ssh_manager.get_client(connection_name)
+    if not client:
+        raise ConnectionError(f"Not connected to '{connection_name}'.")
+    return client
+
+
+def upload_tree(file_manager, connection_name, local_dir, remote_dir, progress_callback=None,
+                workers=None, use_tar=None):
+    """Upload the directory ``local_dir`` to ``remote_dir`` recursively.
+
+    The walk runs breadth-first on its own pooled session. Each directory's
+    missing subdirectories are created, after a single listing of what
+    already exists, before any of its files are queued. Files whose remote
+    copy has the same size and mtime are skipped, so running the upload
+    again after an interruption only sends what is missing.
+    ``progress_callback(bytes_done, bytes_total, files_done, files_total)``
+
+    Trees of many small files are streamed as one tar archive instead (see
+    tar_stream.should_use_tar) when the remote has tar and ``remote_dir`` is
+    missing or empty. A destination that already has entries, like a
+    paused tar upload being resumed, goes through the per-file path so that
+    only what is missing is sent; tar preserves mtimes, so what the archive
+    delivered is skipped. ``use_tar`` forces the choice. Cancelling a tar
+    upload removes what it had written.
+    """
+    stats = None
+    auto = use_tar is None
+    if auto:
+        stats = tar_stream.local_tree_stats(local_dir)
+        use_tar = tar_stream.should_use_tar(*stats)
+    if use_tar:
+        client = _tar_client(file_manager, connection_name)
+        if tar_stream.remote_has_tar(client) and not (
+                auto and tar_stream.remote_dir_has_entries(client, remote_dir)):
+            with file_manager.ssh_manager.in_use(connection_name):
+                tar_stream.upload_tar(
+                    client, local_dir, remote_dir, progress_callback,
+                    file_manager.bandwidth.throttle(connection_name), stats
+                )
+            return
+
+    progress = _TreeProgress(progress_callback)
+    # One share of the bandwidth caps for the whole tree, however many workers
+    throttle = file_manager.bandwidth.throttle(connection_name)
+
+    def walk(enqueue, stop_event):
+        with file_manager._sftp_session(connection_name) as sftp:
+            try:
+                if not stat.S_ISDIR(sftp.stat(remote_dir).st_mode):
+                    raise IOError(f"'{remote_dir}' exists and is not a directory")
+            except FileNotFoundError:
+                sftp.mkdir(remote_dir)
+
+            pending = [(local_dir, remote_dir)]
+            while pending and not stop_event.is_set():
+                local_path, remote_path = pending.pop(0)
+                existing = {attr.filename: attr for attr in sftp.listdir_attr(remote_path)}
+                with os.scandir(local_path) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+
+                # Directories of this level first, so every queued file has its parent
+                for entry in entries:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    child = posixpath.join(remote_path, entry.name)
+                    attr = existing.get(entry.name)
+                    if attr is None:
+                        sftp.mkdir(child)
+                    elif not stat.S_ISDIR(attr.st_mode):
+                        raise IOError(f"'{child}' exists and is not a directory")
+                    pending.append((entry.path, child))
+
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False) or not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    attr = existing.get(entry.name)
+                    if attr is not None and stat.S_ISREG(attr.st_mode or 0) and _unchanged(
+                            st.st_size, st.st_mtime, attr.st_size, attr.st_mtime):
+                        progress.add_file(st.st_size, done=True)
+                        continue
+                    progress.add_file(st.st_size)
+                    enqueue((entry.path, posixpath.join(remote_path, entry.name), st.st_size, st.st_mtime))
+
+    def transfer_file(entry):
+        local_path, remote_path, size, mtime = entry
+        try:
+            file_manager.upload_file(
+                connection_name, local_path, remote_path,
+                lambda transferred, total: progress.file_progress(local_path, transferred),
+                allow_parallel=False, throttle=throttle, sessions=1, mtime=mtime
+            )
+        except TransferCancelled:
+            progress.file_abandoned(local_path)
+            file_manager.discard_partial_upload(connection_name, remote_path)
+            raise
+        except Exception:
+            progress.file_abandoned(local_path)
+            raise
+        progress.file_finished(local_path, size)
+
+    _run_tree_on_own_sessions(file_manager, connection_name, walk, transfer_file, workers)
+
+
+def download_tree(file_manager, connection_name, remote_dir, local_dir, progress_callback=None,
+                  workers=None, use_tar=None):
+    """Download the remote directory ``remote_dir`` to ``local_dir`` recursively.
+
+    Mirrors upload_tree: breadth-first walk on its own session, local
+    directories created before their files are queued, unchanged files
+    (same size and mtime) skipped; trees of many small files go through
+    tar like in upload_tree, unless ``local_dir`` already has entries.
+    ``progress_callback(bytes_done, bytes_total, files_done, files_total)``
+    """
+    if use_tar is None and tar_stream.local_dir_has_entries(local_dir):
+        use_tar = False  # Resumed or repeated: the per-file path skips what is already here
+    if use_tar is not False:
+        client = _tar_client(file_manager, connection_name)
+        if tar_stream.remote_has_tar(client):
+            stats = None
+            if use_tar is None:
+                stats = tar_stream.remote_tree_stats(client, remote_dir)
+                use_tar = tar_stream.should_use_tar(*stats)
+            if use_tar:
+                with file_manager.ssh_manager.in_use(connection_name):
+                    tar_stream.download_tar(
+                        client, remote_dir, local_dir, progress_callback,
+                        file_manager.bandwidth.throttle(connection_name), stats
+                    )
+                return
+
+    progress = _TreeProgress(progress_callback)
+    throttle = file_manager.bandwidth.throttle(connection_name)
+
+    def walk(enqueue, stop_event):
+        with file_manager._sftp_session(connection_name) as sftp:
+            pending = [(remote_dir, local_dir)]
+            while pending and not stop_event.is_set():
+                remote_path, local_path = pending.pop(0)
+                os.makedirs(local_path, exist_ok=True)
+                attrs = sorted(sftp.listdir_attr(remote_path), key=lambda a: a.filename)
+
+                for attr in attrs:
+                    if stat.S_ISDIR(attr.st_mode or 0):
+                        child = os.path.join(local_path, attr.filename)
+                        os.makedirs(child, exist_ok=True)
+                        pending.append((posixpath.join(remote_path, attr.filename), child))
+
+                for attr in attrs:
+                    if not stat.S_ISREG(attr.st_mode or 0):
+                        continue  # Directories handled above; links and specials skipped
+                    target = os.path.join(local_path, attr.filename)
+                    try:
+                        st = os.stat(target)
+                        if _unchanged(attr.st_size, attr.st_mtime, st.st_size, st.st_mtime):
+                            progress.add_file(attr.st_size, done=True)
+                            continue
+                    except FileNotFoundError:
+                        pass
+                    progress.add_file(attr.st_size)
+                    enqueue((posixpath.join(remote_path, attr.filename), target, attr.st_size, attr.st_mtime))
+
+    def transfer_file(entry):
+        remote_path, local_path, size, mtime = entry
+        try:
+            file_manager.download_file(
+                connection_name, remote_path, local_path,
+                lambda transferred, total: progress.file_progress(remote_path, transferred),
+                allow_parallel=False, throttle=throttle, sessions=1
+            )
+        except TransferCancelled:
+            progress.file_abandoned(remote_path)
+            file_manager.discard_partial_download(local_path)
+            raise
+        except Exception:
+            progress.file_abandoned(remote_path)
+            raise
+        os.utime(local_path, (mtime, mtime))
+        progress.file_finished(remote_path, size)
+
+    _run_tree_on_own_sessions(file_manager, connection_name, walk, transfer_file, workers)
@@ -0,0 +1,99 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core.ssh_manager import SSHManager
+
+# Per-host warm-up states reported through state_callback
+STATE_PENDING = "pending"
+STATE_CONNECTING = "connecting"
+STATE_CONNECTED = "connected"
+STATE_FAILED = "failed"
+STATE_SKIPPED = "skipped"
+
+
+class WarmPool:
+    """Pre-connects favorite connections in the background.
+
+    Handshakes run on a bounded thread pool through SSHManager.connect, so a
+    later listing or script run on a warmed host finds an active client.
+    Hosts whose turn comes after the startup budget has expired are skipped.
+    Each handshake (TCP, banner, key exchange and authentication together)
+    gets ``connect_timeout`` seconds, or the connection's own
+    ``warmup_timeout``, and never runs past the budget.
+    """
+
+    def __init__(self, ssh_manager: SSHManager, max_workers=4, budget_seconds=30,
+                 connect_timeout=5, state_callback=None):
+        self.ssh_manager = ssh_manager
+        self.max_workers = max_workers
+        self.budget_seconds = budget_seconds
+        self.connect_timeout = connect_timeout
+        self.state_callback = state_callback
+        self.states = {}  # {conn_name: state}
+        self._executor = None
+        self._deadline = None
+        self._lock = threading.Lock()
+
+    def get_favorites(self):
+        """Names of saved connections flagged for warm-up"""
+        return [
+            name for name, data in self.ssh_manager.get_all_connections().items()
+            if data.get("favorite")
+        ]
+
+    def start(self, names=None):
+        """Start warming ``names`` (default: all favorites). Returns the names queued."""
+        if names is None:
+            names = self.get_favorites()
+        if not names:
+            return []
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(1, self.max_workers),
+                    thread_name_prefix="ssh-warmup"
+                )
+            self._deadline = time.monotonic() + self.budget_seconds
+            executor = self._executor
+
+        for name in names:
+            self._set_state(name, STATE_PENDING)
+            executor.submit(self._warm, name)
+        return list(names)
+
+    def stop(self):
+        """Cancel queued warm-ups; handshakes already running finish on their own"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _connect_timeout(self, name):
+        """Seconds the handshake with ``name`` may take, per connection or the pool default"""
+        timeout = (self.ssh_manager.get_connection(name) or {}).get("warmup_timeout")
+        return self.connect_timeout if timeout is None else float(timeout)
+
+    def _warm(self, name):
+        now = time.monotonic()
+        remaining = self._deadline - now
+        if remaining <= 0:
+            self._set_state(name, STATE_SKIPPED, "startup budget exhausted")
+            return
+
+        self._set_state(name, STATE_CONNECTING)
+        timeout = min(self._connect_timeout(name), remaining)
+        try:
+            # One attempt only, a slow or dead host must not eat the budget
+            self.ssh_manager.connect(name, max_retries=1, timeout=timeout, deadline=now + timeout)
+            self._set_state(name, STATE_CONNECTED)
+        except Exception as e:
+            self._set_state(name, STATE_FAILED, str(e))
+
+    def _set_state(self, name, state, message=""):
+        self.states[name] = state
+        if self.state_callback:
+            try:
+                self.state_callback(name, state, message)
+            except Exception:
+                pass
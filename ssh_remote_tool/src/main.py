@@ -9,6 +9,12 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from ui.main_window import MainWindow
 
 def main():
+    if "--broker" in sys.argv:
+        # Headless connection broker shared by all tool instances
+        from core.broker import run_broker
+        run_broker()
+        return 0
+
     app = QApplication(sys.argv)
     app.setApplicationName("SSH Remote Operations Tool")
     app.setApplicationVersion("1.0")
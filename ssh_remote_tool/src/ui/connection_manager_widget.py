@@ -1,10 +1,15 @@
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QListWidget, QPushButton, QHBoxLayout,
     QMessageBox, QDialog, QFormLayout, QLineEdit, QComboBox, QFileDialog,
-    QListWidgetItem, QMenu
+    QListWidgetItem, QMenu, QCheckBox
 )
-from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtCore import Qt, pyqtSignal, QThread, QTimer
+from PyQt6.QtGui import QColor, QIcon, QPixmap
 from core.ssh_manager import SSHManager
+from core.transport_tuning import TUNING_PROFILES, probe_and_save
+from core.warm_pool import WarmPool, STATE_CONNECTED
+from core.reachability import MAX_SWEEP_WORKERS, ReachabilityChecker
+from utils.config import DEFAULT_SETTINGS
 
 class ConnectionDialog(QDialog):
     def __init__(self, connection_data=None, parent=None):
@@ -17,19 +22,34 @@ class ConnectionDialog(QDialog):
         self.port = QLineEdit("22")
         self.user = QLineEdit()
         self.auth_method = QComboBox()
-        self.auth_method.addItems(["password", "key"])
+        self.auth_method.addItems(["password", "key", "agent"])
         self.password = QLineEdit()
         self.password.setEchoMode(QLineEdit.EchoMode.Password)
         self.key_path = QLineEdit()
+        self.key_passphrase = QLineEdit()
+        self.key_passphrase.setEchoMode(QLineEdit.EchoMode.Password)
+        self.key_passphrase.setPlaceholderText("Only for encrypted keys")
         self.key_browse_btn = QPushButton("Browse...")
         self.default_dir = QLineEdit("/")
         self.default_dir.setPlaceholderText("Default remote directory (e.g., /home/user)")
+        self.favorite = QCheckBox("Pre-connect at startup")
+        self.keepalive_interval = QLineEdit()
+        self.keepalive_interval.setPlaceholderText("Seconds between keepalives (default 30, 0 = off)")
+        self.warmup_timeout = QLineEdit()
+        self.warmup_timeout.setPlaceholderText("Seconds the startup pre-connect may take (default from settings)")
+        self.tuning_profile = QComboBox()
+        self.tuning_profile.addItems(list(TUNING_PROFILES))
+        self._probed_profile = None  # Profile saved by a throughput probe, kept unless changed
 
         self.layout.addRow("Connection Name:", self.name)
         self.layout.addRow("Host:", self.host)
         self.layout.addRow("Port:", self.port)
         self.layout.addRow("User:", self.user)
         self.layout.addRow("Default Directory:", self.default_dir)
+        self.layout.addRow("Favorite:", self.favorite)
+        self.layout.addRow("Keepalive Interval:", self.keepalive_interval)
+        self.layout.addRow("Warm-up Timeout:", self.warmup_timeout)
+        self.layout.addRow("Transport Profile:", self.tuning_profile)
         self.layout.addRow("Auth Method:", self.auth_method)
         self.layout.addRow("Password:", self.password)
 
@@ -37,6 +57,7 @@ class ConnectionDialog(QDialog):
         key_layout.addWidget(self.key_path)
         key_layout.addWidget(self.key_browse_btn)
         self.layout.addRow("SSH Key Path:", key_layout)
+        self.layout.addRow("Key Passphrase:", self.key_passphrase)
 
         self.buttons = QHBoxLayout()
         self.ok_button = QPushButton("OK")
@@ -56,21 +77,32 @@ class ConnectionDialog(QDialog):
             self.port.setText(str(connection_data.get("port", "22")))
             self.user.setText(connection_data.get("user", ""))
             self.default_dir.setText(connection_data.get("default_dir", "/"))
+            self.favorite.setChecked(bool(connection_data.get("favorite", False)))
+            keepalive = connection_data.get("keepalive_interval")
+            self.keepalive_interval.setText("" if keepalive is None else str(keepalive))
+            warmup_timeout = connection_data.get("warmup_timeout")
+            self.warmup_timeout.setText("" if warmup_timeout is None else str(warmup_timeout))
+            profile = connection_data.get("tuning_profile") or "default"
+            if isinstance(profile, dict):
+                self._probed_profile = profile
+                label = f"probed: {profile.get('name', 'custom')}"
+                self.tuning_profile.addItem(label)
+                self.tuning_profile.setCurrentText(label)
+            else:
+                self.tuning_profile.setCurrentText(profile)
             self.auth_method.setCurrentText(connection_data.get("auth_method", "password"))
             self.password.setText(connection_data.get("password", ""))
             self.key_path.setText(connection_data.get("key_path", ""))
+            self.key_passphrase.setText(connection_data.get("key_passphrase") or "")
 
         self.toggle_auth_fields(self.auth_method.currentText())
 
     def toggle_auth_fields(self, method):
-        if method == "password":
-            self.password.setVisible(True)
-            self.key_path.setVisible(False)
-            self.key_browse_btn.setVisible(False)
-        else:
-            self.password.setVisible(False)
-            self.key_path.setVisible(True)
-            self.key_browse_btn.setVisible(True)
+        # "agent" uses keys from a running ssh-agent and needs neither field
+        self.password.setVisible(method == "password")
+        self.key_path.setVisible(method == "key")
+        self.key_browse_btn.setVisible(method == "key")
+        self.key_passphrase.setVisible(method == "key")
 
     def browse_key(self):
         path, _ = QFileDialog.getOpenFileName(self, "Select SSH Key")
@@ -84,17 +116,69 @@ class ConnectionDialog(QDialog):
             "port": int(self.port.text()),
             "user": self.user.text(),
             "default_dir": self.default_dir.text() or "/",
+            "favorite": self.favorite.isChecked(),
+            "keepalive_interval": int(self.keepalive_interval.text()) if self.keepalive_interval.text().strip() else None,
+            "warmup_timeout": float(self.warmup_timeout.text()) if self.warmup_timeout.text().strip() else None,
+            "tuning_profile": self._get_tuning_profile(),
             "auth_method": self.auth_method.currentText(),
             "password": self.password.text() if self.auth_method.currentText() == "password" else None,
             "key_path": self.key_path.text() if self.auth_method.currentText() == "key" else None,
+            "key_passphrase": self.key_passphrase.text() or None if self.auth_method.currentText() == "key" else None,
         }
 
+    def _get_tuning_profile(self):
+        selected = self.tuning_profile.currentText()
+        if selected in TUNING_PROFILES:
+            return selected
+        return self._probed_profile
+
+class TransportProbeWorker(QThread):
+    """Worker thread probing transport tuning profiles for one connection"""
+    progress = pyqtSignal(str)
+    probe_finished = pyqtSignal(str, object, list)  # name, best result, all results
+    error_occurred = pyqtSignal(str, str)
+
+    def __init__(self, ssh_manager, connection_name):
+        super().__init__()
+        self.ssh_manager = ssh_manager
+        self.connection_name = connection_name
+
+    def run(self):
+        try:
+            best, results = probe_and_save(
+                self.ssh_manager, self.connection_name, progress_callback=self.progress.emit
+            )
+            self.probe_finished.emit(self.connection_name, best, results)
+        except Exception as e:
+            self.error_occurred.emit(self.connection_name, str(e))
+
 class ConnectionManagerWidget(QWidget):
     connection_selected = pyqtSignal(str)
+    warmup_state_changed = pyqtSignal(str, str, str)  # name, state, message
+    reachability_changed = pyqtSignal(str, object)  # name, result dict
+
+    # Reachability sweep for the status lights
+    REACHABILITY_MAX_WORKERS = MAX_SWEEP_WORKERS
+    REACHABILITY_TIMEOUT = 3.0
+    REACHABILITY_TTL_SECONDS = 60
 
     def __init__(self, ssh_manager: SSHManager, parent=None):
         super().__init__(parent)
         self.ssh_manager = ssh_manager
+        self.warm_pool = None
+        self.probe_workers = {}  # {conn_name: TransportProbeWorker}
+        self.reachability = {}  # {conn_name: latest reachability result}
+        self.reachability_checker = ReachabilityChecker(
+            ssh_manager,
+            max_workers=self.REACHABILITY_MAX_WORKERS,
+            timeout=self.REACHABILITY_TIMEOUT,
+            ttl=self.REACHABILITY_TTL_SECONDS,
+            # Called from checker threads; the signal is delivered on the GUI thread
+            result_callback=self.reachability_changed.emit
+        )
+        self.reachability_timer = QTimer(self)
+        self.reachability_timer.timeout.connect(self.refresh_reachability)
+        self.connection_states = {}  # {conn_name: warm-up state}
         self.layout = QVBoxLayout(self)
 
         self.connection_list = QListWidget()
@@ -126,6 +210,8 @@ class ConnectionManagerWidget(QWidget):
         self.delete_btn.clicked.connect(self.delete_connection)
         self.import_btn.clicked.connect(self.import_connections)
         self.export_btn.clicked.connect(self.export_connections)
+        self.warmup_state_changed.connect(self.on_warmup_state_changed)
+        self.reachability_changed.connect(self.on_reachability_changed)
 
         self.load_connections()
 
@@ -133,10 +219,91 @@ class ConnectionManagerWidget(QWidget):
         self.connection_list.clear()
         connections = self.ssh_manager.get_all_connections()
         for name, data in connections.items():
-            item = QListWidgetItem(f"{name} ({data['user']}@{data['host']})")
+            item = QListWidgetItem(self._format_item_text(name, data))
             item.setData(Qt.ItemDataRole.UserRole, name)
+            self._apply_reachability(item, self.reachability.get(name))
             self.connection_list.addItem(item)
 
+    def _format_item_text(self, name, data):
+        text = f"{name} ({data['user']}@{data['host']})"
+        state = self.connection_states.get(name)
+        if state:
+            text += f" [{state}]"
+        return text
+
+    def _find_item(self, name):
+        for row in range(self.connection_list.count()):
+            item = self.connection_list.item(row)
+            if item.data(Qt.ItemDataRole.UserRole) == name:
+                return item
+        return None
+
+    def start_reachability_sweep(self):
+        """Sweep all saved connections now and again every TTL period"""
+        self.refresh_reachability()
+        self.reachability_timer.start(int(self.REACHABILITY_TTL_SECONDS * 1000))
+
+    def stop_reachability_sweep(self):
+        self.reachability_timer.stop()
+        self.reachability_checker.stop()
+
+    def refresh_reachability(self, force=False):
+        self.reachability_checker.sweep(force=force)
+
+    def on_reachability_changed(self, name, result):
+        self.reachability[name] = result
+        item = self._find_item(name)
+        if item:
+            self._apply_reachability(item, result)
+
+    def _apply_reachability(self, item, result):
+        if result is None:
+            color, tooltip = "#A0A0A0", "Status unknown"
+        elif result["reachable"]:
+            color = "#228B22"
+            tooltip = f"Reachable ({result['latency_ms']:.0f} ms)\n{result['banner']}"
+        else:
+            color, tooltip = "#DC143C", f"Unreachable: {result['error']}"
+        pixmap = QPixmap(10, 10)
+        pixmap.fill(QColor(color))
+        item.setIcon(QIcon(pixmap))
+        item.setToolTip(tooltip)
+
+    def start_warmup(self, max_workers=None, budget_seconds=None, connect_timeout=None):
+        """Pre-connect favorite connections in the background.
+
+        Limits left as None take their value from DEFAULT_SETTINGS.
+        """
+        if self.warm_pool is None:
+            if max_workers is None:
+                max_workers = DEFAULT_SETTINGS["warmup_max_workers"]
+            if budget_seconds is None:
+                budget_seconds = DEFAULT_SETTINGS["warmup_budget_seconds"]
+            if connect_timeout is None:
+                connect_timeout = DEFAULT_SETTINGS["warmup_connect_timeout"]
+            self.warm_pool = WarmPool(
+                self.ssh_manager,
+                max_workers=max_workers,
+                budget_seconds=budget_seconds,
+                connect_timeout=connect_timeout,
+                # Called from pool threads; the signal is delivered on the GUI thread
+                state_callback=self.warmup_state_changed.emit
+            )
+        return self.warm_pool.start()
+
+    def stop_warmup(self):
+        if self.warm_pool:
+            self.warm_pool.stop()
+
+    def on_warmup_state_changed(self, name, state, message):
+        self.connection_states[name] = state
+        item = self._find_item(name)
+        data = self.ssh_manager.get_connection(name)
+        if item and data:
+            item.setText(self._format_item_text(name, data))
+            if message:
+                item.setToolTip(message)
+
     def add_connection(self):
         dialog = ConnectionDialog(parent=self)
         if dialog.exec():
@@ -186,6 +353,7 @@ class ConnectionManagerWidget(QWidget):
         conn_name = item.data(Qt.ItemDataRole.UserRole)
         try:
             self.ssh_manager.connect(conn_name)
+            self.on_warmup_state_changed(conn_name, STATE_CONNECTED, "")
             self.connection_selected.emit(conn_name)
             QMessageBox.information(self, "Success", f"Connected to {conn_name}")
         except Exception as e:
@@ -198,6 +366,7 @@ class ConnectionManagerWidget(QWidget):
 
         context_menu = QMenu(self)
         connect_action = context_menu.addAction("Connect")
+        probe_action = context_menu.addAction("Probe Transport Profiles")
         edit_action = context_menu.addAction("Edit")
         delete_action = context_menu.addAction("Delete")
 
@@ -205,11 +374,47 @@ class ConnectionManagerWidget(QWidget):
 
         if action == connect_action:
             self.connect_to_selected(item)
+        elif action == probe_action:
+            self.probe_transport(item.data(Qt.ItemDataRole.UserRole))
         elif action == edit_action:
             self.edit_connection()
         elif action == delete_action:
             self.delete_connection()
 
+    def probe_transport(self, conn_name):
+        """Measure candidate transport profiles in the background and keep the fastest"""
+        if conn_name in self.probe_workers:
+            return
+        worker = TransportProbeWorker(self.ssh_manager, conn_name)
+        worker.probe_finished.connect(self.on_probe_finished)
+        worker.error_occurred.connect(self.on_probe_error)
+        worker.finished.connect(lambda: self.probe_workers.pop(conn_name, None))
+        self.probe_workers[conn_name] = worker
+        self.on_warmup_state_changed(conn_name, "probing", "")
+        worker.start()
+
+    def on_probe_finished(self, conn_name, best, results):
+        self.on_warmup_state_changed(conn_name, "probed", "")
+        lines = []
+        for result in results:
+            profile_name = result["profile"].get("name", "custom")
+            if result["error"]:
+                lines.append(f"{profile_name}: failed ({result['error']})")
+            else:
+                lines.append(
+                    f"{profile_name}: handshake {result['handshake_s']:.2f}s, "
+                    f"{result['throughput_bps'] / 1024 / 1024:.2f} MB/s"
+                )
+        if best:
+            lines.append(f"\nSaved profile '{best['profile'].get('name')}' for {conn_name}.")
+        else:
+            lines.append("\nNo profile succeeded; settings unchanged.")
+        QMessageBox.information(self, "Transport Probe", "\n".join(lines))
+
+    def on_probe_error(self, conn_name, error_msg):
+        self.on_warmup_state_changed(conn_name, "probe failed", error_msg)
+        QMessageBox.critical(self, "Transport Probe", f"Probe of {conn_name} failed: {error_msg}")
+
     def import_connections(self):
         """Import connections from JSON file"""
         file_path, _ = QFileDialog.getOpenFileName(
@@ -266,7 +471,8 @@ class ConnectionManagerWidget(QWidget):
                         'port': data.get('port', 22),
                         'user': data.get('user', ''),
                         'auth_method': data.get('auth_method', 'password'),
-                        'key_path': data.get('key_path', '') if data.get('auth_method') == 'key' else ''
+                        'key_path': data.get('key_path', '') if data.get('auth_method') == 'key' else '',
+                        'favorite': data.get('favorite', False)
                         # Note: passwords are not exported for security
                     }
 
@@ -0,0 +1,179 @@
+import os
+import time
+import threading
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem, QTreeWidget, QTreeWidgetItem,
+    QPushButton, QLineEdit, QLabel, QProgressBar, QHeaderView, QMessageBox
+)
+from PyQt6.QtCore import Qt, pyqtSignal
+from core.file_manager import FileManager, TransferCancelled
+from core.fanout import fanout_upload
+from utils.helpers import format_bytes
+
+
+class FanoutUploadDialog(QDialog):
+    """Uploads one local file to many hosts at once, with progress per host"""
+    # Emitted from the upload threads; Qt queues them onto the GUI thread
+    host_progress = pyqtSignal(str, object, object)  # connection_name, transferred, total
+    upload_finished = pyqtSignal(object)  # {connection_name: error message or None}
+
+    PROGRESS_INTERVAL = 0.2  # Seconds between progress updates per host
+
+    def __init__(self, file_manager: FileManager, local_path, remote_path, selected_connections=(),
+                 parent=None):
+        super().__init__(parent)
+        self.file_manager = file_manager
+        self.local_path = local_path
+        self._progress_bars = {}  # {connection_name: QProgressBar}
+        self._status_items = {}  # {connection_name: QTreeWidgetItem}
+        self._last_progress = {}  # {connection_name: time of the last update shown}
+        self._cancel_requested = False
+        self._running = False
+
+        self.setWindowTitle("Upload to Multiple Hosts")
+        self.resize(640, 480)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(f"Upload '{os.path.basename(local_path)}' "
+                                f"({format_bytes(os.path.getsize(local_path))}) to:"))
+
+        self.host_list = QListWidget()
+        for name in sorted(file_manager.ssh_manager.get_all_connections()):
+            item = QListWidgetItem(name)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(
+                Qt.CheckState.Checked if name in selected_connections else Qt.CheckState.Unchecked
+            )
+            self.host_list.addItem(item)
+        layout.addWidget(self.host_list)
+
+        path_layout = QHBoxLayout()
+        path_layout.addWidget(QLabel("Remote path:"))
+        self.path_edit = QLineEdit(remote_path)
+        path_layout.addWidget(self.path_edit)
+        layout.addLayout(path_layout)
+
+        self.progress_tree = QTreeWidget()
+        self.progress_tree.setHeaderLabels(["Host", "Progress", "Status"])
+        self.progress_tree.setRootIsDecorated(False)
+        self.progress_tree.header().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.progress_tree)
+
+        self.summary_label = QLabel("")
+        layout.addWidget(self.summary_label)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.start_btn = QPushButton("Upload")
+        self.cancel_btn = QPushButton("Cancel")
+        self.close_btn = QPushButton("Close")
+        self.cancel_btn.setEnabled(False)
+        for button in (self.start_btn, self.cancel_btn, self.close_btn):
+            button_layout.addWidget(button)
+        layout.addLayout(button_layout)
+
+        self.start_btn.clicked.connect(self.start_upload)
+        self.cancel_btn.clicked.connect(self.cancel_upload)
+        self.close_btn.clicked.connect(self.close)
+        self.host_progress.connect(self.on_host_progress)
+        self.upload_finished.connect(self.on_upload_finished)
+
+    def _checked_hosts(self):
+        return [
+            self.host_list.item(i).text() for i in range(self.host_list.count())
+            if self.host_list.item(i).checkState() == Qt.CheckState.Checked
+        ]
+
+    def start_upload(self):
+        hosts = self._checked_hosts()
+        remote_path = self.path_edit.text().strip()
+        if not hosts:
+            QMessageBox.warning(self, "Warning", "Select at least one host.")
+            return
+        if not remote_path:
+            QMessageBox.warning(self, "Warning", "Enter a remote path.")
+            return
+
+        self.progress_tree.clear()
+        self._progress_bars.clear()
+        self._status_items.clear()
+        self._last_progress.clear()
+        for name in hosts:
+            item = QTreeWidgetItem(self.progress_tree)
+            item.setText(0, name)
+            item.setText(2, "Connecting")
+            bar = QProgressBar()
+            bar.setRange(0, 1000)
+            self.progress_tree.setItemWidget(item, 1, bar)
+            self._progress_bars[name] = bar
+            self._status_items[name] = item
+
+        self._cancel_requested = False
+        self._running = True
+        self.start_btn.setEnabled(False)
+        self.host_list.setEnabled(False)
+        self.path_edit.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.summary_label.setText(f"Uploading to {len(hosts)} host(s)...")
+
+        def progress(connection_name, transferred, total):
+            if self._cancel_requested:
+                raise TransferCancelled("Upload cancelled")
+            now = time.monotonic()
+            last = self._last_progress.get(connection_name, 0)
+            if transferred < total and now - last < self.PROGRESS_INTERVAL:
+                return
+            self._last_progress[connection_name] = now
+            self.host_progress.emit(connection_name, transferred, total)
+
+        def run():
+            try:
+                results = fanout_upload(self.file_manager, hosts, self.local_path, remote_path, progress)
+            except Exception as e:
+                results = {name: str(e) for name in hosts}
+            self.upload_finished.emit(results)
+
+        threading.Thread(target=run, name="fanout-upload", daemon=True).start()
+
+    def cancel_upload(self):
+        self._cancel_requested = True
+        self.cancel_btn.setEnabled(False)
+
+    def on_host_progress(self, connection_name, transferred, total):
+        bar = self._progress_bars.get(connection_name)
+        if bar is None:
+            return
+        bar.setValue(int(transferred * 1000 / total) if total else 1000)
+        bar.setFormat(f"{format_bytes(transferred)} / {format_bytes(total)}")
+        self._status_items[connection_name].setText(2, "Uploading")
+
+    def on_upload_finished(self, results):
+        self._running = False
+        self.cancel_btn.setEnabled(False)
+        self.start_btn.setEnabled(True)
+        self.host_list.setEnabled(True)
+        self.path_edit.setEnabled(True)
+
+        failed = []
+        for name, error in results.items():
+            item = self._status_items.get(name)
+            if item is None:
+                continue
+            if error is None:
+                self._progress_bars[name].setValue(1000)
+                item.setText(2, "Done")
+            else:
+                failed.append(name)
+                item.setText(2, f"Failed: {error}")
+                item.setToolTip(2, error)
+        succeeded = len(results) - len(failed)
+        summary = f"{succeeded} of {len(results)} host(s) succeeded"
+        if failed:
+            summary += f"; failed: {', '.join(sorted(failed))}"
+        self.summary_label.setText(summary)
+
+    def closeEvent(self, event):
+        if self._running:
+            # The threads finish on their own once they see the cancel request
+            self._cancel_requested = True
+        super().closeEvent(event)
@@ -9,6 +9,8 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import QDir, Qt, QModelIndex, QThread, pyqtSignal
 from PyQt6.QtGui import QAction, QIcon, QStandardItemModel, QStandardItem, QFileSystemModel
 from core.file_manager import FileManager
+from core.transfer_queue import TransferQueue, DIRECTION_UPLOAD, DIRECTION_DOWNLOAD, DIRECTION_RELAY
+from ui.fanout_dialog import FanoutUploadDialog
 
 class DirectoryLoadWorker(QThread):
     """Worker thread for loading directory contents asynchronously"""
@@ -78,6 +80,8 @@ class FileBrowserWidget(QWidget):
         self.remote_current_path = "/"  # Track current remote path
         self.load_worker = None  # Background loading worker
         self.is_loading = False  # Loading state flag
+        self.transfer_queue = None  # Background transfers, see set_transfer_queue
+        self.fanout_dialog = None  # Kept alive while a multi-host upload runs
 
         self.layout = QVBoxLayout(self)
 
@@ -96,6 +100,20 @@ class FileBrowserWidget(QWidget):
         self.splitter.addWidget(self.remote_widget)
         self.layout.addWidget(self.splitter)
 
+    def set_transfer_queue(self, transfer_queue: TransferQueue):
+        """Run uploads and downloads through a background transfer queue"""
+        self.transfer_queue = transfer_queue
+
+    def on_transfer_finished(self, job):
+        """Refresh the view a completed transfer wrote into"""
+        if job['direction'] == DIRECTION_DOWNLOAD:
+            self.navigate_local_path()
+        elif job['direction'] == DIRECTION_RELAY:
+            if job['target_connection'] == self.current_connection:
+                self.load_remote_directory()
+        elif job['connection_name'] == self.current_connection:
+            self.load_remote_directory()
+
     def create_toolbar(self):
         """Create toolbar with file operation buttons"""
         toolbar_layout = QHBoxLayout()
@@ -376,6 +394,10 @@ class FileBrowserWidget(QWidget):
             # Directory actions
             enter_action = context_menu.addAction("Enter Directory")
             enter_action.triggered.connect(lambda: self.enter_directory(file_data['name']))
+
+            if file_data['name'] != "..":
+                download_action = context_menu.addAction("Download")
+                download_action.triggered.connect(lambda: self.download_file(file_data['name'], True))
         else:
             # File actions
             download_action = context_menu.addAction("Download")
@@ -384,6 +406,9 @@ class FileBrowserWidget(QWidget):
             edit_action = context_menu.addAction("Edit")
             edit_action.triggered.connect(lambda: self.edit_file(file_data['name']))
 
+            relay_action = context_menu.addAction("Copy to Another Host...")
+            relay_action.triggered.connect(lambda: self.copy_to_host(file_data['name']))
+
         context_menu.addSeparator()
         delete_action = context_menu.addAction("Delete")
         delete_action.triggered.connect(lambda: self.delete_item(file_data['name'], file_data['is_dir']))
@@ -405,8 +430,8 @@ class FileBrowserWidget(QWidget):
             self.remote_path_edit.setText(new_path)
             self.load_remote_directory()
 
-    def download_file(self, filename):
-        """Download a file from remote to local"""
+    def download_file(self, filename, is_dir=False):
+        """Download a file, or a whole directory tree, from remote to local"""
         if not self.current_connection:
             QMessageBox.warning(self, "Warning", "No active connection.")
             return
@@ -415,19 +440,50 @@ class FileBrowserWidget(QWidget):
 
         # Get local save path
         local_path, ok = QInputDialog.getText(
-            self, "Download File",
+            self, "Download Directory" if is_dir else "Download File",
             f"Save '{filename}' to local path:",
             text=os.path.join(self.local_path_edit.text(), filename)
         )
 
         if ok and local_path:
-            try:
-                self.file_manager.download_file(self.current_connection, remote_path, local_path)
-                QMessageBox.information(self, "Success", f"Downloaded '{filename}' successfully.")
-                # Refresh local view
-                self.navigate_local_path()
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to download file: {e}")
+            if not self.transfer_queue:
+                QMessageBox.warning(self, "Warning", "Transfer queue not available.")
+                return
+            # Runs in the background; progress shows in the transfer list
+            self.transfer_queue.submit(
+                self.current_connection, DIRECTION_DOWNLOAD, local_path, remote_path, is_directory=is_dir
+            )
+
+    def copy_to_host(self, filename):
+        """Copy a remote file straight to another saved connection, without a local copy"""
+        if not self.current_connection:
+            QMessageBox.warning(self, "Warning", "No active connection.")
+            return
+        if not self.transfer_queue:
+            QMessageBox.warning(self, "Warning", "Transfer queue not available.")
+            return
+
+        hosts = sorted(self.file_manager.ssh_manager.get_all_connections())
+        if not hosts:
+            return
+        default = next((i for i, name in enumerate(hosts) if name != self.current_connection), 0)
+        target_connection, ok = QInputDialog.getItem(
+            self, "Copy to Another Host", f"Copy '{filename}' to:", hosts, default, False
+        )
+        if not ok:
+            return
+
+        source_path = self.join_remote_path(self.remote_current_path, filename)
+        target_path, ok = QInputDialog.getText(
+            self, "Copy to Another Host", f"Path on {target_connection}:", text=source_path
+        )
+        if not ok or not target_path:
+            return
+        if target_connection == self.current_connection and target_path == source_path:
+            QMessageBox.warning(self, "Warning", "Source and destination are the same file.")
+            return
+        # Streams host to host in the background; progress shows in the transfer list
+        self.transfer_queue.submit_relay(self.current_connection, source_path, target_connection, target_path)
 
     def edit_file(self, filename):
         """Edit a remote file"""
@@ -498,14 +554,30 @@ class FileBrowserWidget(QWidget):
 
         context_menu = QMenu(self)
 
-        if not is_dir and self.current_connection:
+        if self.current_connection:
             upload_action = context_menu.addAction("Upload to Remote")
-            upload_action.triggered.connect(lambda: self.upload_file(file_path, file_name))
+            upload_action.triggered.connect(lambda: self.upload_file(file_path, file_name, is_dir))
+
+        if not is_dir:
+            fanout_action = context_menu.addAction("Upload to Multiple Hosts...")
+            fanout_action.triggered.connect(lambda: self.upload_to_multiple_hosts(file_path, file_name))
 
         context_menu.exec(self.local_tree.mapToGlobal(pos))
 
-    def upload_file(self, local_path, filename):
-        """Upload a file from local to remote"""
+    def upload_to_multiple_hosts(self, local_path, filename):
+        """Upload one local file to many hosts at once, reading it only once"""
+        if self.fanout_dialog is not None and self.fanout_dialog.isVisible():
+            self.fanout_dialog.raise_()
+            return
+        selected = [self.current_connection] if self.current_connection else []
+        self.fanout_dialog = FanoutUploadDialog(
+            self.file_manager, local_path, self.join_remote_path(self.remote_current_path, filename),
+            selected, self
+        )
+        self.fanout_dialog.show()
+
+    def upload_file(self, local_path, filename, is_dir=False):
+        """Upload a file, or a whole directory tree, from local to remote"""
         if not self.current_connection:
             QMessageBox.warning(self, "Warning", "No active connection.")
             return
@@ -513,21 +585,21 @@ class FileBrowserWidget(QWidget):
         # Get remote save path
         default_remote_path = self.join_remote_path(self.remote_current_path, filename)
         remote_path, ok = QInputDialog.getText(
-            self, "Upload File",
+            self, "Upload Directory" if is_dir else "Upload File",
             f"Upload '{filename}' to remote path:",
             text=default_remote_path
         )
 
         if ok and remote_path:
-            try:
-                # Normalize the remote path
-                remote_path = self.normalize_remote_path(remote_path)
-                self.file_manager.upload_file(self.current_connection, local_path, remote_path)
-                QMessageBox.information(self, "Success", f"Uploaded '{filename}' successfully.")
-                # Refresh remote view
-                self.load_remote_directory()
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to upload file: {e}")
+            if not self.transfer_queue:
+                QMessageBox.warning(self, "Warning", "Transfer queue not available.")
+                return
+            # Normalize the remote path
+            remote_path = self.normalize_remote_path(remote_path)
+            # Runs in the background; progress shows in the transfer list
+            self.transfer_queue.submit(
+                self.current_connection, DIRECTION_UPLOAD, local_path, remote_path, is_directory=is_dir
+            )
 
     def refresh_views(self):
         """Refresh both local and remote views"""
@@ -542,13 +614,9 @@ class FileBrowserWidget(QWidget):
             return
 
         index = selected_indexes[0]
-        if self.local_model.isDir(index):
-            QMessageBox.warning(self, "Warning", "Directory upload not yet supported.")
-            return
-
         file_path = self.local_model.filePath(index)
         file_name = self.local_model.fileName(index)
-        self.upload_file(file_path, file_name)
+        self.upload_file(file_path, file_name, self.local_model.isDir(index))
 
     def download_selected_file(self):
         """Download currently selected remote file"""
@@ -566,11 +634,10 @@ class FileBrowserWidget(QWidget):
         if not file_data:
             return
 
-        if file_data['is_dir']:
-            QMessageBox.warning(self, "Warning", "Directory download not yet supported.")
+        if file_data['name'] == "..":
             return
 
-        self.download_file(file_data['name'])
+        self.download_file(file_data['name'], file_data['is_dir'])
 
     def create_new_folder(self):
         """Create a new folder in remote directory"""
@@ -8,11 +8,19 @@ from PyQt6.QtCore import Qt
 from core.ssh_manager import SSHManager
 from core.file_manager import FileManager
 from core.script_executor import ScriptExecutor
+from core.connection_scheduler import ConnectionScheduler
+from core.transfer_queue import (
+    TransferQueue, DIRECTION_UPLOAD, DIRECTION_RELAY, STATE_COMPLETED, STATE_FAILED, STATE_CANCELLED
+)
+from core.transfer_journal import QueueJournal
+from core import broker
 from ui.connection_manager_widget import ConnectionManagerWidget
 from ui.file_browser_widget import FileBrowserWidget
 from ui.script_panel_widget import ScriptPanelWidget
 from ui.log_panel_widget import LogPanelWidget
+from ui.transfer_list_widget import TransferListWidget
 from utils.performance_monitor import get_performance_monitor, monitor_ui_operation
+from utils.config import load_settings
 
 
 class MainWindow(QMainWindow):
@@ -22,18 +30,47 @@ class MainWindow(QMainWindow):
         self.setGeometry(100, 100, 1400, 900)
 
         self.ssh_manager = SSHManager()
+        # Share sessions through a running connection broker (python src/main.py --broker)
+        if broker.is_supported():
+            broker_client = broker.BrokerClient()
+            if broker_client.is_available():
+                self.ssh_manager.broker_client = broker_client
         self.file_manager = FileManager(self.ssh_manager)
         self.script_executor = ScriptExecutor(self.ssh_manager)
+        # Script output counts as interactive traffic that bulk transfers leave room for
+        self.script_executor.bandwidth = self.file_manager.bandwidth
+        # Unfinished transfers of the last session come back paused
+        self.transfer_queue = TransferQueue(self.file_manager, journal=QueueJournal())
+        self._logged_transfer_states = {}  # {job_id: last state logged}
 
         # Initialize performance monitoring
         self.performance_monitor = get_performance_monitor()
         self.performance_monitor.set_components(self.ssh_manager, self.file_manager)
         self.performance_monitor.performance_warning.connect(self.on_performance_warning)
+        self.ssh_manager.phase_callback = self.performance_monitor.record_connection_phase
+
+        # Keepalives and idle connection reaping
+        self.connection_scheduler = ConnectionScheduler(
+            self.ssh_manager,
+            self.file_manager,
+            event_callback=self.performance_monitor.record_connection_event
+        )
 
         self.setup_ui()
 
         # Start performance monitoring
         self.performance_monitor.start_monitoring()
+        self.connection_scheduler.start()
+
+        # Pre-connect favorite connections in the background
+        settings = load_settings()
+        self.connection_manager.start_warmup(
+            max_workers=settings["warmup_max_workers"],
+            budget_seconds=settings["warmup_budget_seconds"],
+            connect_timeout=settings["warmup_connect_timeout"]
+        )
+        # Status lights for every saved connection
+        self.connection_manager.start_reachability_sweep()
 
     def setup_ui(self):
         # Main horizontal splitter (Left Sidebar | Main Content)
@@ -48,8 +85,13 @@ class MainWindow(QMainWindow):
 
         # Top part of main content: File Browser (reduced size)
         self.file_browser = FileBrowserWidget(self.file_manager)
+        self.file_browser.set_transfer_queue(self.transfer_queue)
         main_content_splitter.addWidget(self.file_browser)
 
+        # Queued uploads/downloads with live progress
+        self.transfer_list = TransferListWidget(self.transfer_queue)
+        main_content_splitter.addWidget(self.transfer_list)
+
         # Bottom part of main content: Script and Log panels side by side
         script_log_splitter = QSplitter(Qt.Orientation.Horizontal)
 
@@ -71,12 +113,15 @@ class MainWindow(QMainWindow):
         # Connect signals
         self.connection_manager.connection_selected.connect(self.on_connection_selected)
         self.script_panel.log_message.connect(self.log_panel.add_log)
+        self.transfer_list.transfer_finished.connect(self.file_browser.on_transfer_finished)
+        self.transfer_list.job_updated.connect(self.on_transfer_updated)
+        self.transfer_list.verification_reported.connect(self.on_transfer_verified)
 
         # Connect file manager to log panel for file operation messages
         # Note: In a full implementation, file_manager would emit signals for logging
 
-        # Set initial sizes for the vertical splitter (1/3 for file browser, 2/3 for script/log)
-        main_content_splitter.setSizes([300, 600]) # 1/3 and 2/3 of 900px height
+        # Set initial sizes for the vertical splitter (file browser, transfers, script/log)
+        main_content_splitter.setSizes([300, 150, 450])
 
         # Add the main content splitter to the main horizontal splitter
         main_splitter.addWidget(main_content_splitter)
@@ -120,6 +165,29 @@ class MainWindow(QMainWindow):
         else:
             self.connection_status_label.setText("Not connected")
 
+    def on_transfer_updated(self, job):
+        """Log transfers as they finish"""
+        state = job['state']
+        if state == self._logged_transfer_states.get(job['id']):
+            return
+        self._logged_transfer_states[job['id']] = state
+        verb = {DIRECTION_UPLOAD: "Upload", DIRECTION_RELAY: "Relay"}.get(job['direction'], "Download")
+        if state == STATE_COMPLETED:
+            self.log_panel.add_log(f"{verb} of '{job['name']}' completed", "success")
+        elif state == STATE_FAILED:
+            self.log_panel.add_log(f"{verb} of '{job['name']}' failed: {job['error']}", "error")
+        elif state == STATE_CANCELLED:
+            self.log_panel.add_log(f"{verb} of '{job['name']}' cancelled", "info")
+
+    def on_transfer_verified(self, connection_name: str, path: str, status: str, message: str):
+        """Log the end-to-end hash check of a transferred file, or a stale partial file discarded"""
+        if status == "verified":
+            self.log_panel.add_log(f"Verified '{path}' on {connection_name}: {message}", "success")
+        elif status == "mismatch":
+            self.log_panel.add_log(f"Integrity check failed for '{path}' on {connection_name}: {message}", "error")
+        else:
+            self.log_panel.add_log(f"'{path}' on {connection_name}: {message}", "info")
+
     def on_performance_warning(self, warning_type: str, message: str):
         """处理性能警告"""
         print(f"⚠️  性能警告 [{warning_type}]: {message}")
@@ -131,8 +199,13 @@ class MainWindow(QMainWindow):
         """窗口关闭时的清理工作"""
         # 停止性能监控
         self.performance_monitor.stop_monitoring()
+        self.connection_scheduler.stop()
+        # Running transfers stop and keep their partial files for a later resume
+        self.transfer_queue.shutdown()
 
         # 清理连接
+        self.connection_manager.stop_warmup()
+        self.connection_manager.stop_reachability_sweep()
         self.ssh_manager.disconnect_all()
         self.file_manager.cleanup_connections()
 
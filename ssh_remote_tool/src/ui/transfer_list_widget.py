@@ -0,0 +1,238 @@
+from PyQt6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QTreeWidget, QTreeWidgetItem,
+    QPushButton, QLabel, QProgressBar, QHeaderView, QMenu, QComboBox, QSpinBox, QInputDialog, QCheckBox
+)
+from PyQt6.QtCore import Qt, pyqtSignal
+from core.transfer_queue import (
+    TransferQueue, DIRECTION_UPLOAD, DIRECTION_RELAY, PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH,
+    STATE_QUEUED, STATE_RUNNING, STATE_PAUSED, STATE_COMPLETED, STATE_FAILED, FINISHED_STATES
+)
+from core.file_manager import VERIFY_OFF, VERIFY_FAIL, VERIFY_RETRY
+from utils.helpers import format_bytes
+
+
+class TransferListWidget(QWidget):
+    """Lists queued, running and finished transfers with live progress"""
+    # Emitted from TransferQueue worker threads; Qt queues it onto the GUI thread
+    job_updated = pyqtSignal(object)  # job snapshot dict
+    transfer_finished = pyqtSignal(object)  # snapshot of a job that just completed
+    verification_reported = pyqtSignal(str, str, str, str)  # connection_name, path, status, message
+
+    COLUMNS = ["File", "Host", "Direction", "Progress", "Speed", "Status"]
+    DIRECTION_NAMES = {DIRECTION_UPLOAD: "Upload", DIRECTION_RELAY: "Relay"}  # Anything else is a download
+    PRIORITY_NAMES = {PRIORITY_LOW: "Low", PRIORITY_NORMAL: "Normal", PRIORITY_HIGH: "High"}
+    VERIFY_POLICIES = [
+        (VERIFY_FAIL, "Verify: fail on mismatch"),
+        (VERIFY_RETRY, "Verify: retry on mismatch"),
+        (VERIFY_OFF, "Verify: off"),
+    ]
+
+    def __init__(self, transfer_queue: TransferQueue = None, parent=None):
+        super().__init__(parent)
+        self.transfer_queue = None
+        self._items = {}  # {job_id: QTreeWidgetItem}
+        self._progress_bars = {}  # {job_id: QProgressBar}
+        self._states = {}  # {job_id: last state shown}
+
+        self.layout = QVBoxLayout(self)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+
+        header_layout = QHBoxLayout()
+        header_layout.addWidget(QLabel("Transfers"))
+        header_layout.addStretch()
+        self.verify_combo = QComboBox()
+        for policy, label in self.VERIFY_POLICIES:
+            self.verify_combo.addItem(label, policy)
+        self.verify_combo.setToolTip(
+            "Compare a hash of each transferred file with the remote copy (small files are skipped)"
+        )
+        header_layout.addWidget(self.verify_combo)
+        self.limit_spin = QSpinBox()
+        self.limit_spin.setRange(0, 10 ** 7)
+        self.limit_spin.setSingleStep(128)
+        self.limit_spin.setSuffix(" KiB/s")
+        self.limit_spin.setSpecialValueText("No limit")
+        self.limit_spin.setToolTip(
+            "Bandwidth cap for all transfers together. While you browse or a script prints "
+            "output, transfers leave 10% of the cap free; without a cap they are not slowed down"
+        )
+        header_layout.addWidget(self.limit_spin)
+        self.cache_check = QCheckBox("Cache on hosts")
+        self.cache_check.setToolTip(
+            "Keep a copy of every upload on the host; uploading the same content again "
+            "becomes a copy on the host"
+        )
+        header_layout.addWidget(self.cache_check)
+        self.pause_btn = QPushButton("Pause")
+        self.resume_btn = QPushButton("Resume")
+        self.cancel_btn = QPushButton("Cancel")
+        self.clear_btn = QPushButton("Clear Finished")
+        for button in (self.pause_btn, self.resume_btn, self.cancel_btn, self.clear_btn):
+            header_layout.addWidget(button)
+        self.layout.addLayout(header_layout)
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(self.COLUMNS)
+        self.tree.setRootIsDecorated(False)
+        self.tree.setSelectionMode(QTreeWidget.SelectionMode.ExtendedSelection)
+        self.tree.header().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        self.tree.header().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.tree.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.tree.customContextMenuRequested.connect(self.show_context_menu)
+        self.layout.addWidget(self.tree)
+
+        self.pause_btn.clicked.connect(lambda: self._for_selected(self.transfer_queue.pause))
+        self.resume_btn.clicked.connect(lambda: self._for_selected(self.transfer_queue.resume))
+        self.cancel_btn.clicked.connect(lambda: self._for_selected(self.transfer_queue.cancel))
+        self.clear_btn.clicked.connect(self.clear_finished)
+        self.job_updated.connect(self.on_job_updated)
+        self.verify_combo.currentIndexChanged.connect(self.on_verify_policy_changed)
+        self.limit_spin.valueChanged.connect(self.on_limit_changed)
+        self.cache_check.toggled.connect(self.on_cache_toggled)
+
+        if transfer_queue is not None:
+            self.set_transfer_queue(transfer_queue)
+
+    def set_transfer_queue(self, transfer_queue: TransferQueue):
+        """Attach the queue and receive its progress through job_updated"""
+        self.transfer_queue = transfer_queue
+        transfer_queue.job_callback = self.job_updated.emit
+        file_manager = transfer_queue.file_manager
+        file_manager.verify_callback = self.verification_reported.emit
+        index = self.verify_combo.findData(file_manager.verify_policy)
+        if index >= 0:
+            self.verify_combo.setCurrentIndex(index)
+        self.limit_spin.setValue(file_manager.bandwidth.global_rate // 1024)
+        self.cache_check.setChecked(file_manager.artifact_cache.enabled)
+        for snapshot in transfer_queue.get_jobs():
+            self.on_job_updated(snapshot)
+
+    def on_verify_policy_changed(self, index):
+        if self.transfer_queue:
+            self.transfer_queue.file_manager.verify_policy = self.verify_combo.itemData(index)
+
+    def on_limit_changed(self, value):
+        if self.transfer_queue:
+            self.transfer_queue.file_manager.bandwidth.global_rate = value * 1024
+
+    def on_cache_toggled(self, checked):
+        if self.transfer_queue:
+            self.transfer_queue.file_manager.artifact_cache.enabled = checked
+
+    def limit_host(self, connection_name):
+        """Ask for a bandwidth cap for one host"""
+        bandwidth = self.transfer_queue.file_manager.bandwidth
+        value, ok = QInputDialog.getInt(
+            self, "Host Bandwidth Limit",
+            f"Cap for transfers to/from '{connection_name}' in KiB/s (0 = no limit):",
+            bandwidth.host_rate(connection_name) // 1024, 0, 10 ** 7, 128
+        )
+        if ok:
+            bandwidth.set_host_rate(connection_name, value * 1024)
+
+    def _selected_job_ids(self):
+        return [item.data(0, Qt.ItemDataRole.UserRole) for item in self.tree.selectedItems()]
+
+    def _for_selected(self, action):
+        if not self.transfer_queue:
+            return
+        for job_id in self._selected_job_ids():
+            action(job_id)
+
+    def on_job_updated(self, job):
+        job_id = job["id"]
+        item = self._items.get(job_id)
+        if item is None:
+            item = QTreeWidgetItem(self.tree)
+            item.setData(0, Qt.ItemDataRole.UserRole, job_id)
+            item.setText(0, job["name"])
+            if job["direction"] == DIRECTION_RELAY:
+                item.setText(1, f"{job['connection_name']} \u2192 {job['target_connection']}")
+            else:
+                item.setText(1, job["connection_name"])
+            item.setText(2, self.DIRECTION_NAMES.get(job["direction"], "Download"))
+            bar = QProgressBar()
+            bar.setRange(0, 1000)
+            bar.setTextVisible(True)
+            self.tree.setItemWidget(item, 3, bar)
+            self._items[job_id] = item
+            self._progress_bars[job_id] = bar
+
+        if job["direction"] == DIRECTION_RELAY:
+            tooltip = f"{job['connection_name']}:{job['remote_path']}\n{job['target_connection']}:{job['target_path']}"
+        else:
+            tooltip = f"{job['local_path']}\n{job['remote_path']}"
+        if job["error"]:
+            tooltip += f"\n{job['error']}"
+        item.setToolTip(0, tooltip)
+
+        bar = self._progress_bars[job_id]
+        if job["state"] == STATE_COMPLETED:
+            bar.setValue(1000)
+            bar.setFormat("100%")
+        elif job["total"]:
+            bar.setValue(int(job["transferred"] * 1000 / job["total"]))
+            text = f"{format_bytes(job['transferred'])} / {format_bytes(job['total'])}"
+            if job["is_directory"]:
+                text = f"{job['files_done']}/{job['files_total']} files, {text}"
+            bar.setFormat(text)
+        else:
+            bar.setValue(0)
+            bar.setFormat("")
+
+        item.setText(4, f"{format_bytes(job['speed'])}/s" if job["state"] == STATE_RUNNING else "")
+        status = job["state"].capitalize()
+        if job["state"] == STATE_QUEUED and job["priority"] != PRIORITY_NORMAL:
+            status += f" ({self.PRIORITY_NAMES.get(job['priority'], job['priority'])})"
+        if job["state"] == STATE_FAILED and job["error"]:
+            status += f": {job['error']}"
+        item.setText(5, status)
+
+        previous = self._states.get(job_id)
+        self._states[job_id] = job["state"]
+        if job["state"] == STATE_COMPLETED and previous != STATE_COMPLETED:
+            self.transfer_finished.emit(job)
+
+    def clear_finished(self):
+        if not self.transfer_queue:
+            return
+        for job_id in self.transfer_queue.clear_finished():
+            self._remove_item(job_id)
+        # Jobs cleared before they were shown
+        for job_id in [j for j, state in self._states.items() if state in FINISHED_STATES]:
+            self._remove_item(job_id)
+
+    def _remove_item(self, job_id):
+        item = self._items.pop(job_id, None)
+        self._progress_bars.pop(job_id, None)
+        self._states.pop(job_id, None)
+        if item is not None:
+            self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(item))
+
+    def show_context_menu(self, pos):
+        item = self.tree.itemAt(pos)
+        if not item or not self.transfer_queue:
+            return
+        job_id = item.data(0, Qt.ItemDataRole.UserRole)
+        state = self._states.get(job_id)
+
+        context_menu = QMenu(self)
+        if state in (STATE_QUEUED, STATE_RUNNING):
+            context_menu.addAction("Pause").triggered.connect(lambda: self.transfer_queue.pause(job_id))
+        if state in (STATE_PAUSED, STATE_FAILED):
+            context_menu.addAction("Resume").triggered.connect(lambda: self.transfer_queue.resume(job_id))
+        if state not in FINISHED_STATES:
+            context_menu.addAction("Cancel").triggered.connect(lambda: self.transfer_queue.cancel(job_id))
+        if state == STATE_QUEUED:
+            priority_menu = context_menu.addMenu("Priority")
+            for priority, label in self.PRIORITY_NAMES.items():
+                action = priority_menu.addAction(label)
+                action.triggered.connect(
+                    lambda checked=False, p=priority: self.transfer_queue.set_priority(job_id, p)
+                )
+        context_menu.addSeparator()
+        connection_name = item.text(1)
+        context_menu.addAction(f"Limit Bandwidth of '{connection_name}'...").triggered.connect(
+            lambda: self.limit_host(connection_name)
+        )
+        context_menu.exec(self.tree.mapToGlobal(pos))
@@ -0,0 +1,25 @@
+import json
+import os
+
+SETTINGS_FILE = "settings.json"  # Next to connections.json
+
+DEFAULT_SETTINGS = {
+    "warmup_max_workers": 4,  # Favorite connections handshaking at once
+    "warmup_budget_seconds": 30,  # Hosts not started by then are skipped
+    "warmup_connect_timeout": 5,  # Per host, unless its connection sets warmup_timeout
+}
+
+
+def load_settings(path=SETTINGS_FILE):
+    """Application settings: DEFAULT_SETTINGS overridden by the keys found in ``path``.
+
+    A missing or unreadable file gives the defaults.
+    """
+    settings = dict(DEFAULT_SETTINGS)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                settings.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Could not read {path}, using defaults: {e}")
+    return settings
@@ -0,0 +1,7 @@
+def format_bytes(size):
+    """Human-readable byte count, e.g. 1536 -> '1.5 KB'"""
+    size = float(size or 0)
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
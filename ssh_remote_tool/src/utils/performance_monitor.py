@@ -3,6 +3,7 @@
 实时监控SSH远程工具的性能指标，确保满足PRD要求
 """
 
+import math
 import time
 import threading
 import psutil
@@ -21,6 +22,14 @@ class PerformanceMetrics:
     ui_response_time_ms: float
     operation_type: str
 
+@dataclass
+class ConnectionEvent:
+    """连接维护事件（保活、回收等）"""
+    timestamp: float
+    event_type: str
+    connection_name: str
+    detail: str
+
 class PerformanceMonitor(QObject):
     """性能监控器"""
     
@@ -33,6 +42,10 @@ class PerformanceMonitor(QObject):
         self.is_monitoring = False
         self.metrics_history: List[PerformanceMetrics] = []
         self.max_history_size = 1000
+        self.connection_events: List[ConnectionEvent] = []
+        # 连接建立各阶段耗时 {连接名: {阶段: [毫秒, ...]}}
+        self.connection_phases: Dict[str, Dict[str, List[float]]] = {}
+        self._events_lock = threading.Lock()
         self.monitor_timer = QTimer()
         self.monitor_timer.timeout.connect(self._collect_metrics)
         
@@ -41,7 +54,8 @@ class PerformanceMonitor(QObject):
             'ui_response_time_ms': 200,  # 0.2秒
             'memory_usage_mb': 500,      # 500MB内存限制
             'cpu_usage_percent': 80,     # 80% CPU使用率
-            'max_connections': 10        # 最大连接数
+            'max_connections': 10,       # 最大连接数
+            'connect_time_ms': 5000      # 连接建立 < 5秒
         }
         
         # 组件引用
@@ -83,7 +97,7 @@ class PerformanceMonitor(QObject):
                 active_connections = len(self.ssh_manager.active_clients)
             
             if self.file_manager:
-                cached_sftp_connections = len(self.file_manager._sftp_cache)
+                cached_sftp_connections = self.file_manager.get_sftp_session_count()
             
             # 创建性能指标
             metrics = PerformanceMetrics(
@@ -167,6 +181,73 @@ class PerformanceMonitor(QObject):
                 f"{operation_type} 操作耗时 {duration_ms:.1f}ms 超过阈值 {self.thresholds['ui_response_time_ms']}ms"
             )
     
+    def record_connection_event(self, event_type: str, connection_name: str, detail: str = ""):
+        """记录连接维护事件（可在后台线程调用）"""
+        event = ConnectionEvent(
+            timestamp=time.time(),
+            event_type=event_type,
+            connection_name=connection_name,
+            detail=detail
+        )
+        with self._events_lock:
+            self.connection_events.append(event)
+            if len(self.connection_events) > self.max_history_size:
+                self.connection_events.pop(0)
+
+    def record_connection_phase(self, connection_name: str, phase: str, seconds: float):
+        """记录连接建立阶段耗时（dns/tcp/kex/auth/handshake/sftp_open/total，可在后台线程调用）"""
+        duration_ms = seconds * 1000
+        with self._events_lock:
+            samples = self.connection_phases.setdefault(connection_name, {}).setdefault(phase, [])
+            samples.append(duration_ms)
+            if len(samples) > self.max_history_size:
+                samples.pop(0)
+
+        if phase == 'total' and duration_ms > self.thresholds['connect_time_ms']:
+            self.performance_warning.emit(
+                "连接耗时",
+                f"连接 {connection_name} 耗时 {duration_ms:.0f}ms 超过阈值 {self.thresholds['connect_time_ms']}ms"
+            )
+
+    @staticmethod
+    def _percentile(sorted_samples: List[float], percent: float) -> float:
+        """最近秩法百分位数"""
+        if not sorted_samples:
+            return 0.0
+        rank = max(math.ceil(percent / 100 * len(sorted_samples)) - 1, 0)
+        return sorted_samples[min(rank, len(sorted_samples) - 1)]
+
+    def get_connection_phase_stats(self, connection_name: Optional[str] = None) -> Dict:
+        """各阶段耗时统计（毫秒）：{连接名: {阶段: {count, p50, p90, p99, max}}}"""
+        with self._events_lock:
+            names = [connection_name] if connection_name else list(self.connection_phases)
+            snapshot = {
+                name: {phase: sorted(samples) for phase, samples in self.connection_phases.get(name, {}).items()}
+                for name in names
+            }
+
+        stats = {}
+        for name, phases in snapshot.items():
+            stats[name] = {
+                phase: {
+                    'count': len(samples),
+                    'p50': self._percentile(samples, 50),
+                    'p90': self._percentile(samples, 90),
+                    'p99': self._percentile(samples, 99),
+                    'max': samples[-1] if samples else 0.0,
+                }
+                for phase, samples in phases.items()
+            }
+        return stats
+
+    def get_connection_event_counts(self) -> Dict[str, int]:
+        """按类型统计连接维护事件"""
+        counts: Dict[str, int] = {}
+        with self._events_lock:
+            for event in self.connection_events:
+                counts[event.event_type] = counts.get(event.event_type, 0) + 1
+        return counts
+
     def get_performance_summary(self) -> Dict:
         """获取性能摘要"""
         if not self.metrics_history:
@@ -198,6 +279,8 @@ class PerformanceMonitor(QObject):
             'current_active_connections': current_metrics.active_connections,
             'current_cached_sftp': current_metrics.cached_sftp_connections,
             'total_operations': len(ui_metrics),
+            'connection_events': self.get_connection_event_counts(),
+            'connection_phases': self.get_connection_phase_stats(),
             'monitoring_duration_minutes': (time.time() - self.metrics_history[0].timestamp) / 60 if self.metrics_history else 0
         }
     
@@ -206,6 +289,8 @@ class PerformanceMonitor(QObject):
         try:
             import json
             
+            with self._events_lock:
+                events = list(self.connection_events)
             data = {
                 'export_time': time.time(),
                 'thresholds': self.thresholds,
@@ -220,6 +305,16 @@ class PerformanceMonitor(QObject):
                         'operation_type': m.operation_type
                     }
                     for m in self.metrics_history
+                ],
+                'connection_phase_stats': self.get_connection_phase_stats(),
+                'connection_events': [
+                    {
+                        'timestamp': e.timestamp,
+                        'event_type': e.event_type,
+                        'connection_name': e.connection_name,
+                        'detail': e.detail
+                    }
+                    for e in events
                 ]
             }
             
@@ -0,0 +1,65 @@
+import io
+import os
+import threading
+import time
+
+from core.parallel_transfer import stream_download
+
+
+class FakeRemoteFile:
+    """SFTPFile stand-in that counts the bytes requested with readv"""
+
+    def __init__(self, data):
+        self.data = data
+        self.requested = 0
+        self.lock = threading.Lock()
+
+    def readv(self, chunks):
+        with self.lock:
+            self.requested += sum(size for _, size in chunks)
+        return [self.data[offset:offset + size] for offset, size in chunks]
+
+
+class SlowWriter:
+    """Local file stand-in slower than the network; tracks bytes held in between"""
+
+    def __init__(self, remote_file, delay):
+        self.remote_file = remote_file
+        self.delay = delay
+        self.buffer = io.BytesIO()
+        self.written = 0
+        self.max_buffered = 0
+
+    def write(self, data):
+        with self.remote_file.lock:
+            buffered = self.remote_file.requested - self.written
+        self.max_buffered = max(self.max_buffered, buffered)
+        time.sleep(self.delay)
+        self.buffer.write(data)
+        self.written += len(data)
+
+
+def test_stream_download_buffers_at_most_depth_blocks():
+    depth, block_size = 4, 64 * 1024
+    data = os.urandom(40 * block_size + 123)
+    remote_file = FakeRemoteFile(data)
+    writer = SlowWriter(remote_file, delay=0.005)
+
+    stream_download(remote_file, writer, 0, len(data), depth=depth, block_size=block_size)
+
+    assert writer.buffer.getvalue() == data
+    assert writer.max_buffered <= depth * block_size
+
+
+def test_stream_download_resumes_at_offset():
+    data = os.urandom(300 * 1024)
+    remote_file = FakeRemoteFile(data)
+    local_file = io.BytesIO()
+    progress = []
+
+    stream_download(remote_file, local_file, 100 * 1024, len(data),
+                    progress_callback=lambda done, total: progress.append(done),
+                    depth=2, block_size=64 * 1024)
+
+    assert local_file.getvalue() == data[100 * 1024:]
+    assert progress[-1] == len(data)
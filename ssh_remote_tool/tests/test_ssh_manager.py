@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+pytest.importorskip("paramiko")
+pytest.importorskip("cryptography")
+
+from core.ssh_manager import SSHManager
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_disconnect_during_connect_closes_the_new_client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Key and connections files are created in the working directory
+    manager = SSHManager()
+    manager.connections["host"] = {"name": "host", "host": "example.invalid", "user": "me"}
+
+    handshaking = threading.Event()
+    finish = threading.Event()
+    client = FakeClient()
+
+    def establish(name, conn_data, max_retries, timeout, profile=None, deadline=None):
+        handshaking.set()
+        finish.wait(5)
+        return client
+
+    monkeypatch.setattr(manager, "_establish_connection", establish)
+    errors = []
+
+    def connect():
+        try:
+            manager.connect("host")
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=connect)
+    thread.start()
+    assert handshaking.wait(5)
+    manager.disconnect("host")
+    finish.set()
+    thread.join(5)
+
+    assert client.closed
+    assert "host" not in manager.active_clients
+    assert len(errors) == 1 and isinstance(errors[0], ConnectionAbortedError)